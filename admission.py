@@ -0,0 +1,241 @@
+# admission.py
+# Per-user admission control for the expensive endpoints (/capture, /upload, /video/transcribe, /query).
+#   - rate limits: a token bucket per (user, endpoint); an empty bucket means 429 + Retry-After
+#   - heavy work (captures, transcriptions) runs in a fixed number of slots, shared between
+#     users with weighted fair queuing: every job gets a virtual finish time
+#     (user's previous finish + cost / weight) and the smallest one starts next, so a user with
+#     ten queued videos cannot starve someone who submits one
+#   - per-user quotas: at most ADMISSION_USER_RUNNING jobs running and ADMISSION_USER_QUEUED
+#     waiting per user; a full queue is rejected immediately (429) instead of piling up
+#   - maintenance: while the vector store is being compacted/snapshotted/restored (see
+#     ai_engine/maintenance.py) endpoints that write to it get 503 + Retry-After; queries still run
+# Everything is per process; with several workers each one applies the limits on its own.
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import contextlib
+from collections import defaultdict
+
+from fastapi import HTTPException, status
+
+from metrics import registry
+from shared_state import maintenance_reason
+
+# Requests per minute per user (0 disables the limit), and how many can be made back to back
+RATE_LIMITS = {
+    "capture": float(os.getenv("RATE_LIMIT_CAPTURE", 10)),
+    "transcribe": float(os.getenv("RATE_LIMIT_TRANSCRIBE", 4)),
+    "query": float(os.getenv("RATE_LIMIT_QUERY", 30)),
+    "upload": float(os.getenv("RATE_LIMIT_UPLOAD", 4)),
+}
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", 3))
+
+# Relative cost of one job in the fair queue (a transcription keeps Whisper busy far longer)
+JOB_COSTS = {"capture": 1.0, "transcribe": 4.0, "upload": 4.0}
+# Endpoints that add to the vector store, refused while it is in maintenance
+WRITE_ENDPOINTS = {"capture", "upload"}
+MAINTENANCE_RETRY_AFTER = int(os.getenv("MAINTENANCE_RETRY_AFTER", 60))
+HEAVY_SLOTS = int(os.getenv("ADMISSION_HEAVY_SLOTS", 2))  # heavy jobs running at once
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 20))  # waiting jobs, all users
+ADMISSION_USER_RUNNING = int(os.getenv("ADMISSION_USER_RUNNING", 1))
+ADMISSION_USER_QUEUED = int(os.getenv("ADMISSION_USER_QUEUED", 2))
+
+
+def _parse_weights(spec: str) -> dict:
+    """"alice@example.com=2,bob@example.com=0.5" -> {email: weight}"""
+    weights = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        user, _, weight = item.rpartition("=")
+        weights[user] = float(weight)
+    return weights
+
+
+# Users with a larger weight get a proportionally larger share of the heavy slots (default 1)
+USER_WEIGHTS = _parse_weights(os.getenv("ADMISSION_USER_WEIGHTS", ""))
+
+QUEUE_WAIT = registry.histogram(
+    "admission_queue_wait_seconds", "Time a heavy job waited for a slot, per user.",
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+REJECTED = registry.counter("admission_rejected_total", "Requests rejected with 429 (or 503 in maintenance), by reason.")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, n: float = 1.0) -> float:
+        """Takes `n` tokens. Returns 0 on success, otherwise the seconds until they'd be available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, limits: dict = RATE_LIMITS, burst: float = RATE_LIMIT_BURST):
+        self.limits = limits
+        self.burst = burst
+        self._buckets = {}
+
+    def check(self, user: str, endpoint: str) -> float:
+        """0 if the request may go ahead, else the Retry-After in seconds."""
+        per_minute = self.limits.get(endpoint, 0)
+        if per_minute <= 0:
+            return 0.0
+        key = (user, endpoint)
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(per_minute / 60.0, max(self.burst, 1.0))
+        return self._buckets[key].take()
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of heavy jobs over a fixed number of slots (asyncio, one event loop).
+    Use as `async with scheduler.slot(user, endpoint):`.
+    """
+
+    def __init__(self, slots: int = HEAVY_SLOTS, max_queue: int = ADMISSION_MAX_QUEUE,
+                 user_running: int = ADMISSION_USER_RUNNING, user_queued: int = ADMISSION_USER_QUEUED):
+        self.slots = slots
+        self.max_queue = max_queue
+        self.user_running_limit = user_running
+        self.user_queued_limit = user_queued
+        self._heap = []  # [finish_tag, seq, start_tag, user, future]
+        self._seq = itertools.count()
+        self._running = 0
+        self._user_running = defaultdict(int)
+        self._user_queued = defaultdict(int)
+        self._user_finish = {}
+        self._virtual_time = 0.0
+        self._job_seconds = defaultdict(lambda: 30.0)  # moving average, for Retry-After
+        self._backlog = defaultdict(int)  # endpoint -> jobs waiting for or holding a slot
+
+    def queue_depth(self) -> int:
+        return len(self._heap)
+
+    def backlog(self, endpoint: str) -> int:
+        """Jobs of one kind (e.g. "transcribe") queued or running in this process."""
+        return self._backlog[endpoint]
+
+    def retry_after(self, endpoint: str) -> float:
+        """Rough time until a slot frees up for a new job."""
+        return self._job_seconds[endpoint] * (len(self._heap) / self.slots + 1)
+
+    def _dispatch(self):
+        skipped = []
+        while self._running < self.slots and self._heap:
+            entry = heapq.heappop(self._heap)
+            _, _, start_tag, user, fut = entry
+            if fut.done():  # the request gave up while waiting
+                continue
+            if self._user_running[user] >= self.user_running_limit:
+                skipped.append(entry)
+                continue
+            self._user_queued[user] -= 1
+            self._user_running[user] += 1
+            self._running += 1
+            self._virtual_time = max(self._virtual_time, start_tag)
+            fut.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+
+    def _release(self, user: str):
+        self._running -= 1
+        self._user_running[user] -= 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user: str, endpoint: str, cost: float = 1.0):
+        if len(self._heap) >= self.max_queue:
+            raise AdmissionRejected("queue_full", self.retry_after(endpoint))
+        if self._user_queued[user] >= self.user_queued_limit:
+            raise AdmissionRejected("user_queue_full", self.retry_after(endpoint))
+
+        start_tag = max(self._virtual_time, self._user_finish.get(user, 0.0))
+        finish_tag = start_tag + cost / USER_WEIGHTS.get(user, 1.0)
+        self._user_finish[user] = finish_tag
+        fut = asyncio.get_running_loop().create_future()
+        entry = [finish_tag, next(self._seq), start_tag, user, fut]
+        heapq.heappush(self._heap, entry)
+        self._user_queued[user] += 1
+        self._backlog[endpoint] += 1
+        enqueued = time.monotonic()
+        self._dispatch()
+
+        try:
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.cancelled():
+                    # Client went away while waiting: drop the job from the queue
+                    if entry in self._heap:
+                        self._heap.remove(entry)
+                        heapq.heapify(self._heap)
+                    self._user_queued[user] -= 1
+                else:
+                    self._release(user)
+                raise
+            QUEUE_WAIT.observe(time.monotonic() - enqueued, user=user, endpoint=endpoint)
+
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self._job_seconds[endpoint] = 0.8 * self._job_seconds[endpoint] + 0.2 * (time.monotonic() - started)
+                self._release(user)
+        finally:
+            self._backlog[endpoint] -= 1
+
+
+rate_limiter = RateLimiter()
+scheduler = FairScheduler()
+
+
+@contextlib.asynccontextmanager
+async def admit(user: str, endpoint: str):
+    """
+    Rate limit + (for heavy endpoints) a fair-queued slot for `user`.
+    Raises a 429 HTTPException with Retry-After when the request can't be admitted
+    (503 for writes while the vector store is in maintenance).
+    """
+    if endpoint in WRITE_ENDPOINTS:
+        reason = maintenance_reason()
+        if reason:
+            REJECTED.inc(user=user, endpoint=endpoint, reason="maintenance")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"The knowledge base is read-only during maintenance ({reason}). Try again later.",
+                headers={"Retry-After": str(MAINTENANCE_RETRY_AFTER)},
+            )
+    try:
+        wait = rate_limiter.check(user, endpoint)
+        if wait > 0:
+            raise AdmissionRejected("rate_limited", wait)
+        if endpoint in JOB_COSTS:
+            async with scheduler.slot(user, endpoint, JOB_COSTS[endpoint]):
+                yield
+        else:
+            yield
+    except AdmissionRejected as e:
+        REJECTED.inc(user=user, endpoint=endpoint, reason=e.reason)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many requests ({e.reason.replace('_', ' ')}). Try again later.",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
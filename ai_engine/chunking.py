@@ -0,0 +1,172 @@
+# chunking.py
+# Sentence- and structure-aware chunking, used instead of LlamaIndex's default splitter.
+#   - caption text (one short line per row, often without punctuation) is first
+#     rebuilt into sentences, so a chunk never starts or ends in the middle of a thought
+#   - article text keeps its headings ("## Heading" lines from fetch_text_from_url);
+#     a chunk never crosses into a new section, and the heading is kept as metadata
+#   - inside a section, chunk boundaries are placed where the similarity between
+#     adjacent sentences drops (one batched embedding call + one NumPy operation per document)
+#   - chunks aim for CHUNK_TARGET_TOKENS and never exceed CHUNK_MAX_TOKENS, which stays
+#     under bge-small's 512-token window so nothing is silently truncated at embedding time
+import os
+import re
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode
+
+from metrics import span
+
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", 350))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 480))
+CHUNK_SEMANTIC = os.getenv("CHUNK_SEMANTIC", "1") == "1"
+# Adjacent-sentence similarities below this percentile (per document) are boundary candidates
+CHUNK_BREAKPOINT_PERCENTILE = float(os.getenv("CHUNK_BREAKPOINT_PERCENTILE", 25))
+# Caption lines are merged until a "sentence" has about this many words (when there is no punctuation)
+CAPTION_SENTENCE_WORDS = 25
+
+_HEADING = re.compile(r"^#{1,6}\s+(.*)$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough WordPiece token count (about 1.3 tokens per English word)."""
+    return int(len(text.split()) * 1.3) + 1
+
+
+def looks_like_captions(text: str) -> bool:
+    """Many short lines with little punctuation: caption/ASR output rather than prose."""
+    lines = [l for l in text.splitlines() if l.strip()]
+    if len(lines) < 5:
+        return False
+    avg_len = sum(len(l) for l in lines) / len(lines)
+    ending_punct = sum(1 for l in lines if l.rstrip()[-1:] in ".!?") / len(lines)
+    return avg_len < 80 and ending_punct < 0.3
+
+
+def sentences_from_captions(text: str) -> List[str]:
+    """Joins caption lines into sentences (by punctuation, or by length when there is none)."""
+    joined = " ".join(l.strip() for l in text.splitlines() if l.strip())
+    pieces = _SENTENCE_END.split(joined)
+    sentences = []
+    for piece in pieces:
+        words = piece.split()
+        # Unpunctuated auto-captions come back as one huge "sentence"; cut it into readable runs
+        for i in range(0, len(words), CAPTION_SENTENCE_WORDS):
+            sentences.append(" ".join(words[i:i + CAPTION_SENTENCE_WORDS]))
+    return [s for s in sentences if s]
+
+
+def sections_from_article(text: str) -> List[Tuple[str, List[str]]]:
+    """Splits article text into (heading, sentences) sections."""
+    sections = [("", [])]
+    for block in re.split(r"\n\s*\n|\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        heading = _HEADING.match(block)
+        if heading:
+            sections.append((heading.group(1).strip(), []))
+            continue
+        sections[-1][1].extend(s.strip() for s in _SENTENCE_END.split(block) if s.strip())
+    return [(h, sents) for h, sents in sections if sents]
+
+
+def split_long_sentences(sentences: List[str]) -> List[str]:
+    """Cuts any "sentence" that alone would exceed CHUNK_MAX_TOKENS into word runs."""
+    max_words = int(CHUNK_MAX_TOKENS / 1.3) - 1
+    out = []
+    for sentence in sentences:
+        words = sentence.split()
+        if len(words) <= max_words:
+            out.append(sentence)
+        else:
+            out.extend(" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words))
+    return out
+
+
+def adjacent_similarities(sentences: List[str]) -> np.ndarray:
+    """Cosine similarity of every sentence with the next one (length len(sentences) - 1)."""
+    if len(sentences) < 2:
+        return np.zeros(0, dtype=np.float32)
+    with span("embedding"):
+        vecs = np.asarray(Settings.embed_model.get_text_embedding_batch(sentences), dtype=np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12
+    return np.einsum("ij,ij->i", vecs[:-1], vecs[1:])
+
+
+def group_sentences(sentences: List[str], breaks: np.ndarray) -> List[str]:
+    """
+    Greedily packs sentences into chunks: a chunk is closed at a semantic break once it has
+    reached half the target size, at the target size, or before it would exceed the maximum.
+    `breaks[i]` is True when there is a topic shift between sentence i and i + 1.
+    """
+    chunks, current, tokens = [], [], 0
+    for i, sentence in enumerate(sentences):
+        n = estimate_tokens(sentence)
+        if current and tokens + n > CHUNK_MAX_TOKENS:
+            chunks.append(" ".join(current))
+            current, tokens = [], 0
+        current.append(sentence)
+        tokens += n
+        at_break = i < len(breaks) and breaks[i]
+        if tokens >= CHUNK_TARGET_TOKENS or (at_break and tokens >= CHUNK_TARGET_TOKENS // 2):
+            chunks.append(" ".join(current))
+            current, tokens = [], 0
+    if current:
+        # Fold a small leftover into the previous chunk rather than embedding a fragment
+        if chunks and tokens < CHUNK_TARGET_TOKENS // 4 and estimate_tokens(chunks[-1]) + tokens <= CHUNK_MAX_TOKENS:
+            chunks[-1] += " " + " ".join(current)
+        else:
+            chunks.append(" ".join(current))
+    return chunks
+
+
+class StructureAwareChunker(NodeParser):
+    """LlamaIndex node parser for captions and articles (see the module comment)."""
+
+    semantic: bool = CHUNK_SEMANTIC
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StructureAwareChunker"
+
+    def chunk_text(self, text: str, content_type: str = "") -> List[Tuple[str, str]]:
+        """Returns (section heading, chunk text) pairs."""
+        if content_type == "captions" or (not content_type and looks_like_captions(text)):
+            sections = [("", sentences_from_captions(text))]
+        else:
+            sections = sections_from_article(text)
+        sections = [(heading, split_long_sentences(sents)) for heading, sents in sections]
+
+        # One embedding batch for the whole document, then split the similarities per section
+        all_sentences = [s for _, sents in sections for s in sents]
+        if self.semantic and len(all_sentences) > 1:
+            sims = adjacent_similarities(all_sentences)
+            threshold = np.percentile(sims, CHUNK_BREAKPOINT_PERCENTILE)
+            all_breaks = sims < threshold
+        else:
+            all_breaks = np.zeros(max(len(all_sentences) - 1, 0), dtype=bool)
+
+        chunks, offset = [], 0
+        for heading, sents in sections:
+            breaks = all_breaks[offset:offset + len(sents) - 1]
+            offset += len(sents)
+            chunks.extend((heading, c) for c in group_sentences(sents, breaks))
+        return chunks
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        all_nodes = []
+        for node in nodes:
+            with span("chunking"):
+                chunks = self.chunk_text(node.get_content(), node.metadata.get("content_type", ""))
+            parsed = build_nodes_from_splits([text for _, text in chunks], node, id_func=self.id_func)
+            for i, (child, (heading, _)) in enumerate(zip(parsed, chunks)):
+                child.metadata["chunk_index"] = i
+                if heading:
+                    child.metadata["section"] = heading
+            all_nodes.extend(parsed)
+        return all_nodes
@@ -1,21 +1,43 @@
 #core.py
 #here we are using chromaDB{which is a "vector database"} and ChromaDB (the cabinet) can hold many different "collections" (drawers).
 #  We could have one for web pages, one for user notes, one for PDF documents, etc. and we retrive it using specific ID.
-import os, requests, chromadb
+import os, sys, time, requests
+import numpy as np
 from bs4 import BeautifulSoup
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.ollama import Ollama
 
-Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
-Settings.llm = Ollama(model="gemma:2b", request_timeout=300.0)
+# Make the project root importable when this file is run directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-db = chromadb.PersistentClient(path="./vector_db")
-collection = db.get_or_create_collection("user_collection_local")
-vector_store = ChromaVectorStore(chroma_collection=collection)
-index = None
+from ai_engine.chunking import StructureAwareChunker
+from ai_engine.dedup import DedupIndex, minhash_signature, DEDUP_ENABLED
+from ai_engine.embeddings import get_embed_model
+from ai_engine.ingest import UploadLog, iter_upload_documents
+from ai_engine.llm_gateway import gateway, GatewayLLM, PRIORITY_BACKGROUND, LLM_SUMMARY_DEADLINE
+from ai_engine.query_engine import get_query_engine, run_query
+from ai_engine import vector_index
+from ai_engine.vector_index import current_index, open_vector_store, publish_index
+from metrics import span, traced, registry
+from shared_state import VECTOR_INDEX, writer_lock
 
+# bge-small by default; EMBED_BACKEND=hash gives an offline, deterministic embedder
+Settings.embed_model = get_embed_model()
+# All LLM calls go through the shared gateway; the default LLM is the interactive (Q&A) lane
+Settings.llm = GatewayLLM()
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./vector_db")
+DATA_PATH = os.getenv("DATA_PATH", "/data")
+
+# MinHash signatures of everything indexed so far, for near-duplicate detection
+dedup_index = DedupIndex(os.getenv("DEDUP_DB_PATH", os.path.join(CHROMA_PATH, "dedup.sqlite3")))
+DEDUP_HITS = registry.counter("dedup_hits_total", "Captures skipped because the text was a near-duplicate.")
+# Uploads that were fully indexed (maintenance collects the chunks of the others)
+upload_log = UploadLog(os.getenv("UPLOAD_LOG_PATH", os.path.join(CHROMA_PATH, "uploads.sqlite3")))
+# How much of an uploaded file is sent to the LLM for its summary (the start of the document)
+SUMMARY_INPUT_CHARS = int(os.getenv("SUMMARY_INPUT_CHARS", 12000))
+
+
+@traced("fetch_text_from_url")
 def fetch_text_from_url(url: str) -> str:
     try:
         r = requests.get(url, timeout=10)
@@ -23,13 +45,28 @@ def fetch_text_from_url(url: str) -> str:
         soup = BeautifulSoup(r.text, "html.parser")
         for s in soup(["script", "style", "noscript", "header", "footer", "nav"]):
             s.decompose()
-        paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
-        return "\n\n".join(p for p in paragraphs if p)
+        # Keep headings (as "## Heading") so the chunker can respect the article's sections
+        blocks, paragraphs = [], 0
+        for el in soup.find_all(["h1", "h2", "h3", "h4", "p"]):
+            if el.name == "p":
+                text = el.get_text(strip=True)
+                if text:
+                    blocks.append(text)
+                    paragraphs += 1
+            else:
+                text = el.get_text(" ", strip=True)
+                if text:
+                    blocks.append(f"## {text}")
+        # A page with headings but no paragraphs has no real content
+        if not paragraphs:
+            return ""
+        return "\n\n".join(blocks)
     except Exception as e:
         print(f"Fetch failed: {e}")
         return ""
 
 
+@traced("generate_and_store_summary")
 def generate_and_store_summary(text_content: str, url: str) -> str:
     """
     Generates a summary of the provided text using the LLM
@@ -39,13 +76,14 @@ def generate_and_store_summary(text_content: str, url: str) -> str:
     prompt = f"Please provide a concise summary of the following text:\n\n{text_content}"
     
     try:
-        response = Settings.llm.complete(prompt)
-        summary_text = str(response)
+        # Summaries are background work: they wait behind interactive questions
+        summary_text = gateway.complete(prompt, priority=PRIORITY_BACKGROUND, deadline=LLM_SUMMARY_DEADLINE)
         
         # --- START OF FIX ---
         # 1. Manually embed the summary text using the LlamaIndex Setting
         print("Embedding summary using Settings.embed_model...")
-        summary_embedding = Settings.embed_model.get_text_embedding(summary_text)
+        with span("embedding"):
+            summary_embedding = Settings.embed_model.get_text_embedding(summary_text)
        
 
         summary_id = f"summary_{url}"
@@ -53,12 +91,14 @@ def generate_and_store_summary(text_content: str, url: str) -> str:
         # 2. Store the summary text AND its pre-computed embedding
     
         print("Upserting summary and pre-computed embedding into Chroma...")
-        collection.upsert(
-            documents=[summary_text],
-            embeddings=[summary_embedding], # <--- PASS THE EMBEDDING HERE
-            metadatas=[{"type": "summary", "source_url": url}],
-            ids=[summary_id]
-        )
+        with writer_lock(VECTOR_INDEX), span("chroma_upsert"):
+            open_vector_store(fresh=True)
+            vector_index.collection.upsert(
+                documents=[summary_text],
+                embeddings=[summary_embedding], # <--- PASS THE EMBEDDING HERE
+                metadatas=[{"type": "summary", "source_url": url, "indexed_at": int(time.time())}],
+                ids=[summary_id]
+            )
         
         print(f"Summary generated and stored with ID: {summary_id}")
         return summary_text
@@ -72,39 +112,134 @@ def process_url(url: str):
     text = fetch_text_from_url(url)
     if not text:
         return False     
+
+    # Mirrors, AMP pages and tracking-parameter variants: link instead of re-processing
+    if DEDUP_ENABLED:
+        with span("dedup_check"):
+            signature = minhash_signature(text)
+            duplicate = dedup_index.find_duplicate(signature)
+        if duplicate:
+            existing_doc, similarity = duplicate
+            print(f"Near-duplicate of {existing_doc} (similarity {similarity:.2f}); linking instead of re-indexing.")
+            dedup_index.link(url, existing_doc)
+            DEDUP_HITS.inc()
+            return True
+
     print("Generating and storing summary...")
     generate_and_store_summary(text, url)
     print("Indexing full document for RAG...")
-    os.makedirs("/data", exist_ok=True)
-    file_path = os.path.join("/data", "page.txt")
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(text)
-        
-    docs = SimpleDirectoryReader("/data").load_data()
-    
-    global index
-    # This indexes the *chunks* of the full document using the correct model
-    index = VectorStoreIndex.from_documents(docs, vector_store=vector_store)
+    # One writer at a time across all workers: page.txt and the vector store are shared
+    with writer_lock(VECTOR_INDEX):
+        open_vector_store(fresh=True)
+        os.makedirs(DATA_PATH, exist_ok=True)
+        file_path = os.path.join(DATA_PATH, "page.txt")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+        docs = SimpleDirectoryReader(DATA_PATH).load_data()
+        for doc in docs:
+            # indexed_at tells maintenance which capture of a URL is the latest
+            doc.metadata.update({"source_url": url, "content_type": "article", "indexed_at": int(time.time())})
+            # Bookkeeping fields shouldn't end up in the embedded or prompted text
+            doc.excluded_embed_metadata_keys += ["source_url", "content_type", "chunk_index", "indexed_at"]
+            doc.excluded_llm_metadata_keys += ["content_type", "chunk_index", "indexed_at"]
+
+        # This indexes the *chunks* of the full document using the correct model
+        # (chunking + embedding + writing to Chroma all happen inside this call)
+        with span("index_from_documents"):
+            new_index = VectorStoreIndex.from_documents(
+                docs, storage_context=vector_index.storage_context, transformations=[StructureAwareChunker()]
+            )
+        # Tell the other workers to reload their index and query engine
+        publish_index(new_index)
+    if DEDUP_ENABLED:
+        dedup_index.add(url, signature)
+        dedup_index.link(url, url)
     print("Full document indexing complete.")
     return True
 
+@traced("process_file")
+def process_file(path: str, doc_id: str, file_name: str) -> dict:
+    """
+    Indexes an uploaded file (PDF, text, .vtt/.srt) batch by batch: each batch of pages/cues
+    is chunked, embedded and written on its own, so memory stays bounded and the first pages
+    are queryable while the rest is still being processed.
+    Returns counts for the response; "duplicate_of" is set when the file was already indexed.
+    """
+    batch_ids, characters = [], 0
+    summary_input, signature = "", None
+
+    for doc in iter_upload_documents(path, doc_id, file_name):
+        doc.metadata["indexed_at"] = int(time.time())
+        doc.excluded_embed_metadata_keys += ["source_doc", "file_name", "content_type", "location", "chunk_index", "indexed_at"]
+        doc.excluded_llm_metadata_keys += ["content_type", "chunk_index", "indexed_at"]
+        with writer_lock(VECTOR_INDEX):
+            open_vector_store(fresh=True)
+            with span("index_from_documents"):
+                new_index = VectorStoreIndex.from_documents(
+                    [doc], storage_context=vector_index.storage_context, transformations=[StructureAwareChunker()]
+                )
+            # Every batch is announced, so other workers pick up partial results
+            publish_index(new_index)
+        batch_ids.append(doc.doc_id)
+        characters += len(doc.text)
+        if len(summary_input) < SUMMARY_INPUT_CHARS:
+            summary_input += doc.text[:SUMMARY_INPUT_CHARS - len(summary_input)]
+        if DEDUP_ENABLED:
+            # The MinHash of a union is the element-wise minimum of the parts' MinHashes
+            batch_signature = minhash_signature(doc.text)
+            signature = batch_signature if signature is None else np.minimum(signature, batch_signature)
+        print(f"Indexed batch {len(batch_ids)} of {file_name} ({doc.metadata['location']}).")
+
+    if not batch_ids:
+        return {"batches": 0, "characters": 0, "duplicate_of": None}
+
+    # Dedup can only be decided once the whole file has been seen
+    if DEDUP_ENABLED:
+        duplicate = dedup_index.find_duplicate(signature)
+        if duplicate:
+            existing_doc, similarity = duplicate
+            print(f"Near-duplicate of {existing_doc} (similarity {similarity:.2f}); removing the new copy.")
+            with writer_lock(VECTOR_INDEX):
+                open_vector_store(fresh=True)
+                for batch_id in batch_ids:
+                    vector_index.vector_store.delete(batch_id)
+                publish_index()
+            dedup_index.link(doc_id, existing_doc)
+            DEDUP_HITS.inc()
+            return {"batches": len(batch_ids), "characters": characters, "duplicate_of": existing_doc}
+        dedup_index.add(doc_id, signature)
+        dedup_index.link(doc_id, doc_id)
+
+    # Every batch is in the store; from here on the upload is kept even if the summary fails
+    upload_log.complete(doc_id, len(batch_ids))
+    generate_and_store_summary(summary_input, doc_id)
+    return {"batches": len(batch_ids), "characters": characters, "duplicate_of": None}
+
+def ask_question_with_stats(question: str):
+    """
+    Answers a question with RAG and also returns the query stats
+    (prompt tokens, latency) as a dict.
+    """
+    # One consistent (index, version) pair, even while writers and maintenance swap them
+    current, version = current_index()
+    query_engine = get_query_engine(current, version)
+    return run_query(query_engine, question)
+
 def ask_question(question: str):
-    global index
-    if not index:
-        print("Reloading index from vector store...")
-        index = VectorStoreIndex.from_vector_store(vector_store)
-        
-    query_engine = index.as_query_engine()
-    resp = query_engine.query(question)
-    return str(resp)
+    answer, _ = ask_question_with_stats(question)
+    return answer
 
 def get_summary(url: str) -> str:
     """
     Retrieves a stored summary from the vector store by its unique ID.
     """
-    summary_id = f"summary_{url}"
+    # A URL that was linked to an earlier copy of the same article shares its summary
+    doc_id = dedup_index.resolve(url) or url
+    summary_id = f"summary_{doc_id}"
+    open_vector_store()
     try:
-        result = collection.get(ids=[summary_id], include=["documents"])
+        result = vector_index.collection.get(ids=[summary_id], include=["documents"])
         
         if result and result['documents']:
             return result['documents'][0]
@@ -0,0 +1,84 @@
+# cues.py
+# The one caption parser/cleaner, shared by every path that reads subtitles:
+#   ai_engine/ingest.py              uploaded .vtt/.srt files, cue by cue
+#   video_extracter/transcript_store.py  downloaded caption tracks -> timed segments
+#   video_extracter/preprocess.py    caption/ASR text before it is summarized and indexed
+# Cleaning = inline timing/styling tags (<00:00:01.000>, <c>) and bracketed artifacts ([Music])
+# removed, whitespace collapsed, and the rolling duplicate lines of auto-captions (every line
+# shown once with word timings and again plain, often in the next cue) dropped.
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+CUE_TIMING = re.compile(r"((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})")
+_TAGS = re.compile(r"<.*?>")
+_ARTIFACTS = re.compile(r"\[.*?\]")
+
+
+def parse_timestamp(ts: str) -> float:
+    """"01:02:03.500" / "02:03,500" -> seconds."""
+    seconds = 0.0
+    for part in ts.replace(",", ".").split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def clean_line(line: str) -> str:
+    """One caption line without tags, [artifacts] and extra whitespace ("" if nothing is left)."""
+    return " ".join(_ARTIFACTS.sub("", _TAGS.sub("", line)).split())
+
+
+class DuplicateLines:
+    """Drops a cleaned line that repeats the previous kept one (across cues, like auto-captions do)."""
+
+    def __init__(self):
+        self.last = ""
+
+    def keep(self, line: str) -> bool:
+        if not line or line == self.last:
+            return False
+        self.last = line
+        return True
+
+
+def clean_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Cleaned, de-duplicated text lines of caption or ASR text that may or may not still have
+    its cue structure (timing lines are dropped, everything else is treated as text).
+    """
+    duplicates = DuplicateLines()
+    for line in lines:
+        if CUE_TIMING.search(line):
+            continue
+        line = clean_line(line)
+        if duplicates.keep(line):
+            yield line
+
+
+def iter_cues(lines: Iterable[str]) -> Iterator[Tuple[float, Optional[float], List[str]]]:
+    """
+    (start, end, cleaned lines) for each cue of WebVTT or SRT text, read line by line so a
+    file can be streamed. A cue is its timing line plus the text up to the next blank line;
+    headers, NOTE blocks and SRT/VTT cue numbers are outside any cue and skipped. Cues left
+    empty by the cleaning are not yielded.
+    """
+    duplicates = DuplicateLines()
+    start = end = None
+    text: List[str] = []
+    for raw in lines:
+        line = raw.strip()
+        timing = CUE_TIMING.search(line)
+        if timing:
+            if start is not None and text:
+                yield start, end, text
+            start, end = parse_timestamp(timing.group(1)), parse_timestamp(timing.group(2))
+            text = []
+        elif not line:
+            if start is not None and text:
+                yield start, end, text
+            start, text = None, []
+        elif start is not None:
+            line = clean_line(line)
+            if duplicates.keep(line):
+                text.append(line)
+    if start is not None and text:
+        yield start, end, text
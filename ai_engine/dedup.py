@@ -0,0 +1,156 @@
+# dedup.py
+# Near-duplicate detection at ingest time.
+# The same article often arrives from mirrors, AMP pages, or URLs with tracking parameters.
+# Instead of summarizing + embedding every copy, we compute a MinHash signature of the
+# cleaned text, look for similar documents with LSH (locality sensitive hashing), and if
+# one is found we just link the new URL to the existing document.
+#
+# Signatures, LSH buckets, and URL links are kept in a small SQLite file.
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+from typing import Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import numpy as np
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.85))  # estimated Jaccard similarity
+NUM_PERM = 128
+LSH_BANDS = 32  # 32 bands x 4 rows; pairs above ~0.5 similarity almost always share a bucket
+SHINGLE_SIZE = 5
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Fixed seed so signatures stay comparable across restarts
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+# Query parameters that never change the content of a page
+_TRACKING_PARAMS = re.compile(r"^(utm_.*|fbclid|gclid|dclid|mc_cid|mc_eid|ref|ref_src|igshid|amp|outputtype)$", re.I)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Reduces URL variants of the same page to one key:
+    drops tracking parameters, fragments, 'www.'/'m.'/'amp.' host prefixes and AMP path suffixes.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m.", "amp."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = re.sub(r"/amp/?$|\.amp$", "", parts.path).rstrip("/") or "/"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)))
+    return urlunsplit((parts.scheme.lower(), host, path, query, ""))
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint64 values) of the text's word shingles."""
+    hashes = _shingle_hashes(text)
+    if hashes.size == 0:
+        return np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    # All permutations of all shingles in one (NUM_PERM x n_shingles) operation
+    permuted = ((np.outer(_PERM_A, hashes) % _MERSENNE_PRIME) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return (permuted & _MAX_HASH).min(axis=1)
+
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two documents behind the signatures."""
+    return float(np.mean(a == b))
+
+
+def _band_keys(signature: np.ndarray):
+    rows = NUM_PERM // LSH_BANDS
+    for band in range(LSH_BANDS):
+        chunk = signature[band * rows:(band + 1) * rows]
+        yield band, hashlib.blake2b(chunk.tobytes(), digest_size=8).hexdigest()
+
+
+class DedupIndex:
+    """SQLite-backed MinHash LSH index plus the URL -> document links."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY, signature BLOB NOT NULL);
+                CREATE TABLE IF NOT EXISTS lsh_buckets (band INTEGER, bucket TEXT, doc_id TEXT);
+                CREATE INDEX IF NOT EXISTS lsh_bucket_idx ON lsh_buckets (band, bucket);
+                CREATE TABLE IF NOT EXISTS url_links (url_key TEXT PRIMARY KEY, doc_id TEXT NOT NULL);
+            """)
+
+    def find_duplicate(self, signature: np.ndarray, threshold: float = DEDUP_THRESHOLD) -> Optional[Tuple[str, float]]:
+        """Returns (doc_id, similarity) of the most similar indexed document above the threshold."""
+        with self._lock:
+            candidates = set()
+            for band, bucket in _band_keys(signature):
+                rows = self._conn.execute(
+                    "SELECT doc_id FROM lsh_buckets WHERE band = ? AND bucket = ?", (band, bucket)
+                ).fetchall()
+                candidates.update(r[0] for r in rows)
+
+            best = None
+            for doc_id in candidates:
+                row = self._conn.execute("SELECT signature FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+                if not row:
+                    continue
+                sim = estimate_similarity(signature, np.frombuffer(row[0], dtype=np.uint64))
+                if sim >= threshold and (best is None or sim > best[1]):
+                    best = (doc_id, sim)
+            return best
+
+    def add(self, doc_id: str, signature: np.ndarray):
+        """Indexes (or re-indexes) a document's signature."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM lsh_buckets WHERE doc_id = ?", (doc_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, signature) VALUES (?, ?)",
+                (doc_id, signature.astype(np.uint64).tobytes()),
+            )
+            self._conn.executemany(
+                "INSERT INTO lsh_buckets (band, bucket, doc_id) VALUES (?, ?, ?)",
+                [(band, bucket, doc_id) for band, bucket in _band_keys(signature)],
+            )
+
+    def remove(self, doc_id: str):
+        """Forgets a document and every URL linked to it."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM lsh_buckets WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("DELETE FROM url_links WHERE doc_id = ?", (doc_id,))
+
+    def link(self, url: str, doc_id: str):
+        """Records that `url` (and its tracking/AMP variants) shows the document `doc_id`."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO url_links (url_key, doc_id) VALUES (?, ?)",
+                (normalize_url(url), doc_id),
+            )
+
+    def resolve(self, url: str) -> Optional[str]:
+        """The document a URL was linked to, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_id FROM url_links WHERE url_key = ?", (normalize_url(url),)
+            ).fetchone()
+            return row[0] if row else None
@@ -0,0 +1,214 @@
+# embeddings.py
+# Picks the embedding model used by both core.py files, based on the EMBED_BACKEND env variable:
+#   huggingface  (default) BAAI/bge-small-en-v1.5 through PyTorch
+#   onnx         the same model exported to ONNX (int8-quantized unless EMBED_ONNX_QUANTIZED=0), run with onnxruntime on CPU
+#   hash         deterministic hashing embedder, needs no model download (benchmarks / offline runs)
+#
+# To create the ONNX model (needs `optimum[onnxruntime]` once, not at runtime):
+#   python ai_engine/embeddings.py export --output ./models/bge-small-onnx
+# This writes model.onnx and model_quantized.onnx (the default); --no-int8 skips the int8 copy,
+# which then needs EMBED_ONNX_QUANTIZED=0.
+import os
+import hashlib
+import argparse
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "huggingface")
+EMBED_MODEL_NAME = os.getenv("EMBED_MODEL_NAME", "BAAI/bge-small-en-v1.5")
+EMBED_DIM = 384  # bge-small output size
+
+# --- ONNX backend settings ---
+EMBED_ONNX_PATH = os.getenv("EMBED_ONNX_PATH", "./models/bge-small-onnx")
+EMBED_ONNX_QUANTIZED = os.getenv("EMBED_ONNX_QUANTIZED", "1") == "1"
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", 0))  # 0 lets onnxruntime decide
+EMBED_MAX_LENGTH = int(os.getenv("EMBED_MAX_LENGTH", 512))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+# Sequences are padded up to the nearest bucket instead of the longest text in the batch
+SEQUENCE_BUCKETS = (32, 64, 128, 256, 512)
+
+# bge models expect this prefix on queries (the same default HuggingFaceEmbedding uses)
+BGE_QUERY_INSTRUCTION = "Represent this question for searching relevant passages: "
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Deterministic "bag of hashed words" embedding.
+    Similar texts share words, so they still get similar vectors,
+    which is enough for exercising the pipeline without a real model.
+    """
+
+    dim: int = EMBED_DIM
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            h = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            idx = int.from_bytes(h[:4], "little") % self.dim
+            sign = 1.0 if h[4] & 1 else -1.0
+            vec[idx] += sign
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """
+    bge-small run through onnxruntime: CLS pooling + L2 normalization, like the PyTorch model.
+    Texts are grouped by token length and padded only up to their length bucket,
+    so a batch of short caption lines doesn't pay for 512-token padding.
+    """
+
+    model_dir: str = EMBED_ONNX_PATH
+    quantized: bool = EMBED_ONNX_QUANTIZED
+    threads: int = EMBED_THREADS
+    max_length: int = EMBED_MAX_LENGTH
+    query_instruction: str = BGE_QUERY_INSTRUCTION
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: Any = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        kwargs.setdefault("embed_batch_size", EMBED_BATCH_SIZE)
+        kwargs.setdefault("model_name", EMBED_MODEL_NAME)
+        super().__init__(**kwargs)
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise ImportError("EMBED_BACKEND=onnx needs `pip install onnxruntime tokenizers`")
+
+        model_file = "model_quantized.onnx" if self.quantized else "model.onnx"
+        model_path = os.path.join(self.model_dir, model_file)
+        if not os.path.exists(model_path):
+            hint = f"python ai_engine/embeddings.py export --output {self.model_dir}"
+            if self.quantized:
+                hint += " (writes the int8 model unless --no-int8 is given; or set EMBED_ONNX_QUANTIZED=0)"
+            raise FileNotFoundError(f"{model_path} not found. Export it with: {hint}")
+
+        options = ort.SessionOptions()
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=self.max_length)
+        self._tokenizer.no_padding()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _bucket(self, length: int) -> int:
+        for size in SEQUENCE_BUCKETS:
+            if length <= size:
+                return min(size, self.max_length)
+        return self.max_length
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        encodings = self._tokenizer.encode_batch(texts)
+        out = np.zeros((len(texts), EMBED_DIM), dtype=np.float32)
+
+        # Group texts by length bucket; each group is one onnxruntime call
+        groups = {}
+        for i, enc in enumerate(encodings):
+            groups.setdefault(self._bucket(len(enc.ids)), []).append(i)
+
+        for seq_len, idxs in groups.items():
+            input_ids = np.zeros((len(idxs), seq_len), dtype=np.int64)
+            attention = np.zeros((len(idxs), seq_len), dtype=np.int64)
+            for row, i in enumerate(idxs):
+                ids = encodings[i].ids
+                input_ids[row, :len(ids)] = ids
+                attention[row, :len(ids)] = 1
+            feeds = {"input_ids": input_ids, "attention_mask": attention}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self._session.run(None, feeds)[0]
+            out[idxs] = hidden[:, 0]  # CLS token
+
+        out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-12
+        return out.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed_batch([self.query_instruction + query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_batch(texts)
+
+
+def export_onnx_model(output_dir: str, model_name: str = EMBED_MODEL_NAME, int8: bool = True):
+    """
+    Exports the HuggingFace model to ONNX (model.onnx + tokenizer.json) and,
+    optionally, a dynamically int8-quantized copy (model_quantized.onnx).
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+    print(f"Exported {model_name} to {output_dir}/model.onnx")
+
+    if int8:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(
+            os.path.join(output_dir, "model.onnx"),
+            os.path.join(output_dir, "model_quantized.onnx"),
+            weight_type=QuantType.QInt8,
+        )
+        print(f"Wrote int8 model to {output_dir}/model_quantized.onnx")
+
+
+def get_embed_model(backend: str = EMBED_BACKEND):
+    """Creates the embedding model for the selected backend."""
+    if backend == "hash":
+        return HashEmbedding()
+    if backend == "onnx":
+        return OnnxEmbedding()
+    if backend == "huggingface":
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        return HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+    raise ValueError(f"Unknown EMBED_BACKEND: {backend}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export the embedding model to ONNX")
+    export.add_argument("--output", default=EMBED_ONNX_PATH)
+    export.add_argument("--model", default=EMBED_MODEL_NAME)
+    export.add_argument(
+        "--int8", action=argparse.BooleanOptionalAction, default=True,
+        help="Also write the int8-quantized model (the one EMBED_ONNX_QUANTIZED=1, the default, loads)",
+    )
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx_model(args.output, args.model, args.int8)
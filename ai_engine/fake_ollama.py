@@ -0,0 +1,103 @@
+# fake_ollama.py
+# A tiny stand-in for the Ollama HTTP server, for trying the LLM gateway without a real model.
+# It answers /api/generate with a canned (deterministic) response after an optional delay.
+#
+# Run it:   python fake_ollama.py --port 11435 --latency 0.5
+# Then:     OLLAMA_BASE_URL=http://127.0.0.1:11435 uvicorn main:app
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # Set on the server object by start_fake_ollama()
+    #   server.latency      seconds to sleep per generate call
+    #   server.fail_first   number of requests to answer with an error before succeeding
+    #   server.fail_status  the status of those errors (503 by default; 4xx to test bad requests)
+    #   server.requests     list of received payloads (for inspection)
+    protocol_version = "HTTP/1.1"  # allow keep-alive connections like the real server
+
+    def log_message(self, format, *args):
+        pass  # keep output quiet
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (e.g. its deadline passed)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "gemma:2b"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        with self.server.lock:
+            self.server.requests.append(payload)
+            if self.server.fail_first > 0:
+                self.server.fail_first -= 1
+                self._send_json(self.server.fail_status, {"error": "server busy"})
+                return
+
+        prompt = payload.get("prompt")
+        if not prompt:
+            # An empty prompt only loads the model (used for keep-alive warm-up)
+            self._send_json(200, {"model": payload.get("model"), "response": "", "done": True})
+            return
+
+        time.sleep(self.server.latency)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+        self._send_json(200, {
+            "model": payload.get("model"),
+            "response": f"Fake answer {digest} for a prompt of {len(prompt)} characters.",
+            "done": True,
+            "prompt_eval_count": len(prompt.split()),
+        })
+
+
+def start_fake_ollama(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_first: int = 0,
+                      fail_status: int = 503):
+    """
+    Starts the fake server on a background thread.
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+    server.latency = latency
+    server.fail_first = fail_first
+    server.fail_status = fail_status
+    server.requests = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama HTTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_fake_ollama(args.host, args.port, args.latency)
+    print(f"Fake Ollama listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,177 @@
+# ingest.py
+# Text extraction for uploaded files (PDF, plain text, .vtt/.srt subtitles).
+# Everything here is a generator over a file on disk, so a 500-page PDF or a 3-hour
+# subtitle file is never held in memory at once:
+#   iter_pdf_pages      one page at a time (pypdf, optional dependency)
+#   iter_text_blocks    paragraphs of a text/markdown file
+#   iter_subtitle_cues  one cue at a time, with timestamps and caption artifacts removed
+#   iter_upload_documents  groups those pieces into LlamaIndex Documents of about
+#                          INGEST_BATCH_CHARS characters, which core.process_file indexes one by one
+#   UploadLog           records uploads whose indexing finished, so maintenance can tell the
+#                       chunks of an interrupted upload from those of a finished one
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Iterator, Tuple
+
+from llama_index.core import Document
+
+from ai_engine.cues import iter_cues
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 200 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # request body is written to disk in pieces of this size
+# Text indexed per batch; each batch becomes queryable as soon as it is written
+INGEST_BATCH_CHARS = int(os.getenv("INGEST_BATCH_CHARS", 20000))
+
+# extension -> content_type used by the chunker
+SUPPORTED_TYPES = {
+    ".pdf": "document",
+    ".txt": "document",
+    ".md": "document",
+    ".vtt": "captions",
+    ".srt": "captions",
+}
+
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(\w)")
+_LINE_WRAP = re.compile(r"(?<!\n)\n(?!\n)")
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+def file_kind(filename: str) -> str:
+    ext = os.path.splitext(filename.lower())[1]
+    if ext not in SUPPORTED_TYPES:
+        raise UnsupportedFileType(f"Unsupported file type '{ext}'. Supported: {', '.join(sorted(SUPPORTED_TYPES))}")
+    return ext
+
+
+def iter_pdf_pages(path: str) -> Iterator[Tuple[str, str]]:
+    """Yields ("page N", text) for each page of a PDF."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise UnsupportedFileType("PDF upload needs the 'pypdf' package (pip install pypdf)")
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        text = (page.extract_text() or "").strip()
+        # PDF text comes back hard-wrapped; rejoin the lines so sentences stay whole
+        text = _LINE_WRAP.sub(" ", _HYPHEN_BREAK.sub(r"\1\2", text))
+        if text:
+            yield f"page {number}", text
+
+
+def iter_text_blocks(path: str) -> Iterator[Tuple[str, str]]:
+    """Yields ("line N", paragraph) for each blank-line separated paragraph of a text file."""
+    block, start = [], 1
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                if not block:
+                    start = number
+                block.append(line.rstrip())
+            elif block:
+                yield f"line {start}", "\n".join(block)
+                block = []
+        if block:
+            yield f"line {start}", "\n".join(block)
+
+
+def iter_subtitle_cues(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yields ("HH:MM:SS", text) for each cue of a .vtt or .srt file.
+    Cleaned like every other caption path (ai_engine/cues.py), but cue by cue.
+    """
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for start, _, lines in iter_cues(f):
+            yield _format_seconds(start), " ".join(lines)
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def iter_segments(path: str, ext: str) -> Iterator[Tuple[str, str]]:
+    if ext == ".pdf":
+        return iter_pdf_pages(path)
+    if ext in (".vtt", ".srt"):
+        return iter_subtitle_cues(path)
+    return iter_text_blocks(path)
+
+
+def iter_upload_documents(path: str, doc_id: str, file_name: str,
+                          batch_chars: int = INGEST_BATCH_CHARS) -> Iterator[Document]:
+    """
+    Groups the file's pages/paragraphs/cues into Documents of about `batch_chars` characters.
+    Metadata records where each batch starts and ends ("page 3" / "00:12:40").
+    """
+    ext = file_kind(file_name)
+    content_type = SUPPORTED_TYPES[ext]
+    # Captions become one line per cue, which the chunker rebuilds into sentences
+    joiner = "\n" if content_type == "captions" else "\n\n"
+
+    parts, size, first, last, batch = [], 0, None, None, 0
+
+    def make_document() -> Document:
+        return Document(
+            text=joiner.join(parts),
+            id_=f"{doc_id}#{batch}",
+            metadata={
+                "source_doc": doc_id,
+                "file_name": file_name,
+                "content_type": content_type,
+                "location": first if first == last else f"{first} - {last}",
+            },
+        )
+
+    for location, text in iter_segments(path, ext):
+        if parts and size + len(text) > batch_chars:
+            yield make_document()
+            parts, size, first, batch = [], 0, None, batch + 1
+        parts.append(text)
+        size += len(text)
+        first = first or location
+        last = location
+    if parts:
+        yield make_document()
+
+
+class UploadLog:
+    """SQLite record of the uploads process_file finished indexing."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS completed_uploads (
+                    doc_id TEXT PRIMARY KEY, batches INTEGER, completed_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+            """)
+            # Uploads indexed before the log existed have no record either way
+            self._conn.execute("INSERT OR IGNORE INTO settings VALUES ('created_at', ?)", (str(time.time()),))
+
+    def created_at(self) -> float:
+        with self._lock:
+            return float(self._conn.execute("SELECT value FROM settings WHERE key = 'created_at'").fetchone()[0])
+
+    def complete(self, doc_id: str, batches: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completed_uploads (doc_id, batches, completed_at) VALUES (?, ?, ?)",
+                (doc_id, batches, time.time()),
+            )
+
+    def is_complete(self, doc_id: str) -> bool:
+        """Whether process_file finished indexing this upload (meaningful since created_at())."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM completed_uploads WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row is not None
+
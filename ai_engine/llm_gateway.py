@@ -0,0 +1,268 @@
+# llm_gateway.py
+# Every call to Ollama goes through this "gateway" instead of a bare global client.
+# It gives us:
+#   - a bounded number of requests in flight (gemma:2b on CPU can't do many at once anyway)
+#   - priority lanes, so an interactive /query is served before queued background summaries
+#   - model keep-alive, so Ollama doesn't unload the model between requests
+#   - per-request deadlines and retry with exponential backoff
+# It talks to Ollama's plain HTTP API, so it can be pointed at a fake server (see fake_ollama.py).
+import os
+import time
+import heapq
+import itertools
+import threading
+import logging
+from typing import Any, Optional
+
+import requests
+from llama_index.core.llms import CustomLLM, CompletionResponse, CompletionResponseGen, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from metrics import span, registry
+
+log = logging.getLogger(__name__)
+
+LLM_QUEUE_WAIT = registry.histogram("llm_queue_wait_seconds", "Time LLM requests waited for a free slot.")
+LLM_RETRIES = registry.counter("llm_retries_total", "LLM requests that were retried.")
+
+# --- Configuration (environment variables) ---
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma:2b")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 2))
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 300))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", 1.0))
+LLM_QUERY_DEADLINE = float(os.getenv("LLM_QUERY_DEADLINE", 120))
+LLM_SUMMARY_DEADLINE = float(os.getenv("LLM_SUMMARY_DEADLINE", 900))
+
+# --- Priority lanes (lower number is served first) ---
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+# Token usage of the LLM calls made by the current thread (see reset_usage/get_usage)
+_usage = threading.local()
+
+
+def reset_usage():
+    """Starts counting token usage for the calls made by the current thread."""
+    _usage.prompt_tokens = 0
+    _usage.completion_tokens = 0
+    _usage.calls = 0
+
+
+def get_usage() -> dict:
+    """Returns the token usage counted since the last reset_usage() on this thread."""
+    return {
+        "prompt_tokens": getattr(_usage, "prompt_tokens", 0),
+        "completion_tokens": getattr(_usage, "completion_tokens", 0),
+        "llm_calls": getattr(_usage, "calls", 0),
+    }
+
+
+def _record_usage(prompt: str, body: dict):
+    if not hasattr(_usage, "calls"):
+        reset_usage()
+    # Ollama reports real token counts; fall back to a word count if they are missing
+    _usage.prompt_tokens += body.get("prompt_eval_count") or len(prompt.split())
+    _usage.completion_tokens += body.get("eval_count") or len(body.get("response", "").split())
+    _usage.calls += 1
+
+
+class LLMGatewayError(RuntimeError):
+    """Raised when Ollama could not produce a completion (after retries)."""
+
+
+class LLMDeadlineExceeded(LLMGatewayError):
+    """Raised when a request's deadline passed before it could be served."""
+
+
+class PrioritySemaphore:
+    """
+    A bounded semaphore where waiters are woken in priority order
+    (then first-come-first-served inside the same priority).
+    """
+
+    def __init__(self, value: int):
+        if value < 1:
+            raise ValueError("PrioritySemaphore needs at least one slot")
+        self._value = value
+        self._cond = threading.Condition()
+        self._waiters = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+
+    def acquire(self, priority: int = PRIORITY_BACKGROUND, timeout: Optional[float] = None) -> bool:
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            me = (priority, next(self._seq))
+            heapq.heappush(self._waiters, me)
+            try:
+                while not (self._value > 0 and self._waiters[0] == me):
+                    remaining = None if end is None else end - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._value -= 1
+                return True
+            finally:
+                self._waiters.remove(me)
+                heapq.heapify(self._waiters)
+                # Someone else might now be at the head of the queue
+                self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._value += 1
+            self._cond.notify_all()
+
+    def waiting(self) -> int:
+        with self._cond:
+            return len(self._waiters)
+
+
+class LLMGateway:
+    """
+    Thin client for Ollama's /api/generate with concurrency control,
+    priority lanes, keep-alive, deadlines, and retries.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        model: str = OLLAMA_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        keep_alive: str = LLM_KEEP_ALIVE,
+        request_timeout: float = LLM_REQUEST_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_backoff: float = LLM_RETRY_BACKOFF,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._slots = PrioritySemaphore(max_concurrency)
+        # A Session re-uses the HTTP connection to Ollama between requests
+        self._http = requests.Session()
+
+    def complete(
+        self,
+        prompt: str,
+        priority: int = PRIORITY_BACKGROUND,
+        deadline: Optional[float] = None,
+        options: Optional[dict] = None,
+    ) -> str:
+        """
+        Sends a prompt to Ollama and returns the generated text.
+        `deadline` is the number of seconds the caller is willing to wait in total
+        (queueing + generation + retries).
+        """
+        end = None if deadline is None else time.monotonic() + deadline
+
+        lane = "interactive" if priority <= PRIORITY_INTERACTIVE else "background"
+        waited_from = time.perf_counter()
+        acquired = self._slots.acquire(priority, timeout=deadline)
+        LLM_QUEUE_WAIT.observe(time.perf_counter() - waited_from, lane=lane)
+        if not acquired:
+            raise LLMDeadlineExceeded("Timed out waiting for a free LLM slot.")
+        try:
+            with span(f"llm_generate_{lane}"):
+                return self._generate_with_retries(prompt, end, options)
+        finally:
+            self._slots.release()
+
+    def warm_up(self) -> bool:
+        """
+        Asks Ollama to load the model (a request with no prompt just loads it)
+        and keep it resident for `keep_alive`, so the first real request doesn't pay the load time.
+        """
+        try:
+            r = self._http.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "keep_alive": self.keep_alive},
+                timeout=self.request_timeout,
+            )
+            r.raise_for_status()
+            log.info(f"LLM model '{self.model}' loaded and kept alive for {self.keep_alive}.")
+            return True
+        except requests.RequestException as e:
+            log.info(f"LLM warm-up failed: {e}")
+            return False
+
+    def queue_depth(self) -> int:
+        """Number of requests currently waiting for a slot."""
+        return self._slots.waiting()
+
+    def _generate_with_retries(self, prompt: str, end: Optional[float], options: Optional[dict]) -> str:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            timeout = self.request_timeout
+            if end is not None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise LLMDeadlineExceeded("LLM request deadline exceeded.")
+                timeout = min(timeout, remaining)
+
+            try:
+                r = self._http.post(f"{self.base_url}/api/generate", json=payload, timeout=timeout)
+                # 4xx means the request itself is wrong; retrying won't help
+                if 400 <= r.status_code < 500:
+                    raise LLMGatewayError(f"Ollama rejected the request ({r.status_code}): {r.text}")
+                r.raise_for_status()
+                body = r.json()
+                _record_usage(prompt, body)
+                return body.get("response", "")
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                last_error = e
+                log.info(f"LLM request failed (attempt {attempt + 1}/{self.max_retries + 1}): {e}")
+
+            if attempt < self.max_retries:
+                LLM_RETRIES.inc()
+                backoff = self.retry_backoff * (2 ** attempt)
+                if end is not None and time.monotonic() + backoff >= end:
+                    break
+                time.sleep(backoff)
+
+        if end is not None and time.monotonic() >= end:
+            raise LLMDeadlineExceeded(f"LLM request deadline exceeded: {last_error}")
+        raise LLMGatewayError(f"LLM request failed after retries: {last_error}")
+
+
+class GatewayLLM(CustomLLM):
+    """
+    LlamaIndex LLM that sends completions through the shared LLMGateway,
+    so query engines get the same concurrency limits and priority lanes.
+    """
+
+    priority: int = PRIORITY_INTERACTIVE
+    deadline: Optional[float] = LLM_QUERY_DEADLINE
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name=gateway.model)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        text = gateway.complete(prompt, priority=self.priority, deadline=self.deadline)
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        # Ollama streaming isn't used by the app; yield the full answer once
+        text = gateway.complete(prompt, priority=self.priority, deadline=self.deadline)
+        yield CompletionResponse(text=text, delta=text)
+
+
+# One gateway per process, shared by summaries and Q&A
+gateway = LLMGateway()
@@ -0,0 +1,511 @@
+# maintenance.py
+# Housekeeping for the shared vector store: the "user_collection_local" Chroma collection
+# (summaries, and the chunks unless VECTOR_STORE_MODE=quantized) plus the quantized chunk tier.
+# Only summaries are upserted by id; every re-capture of a URL (or re-processing of a video)
+# adds a whole new set of chunk rows, so without this the SQLite file and the HNSW index
+# grow without bound and queries get slower.
+#   gc        deletes superseded chunks (older captures of the same URL/document; the latest
+#             capture is kept) and orphaned ones: chunks of a document that dedup now links to
+#             another one, chunks of an upload that never finished, summaries without chunks
+#   compact   copies the collection into a fresh one (a new HNSW graph without the deleted
+#             elements, and a vacuumed SQLite file) and compacts the quantized tier
+#   run       gc + compact
+#   snapshot  a consistent copy of the store files in SNAPSHOT_DIR
+#   restore   puts a snapshot back (embedded Chroma only; with a Chroma server, stop it and
+#             copy the snapshot over its --path instead)
+# Every action reports the store size and the vector-search latency before and after.
+# While compact/snapshot/restore run the API is read-only (shared_state.set_maintenance):
+# /capture and /upload answer 503, queries keep working. Queries that hit the moment the
+# store is swapped may fail once; every worker reopens the new store within a second.
+#
+#   python -m ai_engine.maintenance report
+#   python -m ai_engine.maintenance gc --dry-run
+#   python -m ai_engine.maintenance run
+#   python -m ai_engine.maintenance snapshot
+#   python -m ai_engine.maintenance restore 20261019-031500
+# or POST /admin/maintenance/{action} as a user listed in ADMIN_EMAILS.
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import argparse
+import contextlib
+from typing import Optional
+
+import numpy as np
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+# Make the project root importable when this file is run directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_engine.dedup import DedupIndex, normalize_url
+from ai_engine.ingest import UploadLog
+from ai_engine.quantized_store import QuantizedVectorStore
+from metrics import registry
+from shared_state import (
+    CHROMA_HOST, COLLECTION_NAME, STATE_DIR, VECTOR_INDEX, VECTOR_STORE,
+    bump_version, chroma_client, file_lock, get_version, set_maintenance, writer_lock,
+)
+
+log = logging.getLogger(__name__)
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./vector_db")
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "chroma")
+DEDUP_DB_PATH = os.getenv("DEDUP_DB_PATH", os.path.join(CHROMA_PATH, "dedup.sqlite3"))
+UPLOAD_LOG_PATH = os.getenv("UPLOAD_LOG_PATH", os.path.join(CHROMA_PATH, "uploads.sqlite3"))
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./snapshots")
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", 5))  # older snapshots are deleted
+# Chunks of an upload this recent may still be in progress; gc leaves them alone
+GC_GRACE_SECONDS = int(os.getenv("GC_GRACE_SECONDS", 3600))
+MAINTENANCE_QUERY_PROBES = int(os.getenv("MAINTENANCE_QUERY_PROBES", 50))
+SCAN_PAGE = 1000  # rows per get()/add()/delete() call
+
+ACTIONS = ("report", "gc", "compact", "run", "snapshot", "restore")
+
+DELETED = registry.counter("maintenance_deleted_total", "Vector store rows deleted by maintenance, by reason.")
+
+# Files that belong to the running deployment, not to the store
+_SKIPPED_SUFFIXES = (".lock", "-wal", "-shm", "-journal", ".compact", ".restore")
+_SKIPPED_NAMES = {"state.sqlite3"}
+
+
+class MaintenanceError(Exception):
+    pass
+
+
+# --- Opening the store ---
+
+def _open_client():
+    return chroma_client(CHROMA_PATH, get_version(VECTOR_STORE))
+
+
+def _open_quantized() -> Optional[QuantizedVectorStore]:
+    path = os.path.join(CHROMA_PATH, "quantized")
+    if VECTOR_STORE_MODE != "quantized" and not os.path.exists(path):
+        return None
+    return QuantizedVectorStore(path)
+
+
+def _finish_interrupted_compaction(client):
+    """A compaction that died between dropping the old collection and renaming the new one."""
+    names = {getattr(c, "name", c) for c in client.list_collections()}
+    compact_name = f"{COLLECTION_NAME}_compact"
+    if compact_name in names and COLLECTION_NAME not in names:
+        log.warning("Finishing an interrupted compaction.")
+        client.get_collection(compact_name).modify(name=COLLECTION_NAME)
+    elif compact_name in names:
+        client.delete_collection(compact_name)
+
+
+# --- Size and latency ---
+
+def _disk_bytes(path: str) -> int:
+    snapshots = os.path.abspath(SNAPSHOT_DIR)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != snapshots]
+        for name in files:
+            with contextlib.suppress(OSError):
+                total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _sample_probes(collection, n: int = MAINTENANCE_QUERY_PROBES) -> list:
+    """Stored embeddings to query with; the same vectors are used before and after."""
+    count = collection.count()
+    if not count:
+        return []
+    rng = np.random.default_rng(0)
+    offsets = sorted(set(rng.integers(0, count, size=min(n, count)).tolist()))
+    probes = []
+    for offset in offsets:
+        got = collection.get(limit=1, offset=offset, include=["embeddings"])
+        if len(got["embeddings"]):
+            probes.append(np.asarray(got["embeddings"][0], dtype=np.float32))
+    return probes
+
+
+def store_stats(collection, quantized, probes: list, top_k: int = 5) -> dict:
+    """Row counts, bytes on disk and p50/p95 vector-search latency (ms) over `probes`."""
+    stats = {"collection_rows": collection.count(), "disk_bytes": _disk_bytes(CHROMA_PATH)}
+    if quantized is not None:
+        stats["quantized"] = quantized.memory_bytes()
+
+    def search(vec):
+        if VECTOR_STORE_MODE == "quantized" and quantized is not None:
+            quantized.query(VectorStoreQuery(query_embedding=vec.tolist(), similarity_top_k=top_k))
+        else:
+            collection.query(query_embeddings=[vec], n_results=top_k)
+
+    if probes:
+        search(probes[0])  # loads the index; not timed
+        timings = []
+        for vec in probes:
+            start = time.perf_counter()
+            search(vec)
+            timings.append((time.perf_counter() - start) * 1000)
+        stats["query_ms_p50"] = round(float(np.percentile(timings, 50)), 2)
+        stats["query_ms_p95"] = round(float(np.percentile(timings, 95)), 2)
+    return stats
+
+
+# --- Garbage collection ---
+
+def _iter_collection(collection):
+    """Yields (id, metadata) of every row, in insertion order."""
+    offset = 0
+    while True:
+        got = collection.get(limit=SCAN_PAGE, offset=offset, include=["metadatas"])
+        if not got["ids"]:
+            return
+        yield from zip(got["ids"], got["metadatas"])
+        offset += len(got["ids"])
+
+
+def _source_key(source: str) -> str:
+    """URL variants (tracking parameters, AMP, www.) of one page are the same source."""
+    return normalize_url(source) if "://" in source else source
+
+
+def _capture_of(meta: dict) -> str:
+    """The capture a chunk came from: its LlamaIndex document (upload batches "id#3" are one capture)."""
+    ref = meta.get("ref_doc_id") or meta.get("document_id") or meta.get("doc_id") or ""
+    return ref.split("#")[0]
+
+
+def find_garbage(collection, quantized, dedup: DedupIndex, uploads: UploadLog,
+                 now: Optional[float] = None) -> dict:
+    """
+    Ids to delete, by reason, and a summary of what was scanned. Nothing is deleted here.
+    The latest capture of a source is the one with the newest indexed_at; chunks written
+    before indexed_at existed count as older than any stamped one, and among themselves the
+    one inserted last wins.
+    """
+    now = now or time.time()
+    rows = []  # (tier, id, source key, source, capture, indexed_at)
+    latest = {}  # source key -> (indexed_at, insertion order, capture)
+    summaries = []  # (id, source key, indexed_at)
+    untracked = 0
+
+    tiers = [("chroma", _iter_collection(collection))]
+    if quantized is not None:
+        # The quantized tier keeps ref_doc_id in its own column, not in the node metadata
+        tiers.append(("quantized", ((node_id, {**meta, "ref_doc_id": ref_doc_id})
+                                    for node_id, ref_doc_id, meta in quantized.iter_nodes())))
+    order = 0
+    for tier, items in tiers:
+        for row_id, meta in items:
+            meta = meta or {}
+            source = meta.get("source_url") or meta.get("source_doc")
+            if meta.get("type") == "summary":
+                if source:
+                    summaries.append((row_id, _source_key(source), meta.get("indexed_at", 0)))
+                continue
+            if not source:
+                untracked += 1  # captured before chunks carried their source; left alone
+                continue
+            key, capture, stamp = _source_key(source), _capture_of(meta), meta.get("indexed_at", 0)
+            rows.append((tier, row_id, key, source, capture, stamp))
+            order += 1
+            if (stamp, order) >= latest.get(key, (-1, -1, None))[:2]:
+                latest[key] = (stamp, order, capture)
+
+    garbage = {"superseded": [], "orphaned": [], "orphaned_summaries": []}
+    uploads_logged_since = int(uploads.created_at())
+    resolved, completed = {}, {}
+    for tier, row_id, key, source, capture, stamp in rows:
+        if capture != latest[key][2]:
+            garbage["superseded"].append((tier, row_id))
+            continue
+        if source not in resolved:
+            resolved[source] = dedup.resolve(source)
+        target = resolved[source]
+        if target and _source_key(target) != key and _source_key(target) in latest:
+            # Dedup links this source to another document that has its own chunks
+            garbage["orphaned"].append((tier, row_id))
+        elif source.startswith("upload_") and stamp >= uploads_logged_since and now - stamp > GC_GRACE_SECONDS:
+            if source not in completed:
+                completed[source] = uploads.is_complete(source)
+            if not completed[source]:
+                # process_file records every upload it finished; this one died mid-way.
+                # (Uploads from before the log existed have no record and are left alone.)
+                garbage["orphaned"].append((tier, row_id))
+
+    orphaned = {row_id for _, row_id in garbage["orphaned"]}
+    live_sources = {key for _, row_id, key, *_ in rows if row_id not in orphaned}
+    for row_id, key, stamp in summaries:
+        # With untracked chunks around, a summary may well have chunks we can't attribute
+        if not untracked and key not in live_sources and now - stamp > GC_GRACE_SECONDS:
+            garbage["orphaned_summaries"].append(("chroma", row_id))
+
+    return {
+        "scanned": {"chunks": len(rows), "summaries": len(summaries), "untracked_chunks": untracked,
+                    "sources": len(latest)},
+        "garbage": garbage,
+    }
+
+
+def delete_rows(collection, quantized, rows: list):
+    """Bulk delete of (tier, id) pairs."""
+    for tier in ("chroma", "quantized"):
+        ids = [row_id for t, row_id in rows if t == tier]
+        for start in range(0, len(ids), SCAN_PAGE):
+            if tier == "chroma":
+                collection.delete(ids=ids[start:start + SCAN_PAGE])
+            else:
+                quantized.delete_nodes(ids[start:start + SCAN_PAGE])
+
+
+def collect_garbage(collection, quantized, dedup: DedupIndex, uploads: UploadLog, dry_run: bool = False) -> dict:
+    found = find_garbage(collection, quantized, dedup, uploads)
+    counts = {reason: len(rows) for reason, rows in found["garbage"].items()}
+    if not dry_run:
+        for reason, rows in found["garbage"].items():
+            delete_rows(collection, quantized, rows)
+            DELETED.inc(len(rows), reason=reason)
+        if any(counts.values()):
+            bump_version(VECTOR_INDEX)
+    return {"scanned": found["scanned"], ("would_delete" if dry_run else "deleted"): counts}
+
+
+# --- Compaction ---
+
+def compact_collection(client) -> dict:
+    """
+    Rebuilds the collection: copies every row (with its stored embedding) into a new
+    collection, drops the old one and renames the new one. Chroma only marks deleted HNSW
+    elements, so this is what actually gives the space and the graph quality back.
+    """
+    old = client.get_collection(COLLECTION_NAME)
+    compact_name = f"{COLLECTION_NAME}_compact"
+    new = client.create_collection(compact_name, configuration=old.configuration, metadata=old.metadata)
+    offset = 0
+    while True:
+        got = old.get(limit=SCAN_PAGE, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not got["ids"]:
+            break
+        new.add(ids=got["ids"], embeddings=got["embeddings"], documents=got["documents"], metadatas=got["metadatas"])
+        offset += len(got["ids"])
+    if new.count() != old.count():
+        client.delete_collection(compact_name)
+        raise MaintenanceError(f"Compaction copied {new.count()} of {old.count()} rows; the old collection was kept")
+    client.delete_collection(COLLECTION_NAME)
+    new.modify(name=COLLECTION_NAME)
+    return {"rows": offset}
+
+
+def _remove_dead_segments():
+    """Deleting a collection leaves its segment directory (HNSW files) behind in embedded Chroma."""
+    db_file = os.path.join(CHROMA_PATH, "chroma.sqlite3")
+    if CHROMA_HOST or not os.path.exists(db_file):
+        return 0
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        live = {row[0] for row in conn.execute("SELECT id FROM segments")}
+        removed = 0
+        for name in os.listdir(CHROMA_PATH):
+            path = os.path.join(CHROMA_PATH, name)
+            # Segment directories are named after the segment's UUID
+            if os.path.isdir(path) and len(name) == 36 and name.count("-") == 4 and name not in live:
+                shutil.rmtree(path)
+                removed += 1
+        try:
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError as e:  # another process is using the file
+            log.warning(f"Could not vacuum {db_file}: {e}")
+        return removed
+    finally:
+        conn.close()
+
+
+# --- Snapshots ---
+
+def _store_files():
+    """(relative path, absolute path) of every file that makes up the store."""
+    snapshots = os.path.abspath(SNAPSHOT_DIR)
+    for root, dirs, files in os.walk(CHROMA_PATH):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != snapshots]
+        for name in files:
+            if name in _SKIPPED_NAMES or name.endswith(_SKIPPED_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, CHROMA_PATH), path
+
+
+def _copy_sqlite(src: str, dest: str):
+    """Copies a SQLite database with the backup API (consistent, and safe with open readers)."""
+    source, target = sqlite3.connect(src, timeout=30), sqlite3.connect(dest, timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def list_snapshots() -> list:
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    found = []
+    for name in sorted(os.listdir(SNAPSHOT_DIR)):
+        manifest = os.path.join(SNAPSHOT_DIR, name, "manifest.json")
+        if os.path.exists(manifest):
+            with open(manifest, "r", encoding="utf-8") as f:
+                found.append(json.load(f))
+    return found
+
+
+def take_snapshot(name: Optional[str] = None) -> dict:
+    """Copies the store into SNAPSHOT_DIR/<name>. Call with writes stopped (see maintenance_window)."""
+    name = name or time.strftime("%Y%m%d-%H%M%S")
+    dest = os.path.join(SNAPSHOT_DIR, name)
+    if os.path.exists(dest):
+        raise MaintenanceError(f"Snapshot {name} already exists")
+    if not os.path.exists(os.path.join(CHROMA_PATH, "chroma.sqlite3")):
+        raise MaintenanceError(f"No Chroma files at {CHROMA_PATH} (snapshots need the store's directory)")
+    partial = dest + ".partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    files, size = 0, 0
+    for rel, path in _store_files():
+        target = os.path.join(partial, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if rel.endswith(".sqlite3"):
+            _copy_sqlite(path, target)
+        else:
+            shutil.copy2(path, target)
+        files += 1
+        size += os.path.getsize(target)
+    manifest = {"name": name, "created_at": time.time(), "files": files, "bytes": size,
+                "vector_store_mode": VECTOR_STORE_MODE}
+    with open(os.path.join(partial, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(partial, dest)
+
+    # Keep the newest SNAPSHOT_KEEP
+    for old in list_snapshots()[:-SNAPSHOT_KEEP] if SNAPSHOT_KEEP > 0 else []:
+        shutil.rmtree(os.path.join(SNAPSHOT_DIR, old["name"]), ignore_errors=True)
+    return manifest
+
+
+def restore_snapshot(name: str) -> dict:
+    """
+    Replaces the store with a snapshot. SQLite files are restored in place with the backup
+    API, so connections other code keeps open (dedup index, quantized node table) see the
+    restored data; every other file is swapped with a rename.
+    """
+    if CHROMA_HOST:
+        raise MaintenanceError(
+            "Restore needs the embedded store: stop the Chroma server, copy the snapshot "
+            f"directory over its --path and start it again"
+        )
+    src = os.path.join(SNAPSHOT_DIR, name)
+    if not os.path.exists(os.path.join(src, "manifest.json")):
+        raise MaintenanceError(f"No snapshot named {name}")
+
+    restored = set()
+    for root, _, files in os.walk(src):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            rel = os.path.relpath(path, src)
+            if rel == "manifest.json":
+                continue
+            target = os.path.join(CHROMA_PATH, rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if rel.endswith(".sqlite3"):
+                _copy_sqlite(path, target)
+            else:
+                shutil.copy2(path, target + ".restore")
+                os.replace(target + ".restore", target)
+            restored.add(rel)
+    # Anything written since the snapshot (new segment directories, appended files) goes
+    removed = 0
+    for rel, path in list(_store_files()):
+        if rel not in restored:
+            os.remove(path)
+            removed += 1
+    for root, dirs, files in os.walk(CHROMA_PATH, topdown=False):
+        if root != CHROMA_PATH and not os.listdir(root):
+            os.rmdir(root)
+    return {"restored_files": len(restored), "removed_files": removed}
+
+
+# --- Running ---
+
+@contextlib.contextmanager
+def maintenance_window(reason: str):
+    """Read-only mode for the API plus the writer lock, so nothing writes to the store meanwhile."""
+    set_maintenance(reason)
+    try:
+        # Waits for the capture/upload batch that is being written right now
+        with writer_lock(VECTOR_INDEX):
+            yield
+    finally:
+        set_maintenance(None)
+
+
+def run(action: str, dry_run: bool = False, snapshot: Optional[str] = None) -> dict:
+    """Runs one maintenance action and returns its report (with before/after stats)."""
+    if action not in ACTIONS:
+        raise MaintenanceError(f"Unknown action {action}; one of {', '.join(ACTIONS)}")
+    if action == "restore" and not snapshot:
+        raise MaintenanceError("restore needs the name of a snapshot")
+
+    started = time.perf_counter()
+    # One maintenance run at a time, across processes
+    with file_lock(os.path.join(STATE_DIR, "maintenance.lock")):
+        client = _open_client()
+        _finish_interrupted_compaction(client)
+        collection = client.get_or_create_collection(COLLECTION_NAME)
+        quantized = _open_quantized()
+        probes = _sample_probes(collection)
+        report = {"action": action, "before": store_stats(collection, quantized, probes)}
+        if action == "report":
+            report["snapshots"] = list_snapshots()
+            return report
+
+        if action in ("gc", "run"):
+            dedup, uploads = DedupIndex(DEDUP_DB_PATH), UploadLog(UPLOAD_LOG_PATH)
+            with writer_lock(VECTOR_INDEX):
+                report["gc"] = collect_garbage(collection, quantized, dedup, uploads, dry_run=dry_run)
+        if dry_run:
+            return report
+
+        if action in ("compact", "run"):
+            with maintenance_window("compaction"):
+                report["compact"] = compact_collection(client)
+                if quantized is not None:
+                    report["compact"]["quantized"] = quantized.compact()
+                bump_version(VECTOR_STORE)
+                bump_version(VECTOR_INDEX)
+                client = _open_client()  # drops the embedded client's handles on the old segment
+                report["compact"]["removed_segments"] = _remove_dead_segments()
+        elif action == "snapshot":
+            with maintenance_window("snapshot"):
+                report["snapshot"] = take_snapshot(snapshot)
+        elif action == "restore":
+            with maintenance_window("restore"):
+                report["restore"] = restore_snapshot(snapshot)
+                bump_version(VECTOR_STORE)
+                bump_version(VECTOR_INDEX)
+                client = _open_client()
+
+        collection = client.get_or_create_collection(COLLECTION_NAME)
+        report["after"] = store_stats(collection, _open_quantized(), probes)
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Vector store maintenance")
+    parser.add_argument("action", choices=ACTIONS)
+    parser.add_argument("snapshot", nargs="?", default=None, help="snapshot name (restore; optional for snapshot)")
+    parser.add_argument("--dry-run", action="store_true", help="gc/run: only count what would be deleted")
+    args = parser.parse_args()
+    try:
+        print(json.dumps(run(args.action, dry_run=args.dry_run, snapshot=args.snapshot), indent=2))
+    except MaintenanceError as e:
+        print(f"Maintenance failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,399 @@
+# quantized_store.py
+# An optional, compact vector tier for the document chunks (VECTOR_STORE_MODE=quantized).
+# Chroma keeps every float32 vector and its HNSW graph in memory, so memory grows with every capture.
+# This store instead keeps:
+#   - int8 (4x smaller) or binary (32x smaller) codes of each vector, which are scanned with NumPy
+#   - the full-precision float32 vectors in a memory-mapped file, read only for the top candidates
+#   - node text/metadata in a small SQLite file
+# A query = one fast pass over the quantized codes, then exact re-scoring of the best candidates.
+# compact() writes the array files of a new generation (full.f32 -> full.1.f32 ...) and renumbers
+# the node table in the same transaction that bumps the generation, so a reader (in any process)
+# that mapped the previous files can tell its row numbers went stale and simply searches again.
+import os
+import json
+import sqlite3
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from shared_state import file_lock
+
+QUANTIZATION = os.getenv("QUANTIZATION", "int8")  # "int8" or "binary"
+QUANTIZED_RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", 10))
+SCAN_BLOCK_ROWS = 65536  # rows scored per NumPy operation, bounds temporary memory
+
+# Number of set bits for every byte value, for Hamming distances on packed bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(vecs: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vecs, axis=-1, keepdims=True)
+    return vecs / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(vecs: np.ndarray):
+    """Symmetric per-vector int8 quantization. Returns (codes, scales)."""
+    scales = np.abs(vecs).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vecs / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vecs: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed 8 per byte."""
+    return np.packbits(vecs > 0, axis=1)
+
+
+class QuantizedVectorStore(BasePydanticVectorStore):
+    """LlamaIndex vector store backed by quantized codes + memory-mapped float32 vectors."""
+
+    stores_text: bool = True
+    path: str
+    quantization: str = QUANTIZATION
+    rescore_factor: int = QUANTIZED_RESCORE_FACTOR
+
+    _conn: Any = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _arrays: Any = PrivateAttr(default=None)  # (generation, row_count, memmaps...) last mapped
+
+    def __init__(self, path: str, quantization: str = QUANTIZATION, rescore_factor: int = QUANTIZED_RESCORE_FACTOR):
+        if quantization not in ("int8", "binary"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        super().__init__(path=path, quantization=quantization, rescore_factor=rescore_factor)
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(path, "nodes.sqlite3"), check_same_thread=False)
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS nodes (
+                    row INTEGER PRIMARY KEY, node_id TEXT UNIQUE, ref_doc_id TEXT,
+                    node_json TEXT, deleted INTEGER DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS nodes_ref_doc_idx ON nodes (ref_doc_id);
+                CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+            """)
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        self._dim = int(row[0]) if row else None
+        stored = self._conn.execute("SELECT value FROM settings WHERE key = 'quantization'").fetchone()
+        if stored and stored[0] != quantization:
+            raise ValueError(f"Store at {path} was built with {stored[0]} quantization, not {quantization}")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QuantizedVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    # --- Files ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _array_file(self, name: str, generation: int) -> str:
+        """Path of an array file in a given generation ("full.f32", then "full.1.f32", ...)."""
+        if generation:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}.{generation}{ext}"
+        return self._file(name)
+
+    def _generation(self) -> int:
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _row_count(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM nodes").fetchone()
+        return row[0]
+
+    def _file_rows(self, generation: Optional[int] = None) -> int:
+        if generation is None:
+            generation = self._generation()
+        try:
+            return os.path.getsize(self._array_file("full.f32", generation)) // (4 * self._dim)
+        except OSError:
+            return 0
+
+    def _refresh_dim(self):
+        # Another process may have created the store after this one opened it
+        if self._dim is None:
+            row = self._conn.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+            self._dim = int(row[0]) if row else None
+
+    def _load_arrays(self):
+        """
+        Memory-maps the vector files; re-mapped only when rows were added or the store was
+        compacted (by any process). Raises FileNotFoundError if a compaction removed the
+        files between reading the generation and mapping them (the caller retries).
+        """
+        self._refresh_dim()
+        # Both from one read transaction: the row count must belong to that generation's files
+        self._conn.execute("BEGIN")
+        try:
+            generation, n = self._generation(), self._row_count()
+        finally:
+            self._conn.execute("COMMIT")
+        if self._arrays is not None and self._arrays[:2] == (generation, n):
+            return self._arrays
+        if n == 0:
+            self._arrays = (generation, 0, None, None, None)
+            return self._arrays
+        full = np.memmap(self._array_file("full.f32", generation), dtype=np.float32, mode="r", shape=(n, self._dim))
+        if self.quantization == "int8":
+            codes = np.memmap(self._array_file("codes.i8", generation), dtype=np.int8, mode="r", shape=(n, self._dim))
+            scales = np.memmap(self._array_file("scales.f32", generation), dtype=np.float32, mode="r", shape=(n,))
+        else:
+            width = (self._dim + 7) // 8
+            codes = np.memmap(self._array_file("codes.bits", generation), dtype=np.uint8, mode="r", shape=(n, width))
+            scales = None
+        self._arrays = (generation, n, full, codes, scales)
+        return self._arrays
+
+    def memory_bytes(self) -> dict:
+        """Bytes scanned per query (quantized codes) vs. bytes left on disk (full vectors)."""
+        with self._lock:
+            _, n, full, codes, scales = self._load_arrays()
+        if n == 0:
+            return {"rows": 0, "scanned_bytes": 0, "full_precision_bytes": 0}
+        scanned = codes.nbytes + (scales.nbytes if scales is not None else 0)
+        return {"rows": n, "scanned_bytes": int(scanned), "full_precision_bytes": int(full.nbytes)}
+
+    # --- Writes ---
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        vecs = _normalize(np.asarray([n.get_embedding() for n in nodes], dtype=np.float32))
+
+        # The file lock keeps other worker processes from appending at the same time
+        with self._lock, file_lock(self._file("write.lock")):
+            self._refresh_dim()
+            if self._dim is None:
+                self._dim = vecs.shape[1]
+                with self._conn:
+                    self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('dim', ?)", (str(self._dim),))
+                    self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('quantization', ?)", (self.quantization,))
+            if vecs.shape[1] != self._dim:
+                raise ValueError(f"Embedding size {vecs.shape[1]} does not match the store ({self._dim})")
+
+            # Re-adding a node replaces the old version
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE nodes SET deleted = 1, node_id = NULL WHERE node_id = ?", [(n.node_id,) for n in nodes]
+                )
+                # The array files are the source of truth for row positions (the generation
+                # cannot change here, compact() takes the same file lock)
+                generation = self._generation()
+                start = self._file_rows(generation)
+                self._append("full.f32", generation, vecs)
+                if self.quantization == "int8":
+                    codes, scales = quantize_int8(vecs)
+                    self._append("codes.i8", generation, codes)
+                    self._append("scales.f32", generation, scales)
+                else:
+                    self._append("codes.bits", generation, quantize_binary(vecs))
+                rows = []
+                for i, node in enumerate(nodes):
+                    stored = node.model_copy()
+                    stored.embedding = None  # the vector lives in the array files
+                    rows.append((start + i, node.node_id, node.ref_doc_id, json.dumps(doc_to_json(stored))))
+                self._conn.executemany(
+                    "INSERT INTO nodes (row, node_id, ref_doc_id, node_json) VALUES (?, ?, ?, ?)", rows
+                )
+        return [n.node_id for n in nodes]
+
+    def _append(self, name: str, generation: int, arr: np.ndarray):
+        with open(self._array_file(name, generation), "ab") as f:
+            f.write(np.ascontiguousarray(arr).tobytes())
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Marks every chunk of a document as deleted (space is reclaimed by compact())."""
+        with self._lock, file_lock(self._file("write.lock")), self._conn:
+            self._conn.execute("UPDATE nodes SET deleted = 1 WHERE ref_doc_id = ?", (ref_doc_id,))
+
+    def delete_nodes(self, node_ids: List[str]) -> None:
+        """Marks individual chunks as deleted (maintenance's bulk delete)."""
+        with self._lock, file_lock(self._file("write.lock")), self._conn:
+            self._conn.executemany("UPDATE nodes SET deleted = 1 WHERE node_id = ?", [(i,) for i in node_ids])
+
+    def clear(self) -> None:
+        with self._lock, file_lock(self._file("write.lock")), self._conn:
+            self._conn.execute("UPDATE nodes SET deleted = 1")
+
+    def _array_files(self):
+        """(file name, dtype, values per row) of every per-row array file."""
+        files = [("full.f32", np.float32, self._dim)]
+        if self.quantization == "int8":
+            files += [("codes.i8", np.int8, self._dim), ("scales.f32", np.float32, 1)]
+        else:
+            files += [("codes.bits", np.uint8, (self._dim + 7) // 8)]
+        return files
+
+    def compact(self) -> dict:
+        """
+        Rewrites the array files and the node table without deleted rows (and rows left
+        behind by an interrupted add). Returns {"rows_before", "rows_after"}.
+        Open instances (in any process) notice the new generation on their next query.
+        """
+        with self._lock, file_lock(self._file("write.lock")):
+            self._refresh_dim()
+            live = self._conn.execute(
+                "SELECT row, node_id, ref_doc_id, node_json FROM nodes WHERE deleted = 0 ORDER BY row"
+            ).fetchall()
+            generation = self._generation()
+            before = self._file_rows(generation) if self._dim else 0
+            if self._dim is None or len(live) == before:
+                return {"rows_before": before, "rows_after": before}
+
+            # The new files get new names: a reader still mapping the old ones keeps a
+            # consistent (if stale) set until it sees the generation change
+            keep = np.fromiter((r[0] for r in live), dtype=np.int64, count=len(live))
+            for name, dtype, width in self._array_files():
+                source = np.memmap(self._array_file(name, generation), dtype=dtype, mode="r", shape=(before, width))
+                with open(self._array_file(name, generation + 1), "wb") as f:
+                    for start in range(0, len(keep), SCAN_BLOCK_ROWS):
+                        f.write(np.ascontiguousarray(source[keep[start:start + SCAN_BLOCK_ROWS]]).tobytes())
+                del source
+            # Renumber the rows and switch to the new files in one transaction: if anything
+            # fails before the commit, the old numbering still matches the old files
+            with self._conn:
+                self._conn.execute("DELETE FROM nodes")
+                self._conn.executemany(
+                    "INSERT INTO nodes (row, node_id, ref_doc_id, node_json) VALUES (?, ?, ?, ?)",
+                    [(i, node_id, ref_doc_id, node_json) for i, (_, node_id, ref_doc_id, node_json) in enumerate(live)],
+                )
+                self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('generation', ?)", (str(generation + 1),))
+            self._arrays = None
+            # Readers that already mapped the old files keep them until they unmap (POSIX)
+            for name, _, _ in self._array_files():
+                try:
+                    os.remove(self._array_file(name, generation))
+                except OSError:
+                    pass
+            self._conn.execute("VACUUM")
+        return {"rows_before": before, "rows_after": len(live)}
+
+    def iter_nodes(self, batch_size: int = 1000):
+        """Yields (node_id, ref_doc_id, metadata) of every live chunk, in insertion order."""
+        last_row = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT row, node_id, ref_doc_id, node_json FROM nodes WHERE deleted = 0 AND row > ? ORDER BY row LIMIT ?",
+                    (last_row, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row, node_id, ref_doc_id, node_json in rows:
+                yield node_id, ref_doc_id, json.loads(node_json)["__data__"].get("metadata", {})
+            last_row = rows[-1][0]
+
+    # --- Reads ---
+
+    def _deleted_rows(self) -> np.ndarray:
+        rows = self._conn.execute("SELECT row FROM nodes WHERE deleted = 1").fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    def _first_pass(self, q: np.ndarray, codes, scales, n: int) -> np.ndarray:
+        """Approximate scores for every row from the quantized codes (higher is better)."""
+        scores = np.empty(n, dtype=np.float32)
+        if self.quantization == "binary":
+            q_bits = quantize_binary(q[None, :])[0]
+        for start in range(0, n, SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS]
+            if self.quantization == "int8":
+                scores[start:start + len(block)] = (block.astype(np.float32) @ q) * scales[start:start + len(block)]
+            else:
+                hamming = _POPCOUNT[np.bitwise_xor(block, q_bits)].sum(axis=1, dtype=np.int32)
+                scores[start:start + len(block)] = -hamming
+        return scores
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("QuantizedVectorStore does not support metadata filters")
+        # Searched again only if a compaction (in any process) renumbered the rows meanwhile
+        while True:
+            try:
+                result = self._search(query)
+            except FileNotFoundError:
+                continue
+            if result is not None:
+                return result
+
+    def _search(self, query: VectorStoreQuery) -> Optional[VectorStoreQueryResult]:
+        """One search against one generation of the files; None if that generation went stale."""
+        with self._lock:
+            generation, n, full, codes, scales = self._load_arrays()
+            deleted = self._deleted_rows()
+            if query.doc_ids or query.node_ids:
+                allowed = self._rows_for(query.doc_ids, query.node_ids)
+        if n == 0 or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        q = _normalize(np.asarray(query.query_embedding, dtype=np.float32))
+        scores = self._first_pass(q, codes, scales, n)
+        scores[deleted[deleted < n]] = -np.inf
+
+        if query.doc_ids or query.node_ids:
+            mask = np.full(n, True)
+            mask[allowed[allowed < n]] = False
+            scores[mask] = -np.inf
+
+        top_k = query.similarity_top_k
+        n_candidates = min(n, max(top_k * self.rescore_factor, top_k))
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        candidates = candidates[np.isfinite(scores[candidates])]
+        if candidates.size == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        # Exact cosine on the full-precision vectors of the candidates only
+        candidates.sort()  # sequential reads from the memory-mapped file
+        exact = np.asarray(full[candidates]) @ q
+        order = np.argsort(-exact)[:top_k]
+        best_rows = candidates[order]
+
+        found = self._nodes_for_rows(best_rows.tolist(), generation)
+        if found is None:
+            return None
+        nodes, similarities = [], []
+        for row, score in zip(best_rows.tolist(), exact[order]):
+            if row in found:  # rows without a node record (e.g. an interrupted add) are skipped
+                nodes.append(found[row])
+                similarities.append(float(score))
+        return VectorStoreQueryResult(
+            nodes=nodes,
+            similarities=similarities,
+            ids=[node.node_id for node in nodes],
+        )
+
+    def _rows_for(self, doc_ids: Optional[List[str]], node_ids: Optional[List[str]]) -> np.ndarray:
+        rows = []
+        for column, values in (("ref_doc_id", doc_ids), ("node_id", node_ids)):
+            for value in values or []:
+                rows += [r[0] for r in self._conn.execute(f"SELECT row FROM nodes WHERE {column} = ?", (value,))]
+        return np.asarray(rows, dtype=np.int64)
+
+    def _nodes_for_rows(self, rows: List[int], generation: int) -> Optional[dict]:
+        """Nodes of the given rows, or None if the rows are no longer numbered as in `generation`."""
+        with self._lock:
+            # One read transaction, so a compaction cannot commit between the check and the lookup
+            self._conn.execute("BEGIN")
+            try:
+                if self._generation() != generation:
+                    return None
+                found = self._conn.execute(
+                    f"SELECT row, node_json FROM nodes WHERE row IN ({','.join('?' * len(rows))})", rows
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        return {row: json_to_doc(json.loads(node_json)) for row, node_json in found}
@@ -0,0 +1,183 @@
+# query_engine.py
+# Builds the RAG query engine ONCE per index version (instead of on every question)
+# and adds a "context compression" step before the chunks are sent to the LLM:
+#   1. chunks that mostly repeat another retrieved chunk are dropped
+#   2. long chunks are trimmed to the sentences most similar to the question
+# Smaller prompts mean less prefill work for gemma:2b on CPU.
+import os
+import re
+import time
+import logging
+import threading
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.postprocessor import SimilarityPostprocessor
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from ai_engine.llm_gateway import reset_usage, get_usage
+from metrics import span, registry
+
+log = logging.getLogger(__name__)
+
+QUERY_PROMPT_TOKENS = registry.histogram(
+    "query_prompt_tokens", "Prompt tokens sent to the LLM per question.",
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+
+# --- Configuration (environment variables) ---
+QUERY_TOP_K = int(os.getenv("QUERY_TOP_K", 4))
+QUERY_SIMILARITY_CUTOFF = float(os.getenv("QUERY_SIMILARITY_CUTOFF", 0.0))  # 0 disables the cutoff
+QUERY_RESPONSE_MODE = os.getenv("QUERY_RESPONSE_MODE", "compact")
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "1") == "1"
+COMPRESSION_MAX_SENTENCES = int(os.getenv("COMPRESSION_MAX_SENTENCES", 4))  # kept per chunk
+COMPRESSION_DEDUP_THRESHOLD = float(os.getenv("COMPRESSION_DEDUP_THRESHOLD", 0.6))
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Splits text into sentences (and lines, for caption-style text)."""
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = text.lower().split()
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class ContextCompressor(BaseNodePostprocessor):
+    """
+    Removes near-duplicate chunks and trims each remaining chunk
+    to the sentences that are most similar to the question.
+    """
+
+    max_sentences: int = COMPRESSION_MAX_SENTENCES
+    dedup_threshold: float = COMPRESSION_DEDUP_THRESHOLD
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextCompressor"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        nodes = self._deduplicate(nodes)
+        if query_bundle is None or not nodes:
+            return nodes
+        return self._trim_to_relevant_sentences(nodes, query_bundle)
+
+    def _deduplicate(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        # Highest scoring chunks first, so the "best" copy of a passage is the one kept
+        kept, kept_shingles = [], []
+        for n in sorted(nodes, key=lambda n: n.score or 0.0, reverse=True):
+            sh = _shingles(n.node.get_content())
+            if not sh:
+                continue
+            duplicate = False
+            for other in kept_shingles:
+                # Overlap relative to the smaller chunk, so a chunk contained in another counts
+                overlap = len(sh & other) / min(len(sh), len(other))
+                if overlap >= self.dedup_threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(n)
+                kept_shingles.append(sh)
+        return kept
+
+    def _trim_to_relevant_sentences(
+        self, nodes: List[NodeWithScore], query_bundle: QueryBundle
+    ) -> List[NodeWithScore]:
+        per_node = [split_sentences(n.node.get_content()) for n in nodes]
+        long_nodes = [i for i, sents in enumerate(per_node) if len(sents) > self.max_sentences]
+        if not long_nodes:
+            return nodes
+
+        # Embed every candidate sentence in one batch
+        all_sentences = [s for i in long_nodes for s in per_node[i]]
+        with span("embedding"):
+            sentence_vecs = np.asarray(Settings.embed_model.get_text_embedding_batch(all_sentences), dtype=np.float32)
+            query_vec = query_bundle.embedding or Settings.embed_model.get_query_embedding(query_bundle.query_str)
+        query_vec = np.asarray(query_vec, dtype=np.float32)
+
+        sentence_vecs /= np.linalg.norm(sentence_vecs, axis=1, keepdims=True) + 1e-12
+        query_vec /= np.linalg.norm(query_vec) + 1e-12
+        sims = sentence_vecs @ query_vec
+
+        result = list(nodes)
+        start = 0
+        for i in long_nodes:
+            sents = per_node[i]
+            node_sims = sims[start:start + len(sents)]
+            start += len(sents)
+            # Keep the best sentences, but in their original order so the text still reads well
+            keep = sorted(np.argsort(-node_sims)[:self.max_sentences])
+            old = nodes[i]
+            # A copy keeps the metadata exclusion lists (so bookkeeping fields stay out of
+            # the prompt) and the relationships to the source document
+            trimmed = old.node.model_copy(update={"text": " ".join(sents[j] for j in keep)})
+            result[i] = NodeWithScore(node=trimmed, score=old.score)
+        return result
+
+
+def build_query_engine(index):
+    """Creates a query engine with the configured top-k, cutoff, response mode, and compression."""
+    postprocessors = []
+    if QUERY_SIMILARITY_CUTOFF > 0:
+        postprocessors.append(SimilarityPostprocessor(similarity_cutoff=QUERY_SIMILARITY_CUTOFF))
+    if CONTEXT_COMPRESSION:
+        postprocessors.append(ContextCompressor())
+
+    return index.as_query_engine(
+        similarity_top_k=QUERY_TOP_K,
+        response_mode=QUERY_RESPONSE_MODE,
+        node_postprocessors=postprocessors,
+    )
+
+
+_engine = None
+_engine_key = None
+_engine_lock = threading.Lock()
+
+
+def get_query_engine(index, index_version: int):
+    """Returns the cached query engine, rebuilding it only when the index version changes."""
+    global _engine, _engine_key
+    key = (id(index), index_version)
+    with _engine_lock:
+        if _engine is None or _engine_key != key:
+            log.info(f"Building query engine for index version {index_version}.")
+            _engine = build_query_engine(index)
+            _engine_key = key
+        return _engine
+
+
+def run_query(query_engine, question: str):
+    """
+    Runs a question through the query engine.
+    Returns (answer, stats) where stats has the prompt tokens and end-to-end latency.
+    """
+    reset_usage()
+    start = time.perf_counter()
+    with span("index_query"):
+        resp = query_engine.query(question)
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    usage = get_usage()
+    stats = {
+        "latency_ms": round(latency_ms, 1),
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "llm_calls": usage["llm_calls"],
+        "context_chunks": len(resp.source_nodes),
+    }
+    QUERY_PROMPT_TOKENS.observe(stats["prompt_tokens"])
+    log.info(f"Query stats: {stats}")
+    return str(resp), stats
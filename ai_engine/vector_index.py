@@ -0,0 +1,101 @@
+# vector_index.py
+# The vector store and the LlamaIndex index over it, shared by both core.py files (the web
+# capture API and the video API run in the same process and read and write the same collection).
+# Two shared versions (shared_state) keep every worker process in step:
+#   VECTOR_STORE  bumped by maintenance after a compaction or restore -> the store is reopened
+#   VECTOR_INDEX  bumped after every write -> the index (and its query engine) is reloaded
+# The module globals below are swapped by open_vector_store/publish_index/current_index;
+# read them as `vector_index.collection` etc., never import them by name.
+import os
+import sys
+import threading
+
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.vector_stores.chroma import ChromaVectorStore
+
+# Make the project root importable when this file is run directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_engine.quantized_store import QuantizedVectorStore
+from metrics import span
+from shared_state import COLLECTION_NAME, VECTOR_INDEX, VECTOR_STORE, VersionWatcher, bump_version, chroma_client
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./vector_db")
+# "chroma" (default) or "quantized": int8/binary codes + memory-mapped vectors for the chunks
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "chroma")
+
+store_watcher = VersionWatcher(VECTOR_STORE)
+store_generation = None
+db = collection = vector_store = storage_context = None
+index_watcher = VersionWatcher(VECTOR_INDEX)
+index = None
+index_version = index_watcher.current()
+# Guards the swap of the globals above between request threads. Only held for the swap
+# itself: loading an index, indexing and querying run outside it on the objects they picked up.
+index_lock = threading.RLock()
+
+
+def open_vector_store(fresh: bool = False):
+    """
+    (Re)opens the Chroma collection and the chunk store, once per store generation.
+    Called before every read and, with the writer lock held and `fresh=True`, before every
+    write, so a worker never writes into a collection that maintenance has just replaced.
+    """
+    global db, collection, vector_store, storage_context, store_generation, index
+    generation = store_watcher.current(fresh=fresh)
+    with index_lock:
+        if generation == store_generation:
+            return
+        # Embedded by default; a Chroma server (CHROMA_HOST) when running several workers
+        db = chroma_client(CHROMA_PATH, generation)
+        collection = db.get_or_create_collection(COLLECTION_NAME)
+        if VECTOR_STORE_MODE == "quantized":
+            # Document chunks go to the compact tier; summaries (one per document) stay in Chroma
+            vector_store = QuantizedVectorStore(os.path.join(CHROMA_PATH, "quantized"))
+        else:
+            vector_store = ChromaVectorStore(chroma_collection=collection)
+        # The storage context is what makes LlamaIndex write the chunks into Chroma
+        # (passing vector_store= straight to from_documents is silently ignored).
+        storage_context = StorageContext.from_defaults(vector_store=vector_store)
+        store_generation, index = generation, None
+
+
+def publish_index(new_index=None):
+    """
+    Announces a write to every worker (bumps the shared index version). `new_index` is the
+    index the write produced, kept as this process's index; None drops it (rebuilt on the
+    next question). Call with the writer lock held.
+    """
+    global index, index_version
+    with index_lock:
+        index, index_version = new_index, bump_version(VECTOR_INDEX)
+        index_watcher.seen(index_version)
+
+
+def current_index():
+    """
+    (index, version) for a question: reopens the store if maintenance replaced it and
+    reloads the index when another worker indexed something since it was loaded.
+    """
+    global index, index_version
+    open_vector_store()
+    with index_lock:
+        shared_version = index_watcher.current()
+        if shared_version != index_version:
+            index, index_version = None, shared_version
+        if index:
+            return index, index_version
+        store, version = vector_store, index_version
+
+    print("Reloading index from vector store...")
+    with span("index_from_vector_store"):
+        loaded = VectorStoreIndex.from_vector_store(store)
+    with index_lock:
+        # Kept unless a write or a reopened store replaced the index while it was loading;
+        # either way this question gets the index that matches its version
+        if index is None and index_version == version and vector_store is store:
+            index = loaded
+    return loaded, version
+
+
+open_vector_store()
@@ -4,10 +4,12 @@ from typing import Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.concurrency import run_in_threadpool
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
 from db import get_db
@@ -16,6 +18,8 @@ from db import get_db
 SECRET_KEY = os.getenv("JWT_SECRET")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Users allowed to run the /admin endpoints (vector store maintenance), comma separated
+ADMIN_EMAILS = {e.strip() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
 if not SECRET_KEY:
     raise ValueError("No SECRET_KEY set for the application")
@@ -59,9 +63,10 @@ def get_password_hash(password: str) -> str:
     """Hashes a plain text password."""
     return pwd_context.hash(password)
 
-def get_user(db: Session, email: str) -> Optional[models.User]:
+async def get_user(db: AsyncSession, email: str) -> Optional[models.User]:
     """Fetches a single user by their email."""
-    return db.query(models.User).filter(models.User.email == email).first()
+    result = await db.execute(select(models.User).where(models.User.email == email).limit(1))
+    return result.scalars().first()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Creates a new JWT access token."""
@@ -75,32 +80,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[models.User]:
     """
     Authenticates a user.
     Returns the user object if successful, None otherwise.
     """
-    user = get_user(db, email=email)
+    user = await get_user(db, email=email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    # bcrypt is deliberately slow (~100ms+); keep it off the event loop
+    if not await run_in_threadpool(verify_password, password, user.hashed_password):
         return None
     return user
 
-def create_user(db: Session, user: UserCreate) -> models.User:
+async def create_user(db: AsyncSession, user: UserCreate) -> models.User:
     """Creates a new user in the database."""
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_in_threadpool(get_password_hash, user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 # --- Authentication Dependency ---
 
-def get_current_user(
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     Returns the authenticated user based on JWT token.
@@ -121,11 +127,20 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user: models.User | None = get_user(db, email=token_data.email)
+    user: models.User | None = await get_user(db, email=token_data.email)
     if not user:
         raise credentials_exception
 
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
-    return User.model_validate(user, from_attributes=True)
\ No newline at end of file
+    return User.model_validate(user, from_attributes=True)
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """
+    Returns the authenticated user if they are listed in ADMIN_EMAILS.
+    """
+    if current_user.email not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
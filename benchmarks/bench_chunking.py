@@ -0,0 +1,147 @@
+# bench_chunking.py
+# Compares LlamaIndex's default splitter with the StructureAwareChunker on generated
+# articles and caption transcripts:
+#   - chunks per document and tokens embedded (what the embedding step costs; for the
+#     semantic variant this includes the per-sentence embedding pass that finds topic breaks)
+#   - tokens past bge-small's 512-token window (silently dropped at embedding time)
+#   - retrieval hit rate: does a top-k chunk contain a probe passage taken from the document?
+#
+# Usage (from the project root):
+#   python benchmarks/bench_chunking.py --docs 10 --embed-backend hash
+import os
+import re
+import sys
+import json
+import random
+import argparse
+
+import numpy as np
+from bs4 import BeautifulSoup
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "video_extracter"))
+
+from llama_index.core import Settings, Document, VectorStoreIndex
+from llama_index.core.node_parser import SentenceSplitter
+from ai_engine import chunking
+from ai_engine.chunking import StructureAwareChunker, estimate_tokens
+from ai_engine.embeddings import get_embed_model
+from fixtures import make_article, make_vtt_captions
+from preprocess import preprocess_transcript
+
+EMBED_WINDOW = 512
+
+
+def article_text(html: str) -> str:
+    """Same extraction rules as fetch_text_from_url (headings as '## ...')."""
+    soup = BeautifulSoup(html, "html.parser")
+    for s in soup(["script", "style", "noscript", "header", "footer", "nav"]):
+        s.decompose()
+    blocks = []
+    for el in soup.find_all(["h1", "h2", "h3", "h4", "p"]):
+        text = el.get_text(strip=True)
+        if text:
+            blocks.append(text if el.name == "p" else f"## {text}")
+    return "\n\n".join(blocks)
+
+
+def make_documents(n: int):
+    docs = []
+    for i in range(n):
+        docs.append(Document(text=article_text(make_article(i, paragraphs=30)), metadata={"content_type": "article"}))
+        captions = preprocess_transcript(make_vtt_captions(minutes=15, seed=100 + i))
+        docs.append(Document(text=captions, metadata={"content_type": "captions"}))
+    for doc in docs:
+        doc.excluded_embed_metadata_keys = ["content_type", "chunk_index"]
+    return docs
+
+
+def make_probes(docs, per_doc: int, seed: int = 3):
+    """Short passages (12 consecutive words) copied from each document."""
+    rng = random.Random(seed)
+    probes = []
+    for doc in docs:
+        words = re.sub(r"^##.*$", "", doc.text, flags=re.M).split()
+        for _ in range(per_doc):
+            start = rng.randint(0, max(len(words) - 12, 0))
+            probes.append(" ".join(words[start:start + 12]))
+    return probes
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def count_sentence_pass(sentence_tokens: list):
+    """
+    Wraps chunking.adjacent_similarities so every sentence it embeds is counted; returns the
+    function to put back. The semantic chunker embeds each sentence once to find topic breaks,
+    on top of embedding the final chunks.
+    """
+    original = chunking.adjacent_similarities
+
+    def counting(sentences):
+        if len(sentences) >= 2:  # shorter inputs are not embedded
+            sentence_tokens.extend(min(estimate_tokens(s), EMBED_WINDOW) for s in sentences)
+        return original(sentences)
+
+    chunking.adjacent_similarities = counting
+    return original
+
+
+def evaluate(parser, docs, probes, k: int) -> dict:
+    sentence_tokens = []
+    original = count_sentence_pass(sentence_tokens)
+    try:
+        nodes = parser.get_nodes_from_documents(docs)
+    finally:
+        chunking.adjacent_similarities = original
+    tokens = np.array([estimate_tokens(n.get_content()) for n in nodes])
+    chunk_tokens = int(np.minimum(tokens, EMBED_WINDOW).sum())
+    index = VectorStoreIndex(nodes)
+    retriever = index.as_retriever(similarity_top_k=k)
+
+    hits = 0
+    for probe in probes:
+        found = retriever.retrieve(probe)
+        if any(normalize(probe) in normalize(r.node.get_content()) for r in found):
+            hits += 1
+
+    return {
+        "chunks": len(nodes),
+        "chunks_per_document": round(len(nodes) / len(docs), 2),
+        "mean_chunk_tokens": round(float(tokens.mean()), 1),
+        # Everything sent to the embedding model: the chunks plus the sentence pass
+        "embedded_tokens": chunk_tokens + sum(sentence_tokens),
+        "sentence_pass_tokens": sum(sentence_tokens),
+        "tokens_past_embed_window": int(np.maximum(tokens - EMBED_WINDOW, 0).sum()),
+        f"hit_rate_at_{k}": round(hits / len(probes), 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunking strategy comparison")
+    parser.add_argument("--docs", type=int, default=5, help="Articles and transcripts (each)")
+    parser.add_argument("--probes", type=int, default=10, help="Probe passages per document")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--embed-backend", default="hash")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    Settings.embed_model = get_embed_model(args.embed_backend)
+    docs = make_documents(args.docs)
+    probes = make_probes(docs, args.probes)
+
+    results = {
+        "config": vars(args),
+        "default_sentence_splitter": evaluate(SentenceSplitter(), docs, probes, args.k),
+        "structure_aware": evaluate(StructureAwareChunker(semantic=False), docs, probes, args.k),
+        "structure_aware_semantic": evaluate(StructureAwareChunker(semantic=True), docs, probes, args.k),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
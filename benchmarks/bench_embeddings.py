@@ -0,0 +1,101 @@
+# bench_embeddings.py
+# Parity check + throughput benchmark for the embedding backends.
+#   parity:     cosine agreement of the ONNX (float32 and int8) vectors with the PyTorch vectors
+#   throughput: texts/second for each backend and thread count
+# Exits with status 1 if any ONNX variant falls below --min-cosine, or if no ONNX model was
+# found at all (every variant skipped), so it can gate a deployment.
+#
+# Usage (from the project root, after `python ai_engine/embeddings.py export`):
+#   python benchmarks/bench_embeddings.py --texts 256 --threads 1 2 4
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "video_extracter"))
+
+from ai_engine.embeddings import OnnxEmbedding, get_embed_model
+from fixtures import make_sentence, make_vtt_captions
+from preprocess import preprocess_transcript
+
+
+def sample_texts(n: int, seed: int = 5):
+    """A mix of short caption lines and paragraph-sized chunks, like real captures."""
+    rng = random.Random(seed)
+    lines = preprocess_transcript(make_vtt_captions(minutes=5)).splitlines()
+    texts = []
+    for i in range(n):
+        if i % 2:
+            texts.append(rng.choice(lines))
+        else:
+            texts.append(" ".join(make_sentence(rng) for _ in range(rng.randint(5, 25))))
+    return texts
+
+
+def embed_all(model, texts, batch):
+    vecs = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch):
+        vecs.extend(model.get_text_embedding_batch(texts[i:i + batch]))
+    elapsed = time.perf_counter() - start
+    vecs = np.asarray(vecs, dtype=np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True), len(texts) / elapsed
+
+
+def cosine_agreement(a: np.ndarray, b: np.ndarray) -> dict:
+    cos = np.sum(a * b, axis=1)
+    return {"min": round(float(cos.min()), 5), "mean": round(float(cos.mean()), 5)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backend parity and throughput")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--onnx-path", default=None)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    onnx_kwargs = {"model_dir": args.onnx_path} if args.onnx_path else {}
+
+    reference, torch_rate = embed_all(get_embed_model("huggingface"), texts, args.batch)
+    results = {"config": vars(args), "huggingface_torch": {"texts_per_sec": round(torch_rate, 1)}}
+
+    failed = False
+    for quantized in (False, True):
+        name = "onnx_int8" if quantized else "onnx_fp32"
+        try:
+            results[name] = {}
+            for threads in args.threads:
+                model = OnnxEmbedding(quantized=quantized, threads=threads, **onnx_kwargs)
+                vecs, rate = embed_all(model, texts, args.batch)
+                results[name][f"threads_{threads}"] = {"texts_per_sec": round(rate, 1)}
+            results[name]["cosine_vs_torch"] = cosine_agreement(reference, vecs)
+            if results[name]["cosine_vs_torch"]["min"] < args.min_cosine:
+                failed = True
+                results[name]["parity"] = "FAILED"
+            else:
+                results[name]["parity"] = "ok"
+        except FileNotFoundError as e:
+            results[name] = {"skipped": str(e)}
+
+    # Nothing was compared: a gate that passes without a model would hide a broken export
+    if all("skipped" in results[name] for name in ("onnx_fp32", "onnx_int8")):
+        failed = True
+        print("No ONNX model found, every ONNX variant was skipped", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
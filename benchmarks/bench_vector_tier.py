@@ -0,0 +1,136 @@
+# bench_vector_tier.py
+# Recall vs. memory for the vector tiers: Chroma (HNSW, float32, in memory) vs. the
+# QuantizedVectorStore (int8 / binary codes + memory-mapped float32 re-scoring).
+# Ground truth is an exact brute-force cosine search over the same vectors.
+#
+# Usage (from the project root):
+#   python benchmarks/bench_vector_tier.py --vectors 20000 --output benchmarks/results/vector_tier.json
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from ai_engine.quantized_store import QuantizedVectorStore
+from run_benchmarks import percentiles
+
+
+def current_rss_mib() -> float:
+    """Resident memory of this process right now (Linux)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def make_vectors(n: int, dim: int, clusters: int, seed: int = 7) -> np.ndarray:
+    """Clustered unit vectors, roughly like embeddings of documents on a few topics."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vecs = centers[labels] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def recall_at_k(found_ids, true_ids) -> float:
+    return len(set(found_ids) & set(true_ids)) / len(true_ids)
+
+
+def bench_quantized(vectors, queries, truth, k, quantization, rescore_factor, batch):
+    path = tempfile.mkdtemp(prefix=f"qstore_{quantization}_")
+    rss_before = current_rss_mib()
+    store = QuantizedVectorStore(path, quantization=quantization, rescore_factor=rescore_factor)
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch):
+        store.add([TextNode(id_=str(j), text="", embedding=vectors[j].tolist()) for j in range(i, min(i + batch, len(vectors)))])
+    build_s = time.perf_counter() - start
+
+    timings, recalls = [], []
+    for q, true_ids in zip(queries, truth):
+        start = time.perf_counter()
+        res = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=k))
+        timings.append((time.perf_counter() - start) * 1000)
+        recalls.append(recall_at_k(res.ids, true_ids))
+
+    mem = store.memory_bytes()
+    return {
+        "build_seconds": round(build_s, 2),
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "query_latency_ms": percentiles(timings),
+        "scanned_mib": round(mem["scanned_bytes"] / 2**20, 2),
+        "full_precision_on_disk_mib": round(mem["full_precision_bytes"] / 2**20, 2),
+        "rss_growth_mib": round(current_rss_mib() - rss_before, 1),
+    }
+
+
+def bench_chroma(vectors, queries, truth, k, batch):
+    import chromadb
+
+    path = tempfile.mkdtemp(prefix="chroma_bench_")
+    rss_before = current_rss_mib()
+    client = chromadb.PersistentClient(path=path)
+    collection = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch):
+        ids = [str(j) for j in range(i, min(i + batch, len(vectors)))]
+        collection.add(ids=ids, embeddings=vectors[i:i + len(ids)].tolist())
+    build_s = time.perf_counter() - start
+
+    timings, recalls = [], []
+    for q, true_ids in zip(queries, truth):
+        start = time.perf_counter()
+        res = collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+        timings.append((time.perf_counter() - start) * 1000)
+        recalls.append(recall_at_k(res["ids"][0], true_ids))
+
+    disk = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+    return {
+        "build_seconds": round(build_s, 2),
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "query_latency_ms": percentiles(timings),
+        "on_disk_mib": round(disk / 2**20, 2),
+        "rss_growth_mib": round(current_rss_mib() - rss_before, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs. memory of the vector tiers")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=2000)
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors + args.queries, args.dim, args.clusters)
+    vectors, queries = vectors[:args.vectors], vectors[args.vectors:]
+    # Exact top-k by brute force
+    truth = [[str(j) for j in np.argsort(-(vectors @ q))[:args.k]] for q in queries]
+
+    results = {
+        "config": vars(args),
+        "float32_raw_mib": round(vectors.nbytes / 2**20, 2),
+        "int8": bench_quantized(vectors, queries, truth, args.k, "int8", args.rescore_factor, args.batch),
+        "binary": bench_quantized(vectors, queries, truth, args.k, "binary", args.rescore_factor, args.batch),
+    }
+    if not args.skip_chroma:
+        results["chroma"] = bench_chroma(vectors, queries, truth, args.k, args.batch)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,117 @@
+# fixtures.py
+# Deterministic test data for the benchmarks: article pages served from a local
+# HTTP server (instead of the web), YouTube-style VTT captions (instead of yt-dlp) and a
+# stand-in Whisper model (instead of downloading weights and decoding audio).
+import time
+import random
+import threading
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = (
+    "graph vector embedding model retrieval summary index query token context "
+    "network layer training data sample node edge walk skip gram window word "
+    "cluster search memory latency batch chunk sentence document article video "
+    "caption transcript speech audio signal learning neural weight gradient loss"
+).split()
+
+
+def make_sentence(rng: random.Random, min_words: int = 8, max_words: int = 20) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_article(page_no: int, paragraphs: int = 20, seed: int = 1234) -> str:
+    """An HTML page with headings, paragraphs and the boilerplate the scraper strips."""
+    rng = random.Random(seed + page_no)
+    body = [f"<h1>Benchmark article {page_no}</h1>"]
+    for i in range(paragraphs):
+        if i % 5 == 0:
+            body.append(f"<h2>Section {i // 5 + 1}</h2>")
+        sentences = " ".join(make_sentence(rng) for _ in range(rng.randint(3, 7)))
+        body.append(f"<p>{sentences}</p>")
+    return (
+        "<html><head><title>Benchmark</title><script>var x = 1;</script>"
+        "<style>p { color: black; }</style></head><body>"
+        "<nav>Home | About</nav><header>Site header</header>"
+        + "\n".join(body)
+        + "<footer>Copyright</footer></body></html>"
+    )
+
+
+def make_vtt_captions(minutes: int = 10, seed: int = 99) -> str:
+    """
+    Caption text in the same shape fetch_existing_transcript produces for
+    YouTube auto-captions: each line once with inline word timings, then once plain.
+    """
+    rng = random.Random(seed)
+    lines = ["[Music]"]
+    t = 0.0
+    while t < minutes * 60:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(4, 9))]
+        timed = words[0]
+        for w in words[1:]:
+            t += rng.uniform(0.15, 0.5)
+            m, s = divmod(t, 60)
+            h, m = divmod(m, 60)
+            timed += f"<{int(h):02d}:{int(m):02d}:{s:06.3f}><c> {w}</c>"
+        lines.append(timed)
+        lines.append(" ".join(words))
+        t += rng.uniform(0.2, 1.0)
+    return "\n".join(lines)
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        page = self.server.pages.get(self.path)
+        if page is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        time.sleep(self.server.latency)
+        data = page.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_html_server(pages: dict, latency: float = 0.0, host: str = "127.0.0.1"):
+    """
+    Serves {path: html} on a background thread.
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, 0), _PageHandler)
+    server.pages = pages
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+class StubWhisperModel:
+    """
+    Quacks like faster_whisper.WhisperModel: transcribe() sleeps for audio_seconds * rtf
+    and returns generated segments, so the ASR wrapper (model choice, caching, metrics,
+    segment conversion) can be timed without real weights.
+    """
+
+    def __init__(self, audio_seconds: float = 60.0, rtf: float = 0.01, seed: int = 7):
+        self.audio_seconds = audio_seconds
+        self.rtf = rtf
+        self.seed = seed
+
+    def transcribe(self, audio_path: str, beam_size: int = 1):
+        time.sleep(self.audio_seconds * self.rtf)
+        rng = random.Random(self.seed)
+        segments, t = [], 0.0
+        while t < self.audio_seconds:
+            length = rng.uniform(2.0, 6.0)
+            segments.append(SimpleNamespace(start=t, end=t + length, text=" " + make_sentence(rng)))
+            t += length
+        # faster-whisper returns a generator plus an info object
+        return iter(segments), SimpleNamespace(language="en", duration=self.audio_seconds)
+
@@ -0,0 +1,136 @@
+# load_test_auth.py
+# Requests/second and latency for the authenticated endpoints, against the real app
+# (main.py) served by uvicorn, with a local SQLite user database by default.
+#   /users/me   JWT decode + one user lookup per request (the cost every protected endpoint pays)
+#   /token      user lookup + bcrypt verification
+#   /           unauthenticated; measured *while* /token is under load, to show whether
+#               the event loop stays responsive
+# LLM / embeddings / Chroma are replaced by the offline fakes, since none of them are hit.
+#
+# Usage (from the project root):
+#   python benchmarks/load_test_auth.py --concurrency 50 --duration 10
+#   python benchmarks/load_test_auth.py --database-url postgresql://user:pw@localhost/bench
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(ROOT_DIR)
+
+import httpx
+
+from ai_engine.fake_ollama import start_fake_ollama
+from run_benchmarks import percentiles
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(workdir: str, database_url: str):
+    """Configures the environment, imports main.py, and serves it in a background thread."""
+    _, llm_url = start_fake_ollama()
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{os.path.join(workdir, 'users.db')}"
+    os.environ.setdefault("JWT_SECRET", "load-test-secret")
+    os.environ.setdefault("JWT_ALGORITHM", "HS256")
+    os.environ["EMBED_BACKEND"] = "hash"
+    os.environ["OLLAMA_BASE_URL"] = llm_url
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "vector_db")
+    os.environ["DATA_PATH"] = os.path.join(workdir, "data")
+    os.environ["METRICS_ENABLED"] = "0"
+
+    import uvicorn
+    import main
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def hammer(client, method, path, seconds, concurrency, **kwargs):
+    """Runs `concurrency` clients in a loop for `seconds`; returns latencies (ms) and errors."""
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            r = await client.request(method, path, **kwargs)
+            if r.status_code >= 400:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def summarize(latencies, errors, seconds) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / seconds, 1),
+        "latency_ms": percentiles(latencies),
+    }
+
+
+async def run(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        creds = {"email": "load@example.com", "password": "load-test-password"}
+        await client.post("/register", json=creds)
+        r = await client.post("/token", data={"username": creds["email"], "password": creds["password"]})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        results = {}
+        lat, err = await hammer(client, "GET", "/users/me", args.duration, args.concurrency, headers=headers)
+        results["users_me"] = summarize(lat, err, args.duration)
+
+        # Logins and a cheap endpoint at the same time: a blocked loop shows up as "/" latency
+        form = {"username": creds["email"], "password": creds["password"]}
+        (tok_lat, tok_err), (root_lat, root_err) = await asyncio.gather(
+            hammer(client, "POST", "/token", args.duration, max(args.concurrency // 5, 1), data=form),
+            hammer(client, "GET", "/", args.duration, max(args.concurrency // 5, 1)),
+        )
+        results["token"] = summarize(tok_lat, tok_err, args.duration)
+        results["root_during_logins"] = summarize(root_lat, root_err, args.duration)
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the authenticated endpoints")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario")
+    parser.add_argument("--database-url", default=None, help="Sync URL; defaults to a temporary SQLite file")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server, base_url = start_app(workdir, args.database_url)
+        import db
+        results = {
+            "config": vars(args),
+            "database": db.ASYNC_DATABASE_URL.split("://")[0],
+            "pool": {"size": db.DB_POOL_SIZE, "max_overflow": db.DB_MAX_OVERFLOW, "pre_ping": db.DB_POOL_PRE_PING},
+        }
+        results.update(asyncio.run(run(base_url, args)))
+        server.should_exit = True
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
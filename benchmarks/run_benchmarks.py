@@ -0,0 +1,305 @@
+# run_benchmarks.py
+# Offline, deterministic benchmarks for the capture / query / preprocessing paths.
+# Nothing here needs Ollama, HuggingFace, YouTube, or the internet:
+#   - LLM        -> ai_engine/fake_ollama.py (canned answers, configurable latency)
+#   - embeddings -> EMBED_BACKEND=hash
+#   - web pages  -> a local HTTP server with generated articles
+#   - captions   -> generated VTT-style caption text (also fed through video_extracter/core.py)
+#   - Whisper    -> a stub model with a fixed real-time factor, unless --asr-audio is given
+#
+# Usage (from the project root):
+#   python benchmarks/run_benchmarks.py --output benchmarks/results/current.json
+#   python benchmarks/run_benchmarks.py --asr-audio clip.wav   # real Whisper on a short clip
+#   python benchmarks/run_benchmarks.py --compare old.json new.json
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "video_extracter"))
+
+from ai_engine.fake_ollama import start_fake_ollama
+from fixtures import StubWhisperModel, make_article, make_vtt_captions, start_html_server
+
+QUESTIONS = [
+    "What is a skip gram window?",
+    "How does the retrieval index handle latency?",
+    "What does the article say about embedding models?",
+    "Explain the training loss and gradient.",
+    "What is stored for each document chunk?",
+]
+
+
+def percentiles(samples):
+    arr = np.asarray(samples, dtype=np.float64)
+    if arr.size == 0:
+        return {}
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p90": round(float(np.percentile(arr, 90)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "mean": round(float(arr.mean()), 3),
+        "max": round(float(arr.max()), 3),
+    }
+
+
+@contextlib.contextmanager
+def measure_memory(result: dict):
+    """Records the Python allocation peak of the block (MiB) into result['peak_alloc_mib']."""
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_alloc_mib"] = round(peak / (1024 * 1024), 2)
+
+
+def quiet(enabled: bool):
+    # The pipeline prints a lot; keep benchmark output readable
+    return contextlib.redirect_stdout(io.StringIO()) if enabled else contextlib.nullcontext()
+
+
+def bench_preprocess(minutes: int, repeats: int, is_quiet: bool) -> dict:
+    from preprocess import preprocess_transcript
+
+    raw = make_vtt_captions(minutes=minutes)
+    result = {"caption_minutes": minutes, "input_bytes": len(raw.encode("utf-8"))}
+    timings = []
+    with measure_memory(result):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            with quiet(is_quiet):
+                cleaned = preprocess_transcript(raw)
+            timings.append((time.perf_counter() - start) * 1000)
+    result["output_lines"] = cleaned.count("\n") + 1
+    result["latency_ms"] = percentiles(timings)
+    result["mb_per_sec"] = round(result["input_bytes"] / (1024 * 1024) / (np.median(timings) / 1000), 2)
+    return result
+
+
+def bench_capture(core, base_url: str, pages: int, is_quiet: bool) -> dict:
+    result = {"pages": pages}
+    timings = []
+    with measure_memory(result):
+        wall_start = time.perf_counter()
+        for i in range(pages):
+            start = time.perf_counter()
+            with quiet(is_quiet):
+                ok = core.process_url(f"{base_url}/article/{i}")
+            if not ok:
+                raise RuntimeError(f"Capture of page {i} failed")
+            timings.append((time.perf_counter() - start) * 1000)
+        wall = time.perf_counter() - wall_start
+    result["latency_ms"] = percentiles(timings)
+    result["pages_per_sec"] = round(pages / wall, 3)
+    return result
+
+
+def bench_query(core, queries: int, is_quiet: bool) -> dict:
+    result = {"queries": queries}
+    timings, prompt_tokens = [], []
+    with measure_memory(result):
+        for i in range(queries):
+            start = time.perf_counter()
+            with quiet(is_quiet):
+                _, stats = core.ask_question_with_stats(QUESTIONS[i % len(QUESTIONS)])
+            timings.append((time.perf_counter() - start) * 1000)
+            prompt_tokens.append(stats["prompt_tokens"])
+    result["latency_ms"] = percentiles(timings)
+    result["prompt_tokens"] = percentiles(prompt_tokens)
+    return result
+
+
+def bench_transcript_capture(video_core, videos: int, minutes: int, is_quiet: bool) -> dict:
+    """Caption text -> preprocess -> summary -> chunks in the store, as after /video/transcribe."""
+    result = {"videos": videos, "caption_minutes": minutes}
+    timings = []
+    with measure_memory(result):
+        wall_start = time.perf_counter()
+        for i in range(videos):
+            # A different seed per video, so dedup doesn't skip the indexing
+            raw = make_vtt_captions(minutes=minutes, seed=500 + i)
+            start = time.perf_counter()
+            with quiet(is_quiet):
+                ok = video_core.process_text(raw, f"bench_video_{i}")
+            if not ok:
+                raise RuntimeError(f"Transcript capture of video {i} failed")
+            timings.append((time.perf_counter() - start) * 1000)
+        wall = time.perf_counter() - wall_start
+    result["latency_ms"] = percentiles(timings)
+    result["videos_per_sec"] = round(videos / wall, 3)
+    return result
+
+
+def bench_asr(jobs: int, audio_path: str = None, stub_seconds: float = 120.0, stub_rtf: float = 0.01) -> dict:
+    """
+    Times asr.transcribe(). With `audio_path`, the real backend transcribes that clip (needs
+    faster-whisper or openai-whisper and the model weights); otherwise a stub model stands in
+    for every size, so what is measured is the wrapper around the model plus the stub's sleep.
+    """
+    from video_extracter import asr
+
+    result = {"jobs": jobs, "mode": "audio" if audio_path else "stub"}
+    if audio_path:
+        backend, duration = asr.ASR_BACKEND, None
+    else:
+        backend, duration, audio_path = "faster_whisper", stub_seconds, "stub.wav"
+        for size in ("tiny", "base", "small"):
+            asr._models[asr.model_key("faster_whisper", size)] = StubWhisperModel(stub_seconds, stub_rtf)
+        result.update({"stub_audio_seconds": stub_seconds, "stub_rtf": stub_rtf})
+
+    timings, rtfs, sizes = [], [], {}
+    with measure_memory(result):
+        for _ in range(jobs):
+            start = time.perf_counter()
+            out = asr.transcribe(audio_path, duration=duration, backend=backend)
+            timings.append((time.perf_counter() - start) * 1000)
+            if out["real_time_factor"] is not None:
+                rtfs.append(out["real_time_factor"])
+            sizes[out["model_size"]] = sizes.get(out["model_size"], 0) + 1
+    result["backend"] = out["backend"]
+    result["model_sizes"] = sizes
+    result["segments"] = len(out["segments"])
+    result["latency_ms"] = percentiles(timings)
+    result["real_time_factor"] = percentiles(rtfs)
+    return result
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True)
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="brain_bench_")
+    llm_server, llm_url = start_fake_ollama(latency=args.llm_latency)
+    pages = {f"/article/{i}": make_article(i, paragraphs=args.paragraphs) for i in range(args.pages)}
+    html_server, html_url = start_html_server(pages, latency=args.fetch_latency)
+
+    # Point the app at the fakes *before* importing it (settings are read at import time)
+    os.environ["EMBED_BACKEND"] = "hash"
+    os.environ["OLLAMA_BASE_URL"] = llm_url
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "vector_db")
+    os.environ["DATA_PATH"] = os.path.join(workdir, "data")
+    os.environ.setdefault("LLM_RETRY_BACKOFF", "0.01")
+
+    try:
+        with quiet(not args.verbose):
+            from ai_engine import core
+            from video_extracter import core as video_core
+
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "config": vars(args),
+            },
+            "preprocess": bench_preprocess(args.caption_minutes, args.repeats, not args.verbose),
+            "capture": bench_capture(core, html_url, args.pages, not args.verbose),
+            "query": bench_query(core, args.queries, not args.verbose),
+            "transcript_capture": bench_transcript_capture(
+                video_core, args.videos, args.video_minutes, not args.verbose
+            ),
+            "asr": bench_asr(args.asr_jobs, args.asr_audio, args.asr_stub_seconds, args.asr_stub_rtf),
+        }
+        # ru_maxrss is KiB on Linux
+        results["meta"]["max_rss_mib"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        return results
+    finally:
+        llm_server.shutdown()
+        html_server.shutdown()
+
+
+# --- Comparing two result files ---
+
+# Metrics where a *higher* value is better; everything else is "lower is better"
+HIGHER_IS_BETTER = ("pages_per_sec", "mb_per_sec", "videos_per_sec")
+
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    flat = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            flat.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            flat[key] = v
+    return flat
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Prints the relative change per metric; returns 1 if anything regressed past the threshold."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old.pop("meta", None)
+    new.pop("meta", None)
+    old_flat, new_flat = _flatten(old), _flatten(new)
+
+    regressions = 0
+    print(f"{'metric':45} {'old':>12} {'new':>12} {'change':>9}")
+    for key in sorted(old_flat.keys() & new_flat.keys()):
+        a, b = old_flat[key], new_flat[key]
+        change = (b - a) / a if a else 0.0
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        # Only latency/throughput/memory numbers count as regressions, not input sizes
+        if worse > threshold and ("latency" in key or key.endswith(HIGHER_IS_BETTER) or "mib" in key or "tokens" in key):
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key:45} {a:12.3f} {b:12.3f} {change:+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the second brain pipeline")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=25)
+    parser.add_argument("--caption-minutes", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--videos", type=int, default=3, help="Caption transcripts to capture")
+    parser.add_argument("--video-minutes", type=int, default=15, help="Length of each captured video")
+    parser.add_argument("--asr-jobs", type=int, default=3)
+    parser.add_argument("--asr-audio", default=None, help="Short audio clip for a real Whisper timing")
+    parser.add_argument("--asr-stub-seconds", type=float, default=120.0, help="Audio length the stub pretends to transcribe")
+    parser.add_argument("--asr-stub-rtf", type=float, default=0.01, help="Real-time factor of the stub model")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated LLM latency (s)")
+    parser.add_argument("--fetch-latency", type=float, default=0.0, help="Simulated page fetch latency (s)")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(args.compare[0], args.compare[1], args.threshold))
+
+    results = run(args)
+    output = args.output or os.path.join(SCRIPT_DIR, "results", f"{results['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({k: v for k, v in results.items() if k != "meta"}, indent=2))
+    print(f"Results written to {output}")
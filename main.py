@@ -1,18 +1,32 @@
 # main.py
+import os
+import threading
+import time
+import uuid
 from datetime import timedelta
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 # --- AI Engine Imports ---
-from ai_engine.core import process_url, ask_question, get_summary
+from ai_engine.core import process_url, process_file, ask_question_with_stats, get_summary
+from ai_engine.ingest import UPLOAD_DIR, UPLOAD_MAX_BYTES, UnsupportedFileType, file_kind
+from ai_engine.llm_gateway import gateway, LLMGatewayError
+from ai_engine import maintenance
 
 # --- Auth and DB Imports ---
 import auth
 import models
-from db import SessionLocal, engine, get_db
+from db import SessionLocal, engine, async_engine, get_db
+import metrics
+import admission
+from shared_state import maintenance_reason
 
 # --- NEW: Import the video router ---
 from video_extracter.pipeline import router as video_router
@@ -22,6 +36,41 @@ from video_extracter.pipeline import router as video_router
 models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
+# Every log line carries the id of the request it was written for (LOG_LEVEL=DEBUG adds span timings)
+metrics.setup_logging()
+
+
+@app.on_event("startup")
+def warm_up_llm():
+    # Load the model into Ollama in the background so the first request doesn't wait for it
+    threading.Thread(target=gateway.warm_up, daemon=True).start()
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    await async_engine.dispose()
+
+# --- Request ID + HTTP metrics Middleware ---
+# Every request gets an id (or keeps the X-Request-ID the client sent) so the
+# log lines of all pipeline stages of one capture/transcription can be correlated.
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or metrics.new_request_id()
+    token = metrics.request_id_var.set(request_id)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        metrics.request_id_var.reset(token)
+        if metrics.METRICS_ENABLED:
+            # Use the route template (e.g. /video/transcribe) rather than the raw URL
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            metrics.HTTP_DURATION.observe(time.perf_counter() - start, method=request.method, path=path)
+            metrics.HTTP_REQUESTS.inc(method=request.method, path=path, status=status_code)
 
 # --- CORS Middleware ---
 # (Your existing CORS middleware is perfect and will
@@ -41,6 +90,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- GZip Middleware ---
+# Transcript pages and query answers are mostly text; compress anything over 1 KB
+# for clients that send Accept-Encoding: gzip.
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # --- Pydantic Schemas (Request/Response Models) ---
 class URLRequest(BaseModel):
     url: str
@@ -48,16 +102,21 @@ class URLRequest(BaseModel):
 class QuestionRequest(BaseModel):
     question: str
 
+class MaintenanceRequest(BaseModel):
+    dry_run: bool = False
+    # Snapshot to restore (required) or the name for a new one (optional)
+    snapshot: Optional[str] = None
+
 # --- Authentication Endpoints ---
 # (Your /token, /register, and /users/me endpoints remain THE SAME)
 
 @app.post("/token", response_model=auth.Token)
 async def login_for_access_token(
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
     # ... (code unchanged)
-    user = auth.authenticate_user(db, email=form_data.username, password=form_data.password)
+    user = await auth.authenticate_user(db, email=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -72,12 +131,12 @@ async def login_for_access_token(
 
 
 @app.post("/register", response_model=auth.User, status_code=status.HTTP_201_CREATED)
-async def register_user(user: auth.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: auth.UserCreate, db: AsyncSession = Depends(get_db)):
     # ... (code unchanged)
-    db_user = auth.get_user(db, email=user.email)
+    db_user = await auth.get_user(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return auth.create_user(db=db, user=user)
+    return await auth.create_user(db=db, user=user)
 
 
 @app.get("/users/me", response_model=auth.User)
@@ -88,6 +147,11 @@ async def read_users_me(current_user: auth.User = Depends(auth.get_current_user)
 # --- Original Endpoints (Now Protected) ---
 # (Your /capture, /query, and /summary endpoints remain THE SAME)
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus-style metrics (stage latencies, LLM queue wait, HTTP latency)."""
+    return metrics.render_metrics()
+
 @app.get("/")
 async def hello():
     return "Hello second_brain (now with auth!)"
@@ -98,7 +162,11 @@ async def capture_url(
     current_user: auth.User = Depends(auth.get_current_user)
 ):
     # ... (code unchanged)
-    success = process_url(request.url) 
+    # Run the blocking pipeline in a worker thread so the event loop stays free
+    # for other requests (e.g. interactive /query calls) while the LLM works.
+    # Per-user rate limit + a fair share of the heavy-work slots (429 when saturated)
+    async with admission.admit(current_user.email, "capture"):
+        success = await run_in_threadpool(process_url, request.url)
     if not success:
         raise HTTPException(status_code=400, detail="Failed to process the URL.")
     
@@ -107,14 +175,72 @@ async def capture_url(
         "message": f"Article captured for user {current_user.email}"
     }
 
+@app.post("/upload")
+async def upload_document(
+    request: Request,
+    filename: str,
+    current_user: auth.User = Depends(auth.get_current_user)
+):
+    """
+    Indexes a PDF, text, .vtt or .srt file sent as the raw request body, e.g.
+    `curl -X POST --data-binary @book.pdf "http://localhost:8000/upload?filename=book.pdf"`.
+    The body is streamed to disk in chunks and then indexed a batch of pages at a time.
+    """
+    try:
+        ext = file_kind(filename)
+    except UnsupportedFileType as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    declared = int(request.headers.get("content-length") or 0)
+    if declared > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large.")
+
+    doc_id = f"upload_{uuid.uuid4().hex}"
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, doc_id + ext)
+    async with admission.admit(current_user.email, "upload"):
+        try:
+            # Never hold the whole file in memory: write each piece as it arrives
+            received = 0
+            with metrics.span("upload_receive"), open(path, "wb") as f:
+                async for piece in request.stream():
+                    received += len(piece)
+                    if received > UPLOAD_MAX_BYTES:
+                        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large.")
+                    f.write(piece)
+            if not received:
+                raise HTTPException(status_code=400, detail="Empty upload.")
+
+            result = await run_in_threadpool(process_file, path, doc_id, filename)
+        except UnsupportedFileType as e:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    if not result["batches"]:
+        raise HTTPException(status_code=400, detail="No text could be extracted from the file.")
+    return {
+        "status": "success",
+        "doc_id": result["duplicate_of"] or doc_id,
+        "duplicate": bool(result["duplicate_of"]),
+        "bytes": received,
+        "batches": result["batches"],
+        "characters": result["characters"],
+        "user": current_user.email,
+    }
+
 @app.post("/query")
 async def query_knowledge(
     request: QuestionRequest, 
     current_user: auth.User = Depends(auth.get_current_user)
 ):
     # ... (code unchanged)
-    answer = ask_question(request.question) 
-    return {"answer": answer, "user": current_user.email}
+    try:
+        async with admission.admit(current_user.email, "query"):
+            answer, stats = await run_in_threadpool(ask_question_with_stats, request.question)
+    except LLMGatewayError as e:
+        raise HTTPException(status_code=503, detail=f"The language model is unavailable: {e}")
+    return {"answer": answer, "user": current_user.email, "stats": stats}
 
 @app.post("/summary")
 async def get_url_summary(
@@ -129,6 +255,36 @@ async def get_url_summary(
     return {"summary": summary, "user": current_user.email}
 
 
+# --- Admin: vector store maintenance ---
+# Same operations as `python -m ai_engine.maintenance ...` (see ai_engine/maintenance.py).
+
+@app.get("/admin/maintenance")
+async def maintenance_status(admin: auth.User = Depends(auth.get_current_admin)):
+    """Store size, query latency and the available snapshots."""
+    report = await run_in_threadpool(maintenance.run, "report")
+    report["in_progress"] = maintenance_reason()
+    return report
+
+@app.post("/admin/maintenance/{action}")
+async def run_maintenance(
+    action: str,
+    request: MaintenanceRequest,
+    admin: auth.User = Depends(auth.get_current_admin)
+):
+    """
+    gc, compact, run (gc + compact), snapshot or restore. Compaction, snapshots and restores put
+    the API in read-only mode while they run (/capture and /upload answer 503).
+    """
+    if action not in maintenance.ACTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown maintenance action '{action}'.")
+    running = maintenance_reason()
+    if running:
+        raise HTTPException(status_code=409, detail=f"Maintenance already in progress ({running}).")
+    try:
+        return await run_in_threadpool(maintenance.run, action, dry_run=request.dry_run, snapshot=request.snapshot)
+    except maintenance.MaintenanceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # --- NEW: Include the video router ---
 # This line "links" your video pipeline to the main app.
 # All routes from pipeline.py will now be available under the /video prefix.
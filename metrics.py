@@ -0,0 +1,204 @@
+# metrics.py
+# A small tracing/metrics layer (no extra dependencies):
+#   - span("stage") times a block of code and records it in a histogram
+#   - counters/histograms are rendered in the Prometheus text format for GET /metrics
+#   - every request gets a request id; setup_logging() adds it to every log line written
+#     while that request is being handled (span timings, warnings, pipeline logs)
+# Set METRICS_ENABLED=0 to turn it off; span() then returns a shared no-op object.
+import os
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = "%(asctime)s %(levelname)s [request %(request_id)s] %(name)s: %(message)s"
+
+# Default histogram buckets (seconds): from fast lookups up to long Whisper runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# The id of the request (or background job) the current code is running for
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class RequestIdFilter(logging.Filter):
+    """Sets `record.request_id` (for LOG_FORMAT) from the request the log call was made in."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def setup_logging(level: str = LOG_LEVEL):
+    """
+    Makes the root logger's handlers print the request id of every line.
+    The filter sits on the handlers, not the logger, so it also sees records propagated
+    from module loggers (ai_engine.*, video_extracter.*, ...).
+    """
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(level=level)
+    root.setLevel(level)
+    for handler in root.handlers:
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Optional[dict] = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in items)
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {v}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, row in sorted(self._values.items()):
+                for i, upper in enumerate(self.buckets):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, {'le': upper})} {row[i]}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {row[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {row[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {row[-1]}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+registry = Registry()
+
+STAGE_DURATION = registry.histogram("stage_duration_seconds", "Time spent in each pipeline stage.")
+STAGE_ERRORS = registry.counter("stage_errors_total", "Pipeline stages that raised an exception.")
+HTTP_DURATION = registry.histogram("http_request_duration_seconds", "HTTP request latency.")
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests by path and status code.")
+
+
+@contextmanager
+def _timed_span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        log.debug(f"{stage} took {elapsed * 1000:.1f} ms")  # the request id comes from RequestIdFilter
+
+
+_NOOP = nullcontext()
+
+
+def span(stage: str):
+    """
+    Times a block of code:
+
+        with span("fetch_text_from_url"):
+            ...
+    """
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _timed_span(stage)
+
+
+def traced(stage: str):
+    """Decorator version of span()."""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _timed_span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return registry.render()
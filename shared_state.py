@@ -0,0 +1,182 @@
+# shared_state.py
+# State that has to be shared between uvicorn/gunicorn worker processes.
+# With `--workers N` every worker has its own copy of the module globals (the loaded index,
+# the cached query engine), so anything that must agree across workers lives outside them:
+#   - index versions: a counter per index in a small SQLite file. A writer bumps it after
+#     indexing; readers compare it to their own copy (at most every VERSION_CHECK_INTERVAL
+#     seconds) and drop their cached index/query engine when it moved.
+#   - writer locks: file locks, so only one process at a time appends to the vector store
+#     (the quantized tier and the per-capture files in DATA_PATH are not safe for concurrent writers).
+#   - maintenance mode: a flag set while ai_engine/maintenance.py compacts, restores or snapshots
+#     the store; write endpoints answer 503 until it is cleared, queries keep working.
+#   - the Chroma client: an embedded PersistentClient keeps its HNSW index in the memory of the
+#     process that opened it, so other workers never see its writes. With more than one worker,
+#     run a Chroma server (`chroma run --path ./vector_db`) and set CHROMA_HOST / CHROMA_PORT.
+#
+# Example multi-worker deployment:
+#   chroma run --path ./vector_db --port 8001 &
+#   CHROMA_HOST=localhost CHROMA_PORT=8001 WEB_CONCURRENCY=4 uvicorn main:app --workers 4
+import os
+import time
+import sqlite3
+import logging
+import threading
+import contextlib
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locks only (single worker)
+    fcntl = None
+
+import chromadb
+
+log = logging.getLogger(__name__)
+
+STATE_DIR = os.getenv("STATE_DIR", os.getenv("CHROMA_PATH", "./vector_db"))
+STATE_DB_PATH = os.path.join(STATE_DIR, "state.sqlite3")
+VERSION_CHECK_INTERVAL = float(os.getenv("VERSION_CHECK_INTERVAL", 1.0))  # seconds
+CHROMA_HOST = os.getenv("CHROMA_HOST", "")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", 8000))
+# Same variable gunicorn/uvicorn deployments use for the worker count
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
+# Index names shared by ai_engine/core.py and video_extracter/core.py (both use the same collection)
+VECTOR_INDEX = "vector_index"
+COLLECTION_NAME = "user_collection_local"
+# Bumped when maintenance replaces the store itself (compacted collection, restored snapshot):
+# every process then reopens its Chroma client, collection and chunk store
+VECTOR_STORE = "vector_store"
+
+_local = threading.local()
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    # One connection per thread; WAL lets readers run while a writer commits
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        conn = sqlite3.connect(STATE_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS flags (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        _local.conn = conn
+    return conn
+
+
+def get_version(name: str) -> int:
+    row = _connect().execute("SELECT version FROM versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def bump_version(name: str) -> int:
+    """Atomically increments an index version (across processes) and returns the new value."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT OR IGNORE INTO versions (name, version) VALUES (?, 0)", (name,))
+        conn.execute("UPDATE versions SET version = version + 1 WHERE name = ?", (name,))
+        version = conn.execute("SELECT version FROM versions WHERE name = ?", (name,)).fetchone()[0]
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return version
+
+
+class VersionWatcher:
+    """Reads a shared index version, hitting SQLite at most once per `interval` seconds."""
+
+    def __init__(self, name: str, interval: float = VERSION_CHECK_INTERVAL):
+        self.name = name
+        self.interval = interval
+        self._version = get_version(name)
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def current(self, fresh: bool = False) -> int:
+        """`fresh` skips the interval (use it with the writer lock held, right before writing)."""
+        with self._lock:
+            if fresh or time.monotonic() - self._checked >= self.interval:
+                self._version = get_version(self.name)
+                self._checked = time.monotonic()
+            return self._version
+
+    def seen(self, version: int):
+        """Records a version this process produced itself (no need to re-read it)."""
+        with self._lock:
+            self._version = max(self._version, version)
+
+
+def set_maintenance(reason: Optional[str]):
+    """Puts every worker in read-only maintenance mode (or takes them out of it with None)."""
+    conn = _connect()
+    if reason:
+        conn.execute("INSERT OR REPLACE INTO flags (name, value) VALUES ('maintenance', ?)", (reason,))
+    else:
+        conn.execute("DELETE FROM flags WHERE name = 'maintenance'")
+
+
+def maintenance_reason() -> Optional[str]:
+    """What maintenance is running, or None when writes are allowed."""
+    row = _connect().execute("SELECT value FROM flags WHERE name = 'maintenance'").fetchone()
+    return row[0] if row else None
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Exclusive lock held by one thread of one process at a time."""
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(path, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def writer_lock(name: str):
+    """The single-writer lock for an index: hold it while adding to (or deleting from) the store."""
+    return file_lock(os.path.join(STATE_DIR, f"{name}.lock"))
+
+
+def make_chroma_client(path: str):
+    """A Chroma server client when CHROMA_HOST is set, the embedded client otherwise."""
+    if CHROMA_HOST:
+        log.info(f"Using Chroma server at {CHROMA_HOST}:{CHROMA_PORT}.")
+        return chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    if WEB_CONCURRENCY > 1:
+        log.warning(
+            "WEB_CONCURRENCY > 1 with an embedded Chroma client: workers will not see each "
+            "other's writes. Run a Chroma server and set CHROMA_HOST."
+        )
+    return chromadb.PersistentClient(path=path)
+
+
+_clients = {}  # path -> (store generation, client)
+_clients_lock = threading.Lock()
+
+
+def chroma_client(path: str, generation: int):
+    """
+    This process's Chroma client for `path`, opened once per VECTOR_STORE generation.
+    The embedded client caches open files per path, so after a restore replaced them the
+    cache is cleared and the new files are read.
+    """
+    with _clients_lock:
+        cached = _clients.get(path)
+        if cached and cached[0] == generation:
+            return cached[1]
+        if cached and not CHROMA_HOST:
+            cached[1].clear_system_cache()
+        client = make_chroma_client(path)
+        _clients[path] = (generation, client)
+        return client
@@ -0,0 +1,23 @@
+# conftest.py
+# Shared setup for the test suite: the project root on sys.path (the app uses top-level
+# imports like `import admission`), and every on-disk store pointed at a throwaway directory
+# *before* any app module is imported, since they read their paths from the environment.
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "video_extracter"))  # video_extracter/core.py imports `preprocess`
+
+_STATE = tempfile.mkdtemp(prefix="second_brain_tests_")
+os.environ.setdefault("CHROMA_PATH", os.path.join(_STATE, "vector_db"))
+os.environ.setdefault("STATE_DIR", os.path.join(_STATE, "state"))
+os.environ.setdefault("DATA_PATH", os.path.join(_STATE, "data"))
+os.environ.setdefault("TRANSCRIPT_DIR", os.path.join(_STATE, "transcripts"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_STATE, "uploads"))
+os.environ.setdefault("EMBED_BACKEND", "hash")  # offline, deterministic embeddings
+os.environ.setdefault("OLLAMA_BASE_URL", "http://127.0.0.1:9")  # nothing listens there
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(_STATE, "app.db"))
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
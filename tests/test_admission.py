@@ -0,0 +1,208 @@
+# Tests for admission control: fair queuing, quotas, rate limits and the maintenance 503.
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import admission
+from admission import FairScheduler, RateLimiter, TokenBucket, admit
+
+
+@pytest.fixture
+def fresh_admission(monkeypatch):
+    """Swaps in a scheduler/rate limiter the test controls (rate limits off by default)."""
+    def install(scheduler=None, limits=None):
+        monkeypatch.setattr(admission, "scheduler", scheduler or FairScheduler())
+        monkeypatch.setattr(admission, "rate_limiter", RateLimiter(limits or {}, burst=1))
+        monkeypatch.setattr(admission, "maintenance_reason", lambda: None)
+        return admission.scheduler
+    return install
+
+
+def _assert_clean(scheduler):
+    assert scheduler.queue_depth() == 0
+    assert scheduler._running == 0
+    assert all(n == 0 for n in scheduler._user_queued.values())
+    assert all(n == 0 for n in scheduler._user_running.values())
+    assert all(n == 0 for n in scheduler._backlog.values())
+
+
+def test_token_bucket_refuses_when_empty_and_reports_wait():
+    bucket = TokenBucket(rate_per_sec=1.0, capacity=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    wait = bucket.take()
+    assert 0 < wait <= 1.0
+
+
+def test_fair_scheduler_interleaves_two_users():
+    scheduler = FairScheduler(slots=1, max_queue=10, user_running=1, user_queued=5)
+    started = []
+
+    async def job(user, n):
+        async with scheduler.slot(user, "transcribe"):
+            started.append(f"{user}{n}")
+            await asyncio.sleep(0.01)
+
+    async def main():
+        # alice submits all her videos before bob submits his
+        tasks = [asyncio.create_task(job("alice", n)) for n in range(1, 4)]
+        tasks += [asyncio.create_task(job("bob", n)) for n in range(1, 4)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert started == ["alice1", "bob1", "alice2", "bob2", "alice3", "bob3"]
+    _assert_clean(scheduler)
+
+
+def test_user_queue_full_is_429_with_retry_after(fresh_admission):
+    scheduler = fresh_admission(FairScheduler(slots=1, max_queue=10, user_running=1, user_queued=1))
+
+    async def main():
+        release = asyncio.Event()
+
+        async def job():
+            async with admit("alice", "capture"):
+                await release.wait()
+
+        running = asyncio.create_task(job())
+        queued = asyncio.create_task(job())
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth() == 1
+        with pytest.raises(HTTPException) as excinfo:
+            async with admit("alice", "capture"):
+                pass
+        # another user still gets in line
+        other = asyncio.create_task(job_for("bob", release))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth() == 2
+        release.set()
+        await asyncio.gather(running, queued, other)
+        return excinfo.value
+
+    async def job_for(user, release):
+        async with admit(user, "capture"):
+            await release.wait()
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert "user queue full" in error.detail
+    assert int(error.headers["Retry-After"]) >= 1
+    _assert_clean(scheduler)
+
+
+def test_queue_full_is_429_with_retry_after(fresh_admission):
+    scheduler = fresh_admission(FairScheduler(slots=1, max_queue=1, user_running=1, user_queued=5))
+
+    async def main():
+        release = asyncio.Event()
+
+        async def job(user):
+            async with admit(user, "upload"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(job("alice")), asyncio.create_task(job("bob"))]
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth() == 1
+        with pytest.raises(HTTPException) as excinfo:
+            async with admit("carol", "upload"):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return excinfo.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert "queue full" in error.detail
+    assert int(error.headers["Retry-After"]) >= 1
+    _assert_clean(scheduler)
+
+
+def test_rate_limited_is_429(fresh_admission):
+    fresh_admission(limits={"query": 60})
+
+    async def main():
+        async with admit("alice", "query"):
+            pass
+        with pytest.raises(HTTPException) as excinfo:
+            async with admit("alice", "query"):
+                pass
+        return excinfo.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert "rate limited" in error.detail
+    assert error.headers["Retry-After"] == "1"
+
+
+def test_cancelled_waiter_leaves_queue_clean():
+    scheduler = FairScheduler(slots=1, max_queue=10, user_running=1, user_queued=5)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def job(user):
+            async with scheduler.slot(user, "transcribe"):
+                await release.wait()
+
+        running = asyncio.create_task(job("alice"))
+        waiting = [asyncio.create_task(job("bob")), asyncio.create_task(job("carol"))]
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth() == 2
+        assert scheduler.backlog("transcribe") == 3
+
+        waiting[0].cancel()  # bob's client disconnects while queued
+        await asyncio.gather(waiting[0], return_exceptions=True)
+        assert scheduler.queue_depth() == 1
+        assert scheduler._user_queued["bob"] == 0
+        assert scheduler.backlog("transcribe") == 2
+
+        release.set()
+        await asyncio.gather(running, waiting[1])
+
+    asyncio.run(main())
+    _assert_clean(scheduler)
+
+
+def test_cancelled_running_job_releases_its_slot():
+    scheduler = FairScheduler(slots=1, max_queue=10, user_running=1, user_queued=5)
+
+    async def main():
+        async def job():
+            async with scheduler.slot("alice", "capture"):
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(job())
+        await asyncio.sleep(0)
+        assert scheduler._running == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        async with scheduler.slot("bob", "capture"):
+            pass
+
+    asyncio.run(main())
+    _assert_clean(scheduler)
+
+
+def test_maintenance_rejects_writes_with_503(fresh_admission, monkeypatch):
+    fresh_admission()
+    monkeypatch.setattr(admission, "maintenance_reason", lambda: "compaction")
+
+    async def main():
+        errors = {}
+        for endpoint in sorted(admission.WRITE_ENDPOINTS):
+            with pytest.raises(HTTPException) as excinfo:
+                async with admit("alice", endpoint):
+                    pass
+            errors[endpoint] = excinfo.value
+        async with admit("alice", "query"):  # reads keep working
+            pass
+        return errors
+
+    errors = asyncio.run(main())
+    assert set(errors) == {"capture", "upload"}
+    for error in errors.values():
+        assert error.status_code == 503
+        assert "compaction" in error.detail
+        assert error.headers["Retry-After"] == str(admission.MAINTENANCE_RETRY_AFTER)
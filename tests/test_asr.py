@@ -0,0 +1,115 @@
+# Tests for the ASR model choice (video_extracter/asr.py); a stub stands in for the Whisper model.
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import admission
+from video_extracter import asr
+
+
+class BlockingModel:
+    """Quacks like faster_whisper.WhisperModel; transcribe() waits until the test releases it."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def transcribe(self, audio_path, beam_size=1):
+        self.release.wait(10)
+        segment = SimpleNamespace(start=0.0, end=2.0, text=" hello")
+        return iter([segment]), SimpleNamespace(language="en", duration=2.0)
+
+
+@pytest.fixture
+def stub_models(monkeypatch):
+    model = BlockingModel()
+    monkeypatch.setattr(asr, "ASR_MODEL_SIZE", "")
+    monkeypatch.setattr(asr, "_models", {asr.model_key("faster_whisper", s): model for s in ("tiny", "base", "small")})
+    yield model
+    model.release.set()
+
+
+@pytest.mark.parametrize("duration, queued, size", [
+    (60, 0, "small"),
+    (5 * 60, 0, "small"),
+    (20 * 60, 0, "base"),
+    (None, 0, "base"),
+    (50 * 60, 0, "tiny"),
+    (60, asr.ASR_BACKLOG_THRESHOLD - 1, "small"),
+    (60, asr.ASR_BACKLOG_THRESHOLD, "tiny"),
+])
+def test_choose_model_size(monkeypatch, duration, queued, size):
+    monkeypatch.setattr(asr, "ASR_MODEL_SIZE", "")
+    assert asr.choose_model_size(duration, queued) == size
+
+
+def test_forced_model_size_wins(monkeypatch):
+    monkeypatch.setattr(asr, "ASR_MODEL_SIZE", "medium")
+    assert asr.choose_model_size(60, 10) == "medium"
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_queue_depth_counts_running_asr_jobs(stub_models):
+    results = []
+
+    def job():
+        results.append(asr.transcribe("clip.wav", duration=60, backend="faster_whisper"))
+
+    assert asr.queue_depth() == 0
+    threads = [threading.Thread(target=job) for _ in range(asr.ASR_BACKLOG_THRESHOLD)]
+    for i, t in enumerate(threads):
+        t.start()
+        _wait_for(lambda: asr.queue_depth() == i + 1)
+    stub_models.release.set()
+    for t in threads:
+        t.join(10)
+
+    # Each job saw only the jobs started before it, below the threshold
+    assert [r["model_size"] for r in results] == ["small"] * asr.ASR_BACKLOG_THRESHOLD
+    assert asr.queue_depth() == 0
+
+
+def test_busy_asr_picks_the_smallest_model(stub_models):
+    threads = [
+        threading.Thread(target=asr.transcribe, args=("clip.wav",), kwargs={"duration": 60, "backend": "faster_whisper"})
+        for _ in range(asr.ASR_BACKLOG_THRESHOLD)
+    ]
+    for t in threads:
+        t.start()
+    _wait_for(lambda: asr.queue_depth() == asr.ASR_BACKLOG_THRESHOLD)
+    stub_models.release.set()  # the next job only finds the model free, not the queue
+    result = asr.transcribe("clip.wav", duration=60, backend="faster_whisper")
+    for t in threads:
+        t.join(10)
+    assert result["model_size"] == "tiny"
+    assert result["segments"] == [{"start": 0.0, "end": 2.0, "text": " hello"}]
+
+
+def test_transcribe_requests_served_from_captions_are_not_counted(monkeypatch):
+    monkeypatch.setattr(admission, "scheduler", admission.FairScheduler())
+    monkeypatch.setattr(admission, "rate_limiter", admission.RateLimiter({}))
+    monkeypatch.setattr(admission, "maintenance_reason", lambda: None)
+
+    async def main():
+        async with admission.admit("alice@example.com", "transcribe"), admission.admit("bob@example.com", "transcribe"):
+            return asr.queue_depth()
+
+    assert asyncio.run(main()) == 0
+
+
+def test_loading_one_model_does_not_block_another(stub_models):
+    # A slow load of "small" holds only that model's lock
+    key = asr.model_key("faster_whisper", "small")
+    asr._models.pop(key)
+    with asr._models_lock:
+        lock = asr._load_locks.setdefault(key, threading.Lock())
+    with lock:
+        assert asr._load_model("faster_whisper", "tiny") is stub_models
@@ -0,0 +1,94 @@
+# Table-driven tests for caption track selection (video_extracter/captions.py).
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from video_extracter.captions import select_caption_track
+
+TIMEDTEXT = "https://www.youtube.com/api/timedtext?v=abc123"
+
+
+def _track(lang, ext="vtt", kind=None):
+    url = f"{TIMEDTEXT}&lang={lang}&fmt={ext}" + (f"&kind={kind}" if kind else "")
+    return [{"ext": ext, "url": url}]
+
+
+def _params(url):
+    return {k: v[0] for k, v in parse_qs(urlsplit(url).query).items()}
+
+
+CASES = [
+    # (name, info, langs, allow_translated, expected kind, expected language, expected URL params)
+    (
+        "manual regional variant",
+        {"subtitles": {"en-GB": _track("en-GB")}, "automatic_captions": {"en-orig": _track("en", kind="asr")}},
+        ["en"], True, "manual", "en-GB", {"lang": "en-GB", "fmt": "vtt"},
+    ),
+    (
+        "exact manual language before regional variants",
+        {"subtitles": {"en-US": _track("en-US"), "en": _track("en"), "en-GB": _track("en-GB")}},
+        ["en"], True, "manual", "en", {"lang": "en"},
+    ),
+    (
+        "live chat is not a subtitle track",
+        {"subtitles": {"live_chat": [{"ext": "json", "url": "https://example.com/chat"}]},
+         "automatic_captions": {"en-orig": _track("en", kind="asr")}},
+        ["en"], True, "automatic", "en-orig", {"kind": "asr"},
+    ),
+    (
+        "automatic track in the spoken language",
+        {"automatic_captions": {"en-orig": _track("en", kind="asr"), "en": _track("en"), "fr": _track("fr")}},
+        ["en"], True, "automatic", "en-orig", {"lang": "en", "kind": "asr"},
+    ),
+    (
+        "automatic track of another spoken language is a translation",
+        {"automatic_captions": {"de-orig": _track("de", kind="asr"), "en": _track("en", kind="tr")}},
+        ["en"], True, "translated", "en", {"lang": "en", "kind": "tr"},
+    ),
+    (
+        "spoken-language gate without translations means ASR",
+        {"automatic_captions": {"de-orig": _track("de", kind="asr"), "en": _track("en", kind="tr")}},
+        ["en"], False, None, None, None,
+    ),
+    (
+        "language preference order wins over track kind",
+        {"subtitles": {"en": _track("en")}, "automatic_captions": {"de-orig": _track("de", kind="asr")}},
+        ["de", "en"], True, "automatic", "de-orig", {"lang": "de"},
+    ),
+    (
+        "manual track in another language translated with tlang",
+        {"subtitles": {"fr": _track("fr")}, "automatic_captions": {"fr-orig": _track("fr", kind="asr"),
+                                                                  "en": _track("en", kind="tr")}},
+        ["en"], True, "translated", "fr->en", {"lang": "fr", "tlang": "en", "fmt": "vtt"},
+    ),
+    (
+        "non-vtt format rewritten to fmt=vtt",
+        {"subtitles": {"en": _track("en", ext="json3") + _track("en", ext="srv3")}},
+        ["en"], True, "manual", "en", {"lang": "en", "fmt": "vtt"},
+    ),
+    (
+        "no tracks at all",
+        {"subtitles": {}, "automatic_captions": {}},
+        ["en"], True, None, None, None,
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "info, langs, allow_translated, kind, language, params",
+    [case[1:] for case in CASES],
+    ids=[case[0] for case in CASES],
+)
+def test_select_caption_track(info, langs, allow_translated, kind, language, params):
+    selected = select_caption_track(info, langs=langs, allow_translated=allow_translated)
+    if kind is None:
+        assert selected is None
+        return
+    assert selected is not None
+    assert selected[:2] == (kind, language)
+    assert _params(selected[2]).items() >= params.items()
+
+
+def test_vtt_url_is_used_as_is():
+    info = {"subtitles": {"en": [{"ext": "vtt", "url": "https://cdn.example.com/en.vtt"}]}}
+    assert select_caption_track(info, langs=["en"]) == ("manual", "en", "https://cdn.example.com/en.vtt")
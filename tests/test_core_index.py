@@ -0,0 +1,68 @@
+# Tests for the index swap in ai_engine/vector_index.py (questions racing writers in one process).
+import threading
+
+import pytest
+
+core = pytest.importorskip("ai_engine.core")
+from ai_engine import vector_index
+from shared_state import VECTOR_INDEX, writer_lock
+
+
+def test_current_index_is_consistent_while_writers_publish():
+    errors, pairs = [], []
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                pairs.append(core.current_index())
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    def writer():
+        for _ in range(50):
+            with writer_lock(VECTOR_INDEX):
+                core.open_vector_store(fresh=True)
+                core.publish_index()
+        stop.set()
+
+    threads = [threading.Thread(target=reader) for _ in range(4)] + [threading.Thread(target=writer)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+
+    assert not errors
+    assert pairs and all(index is not None for index, _ in pairs)
+    # After the last write, a question sees the newest version
+    index, version = core.current_index()
+    assert version == vector_index.index_watcher.current(fresh=True)
+    assert index is core.current_index()[0]  # and keeps reusing the loaded index
+
+
+def test_index_is_loaded_outside_the_lock(monkeypatch):
+    with writer_lock(VECTOR_INDEX):
+        core.publish_index()  # drops the loaded index
+    loading = []
+
+    def from_vector_store(store):
+        # Another request thread can still take the lock while this one loads
+        acquired = []
+        t = threading.Thread(target=lambda: acquired.append(vector_index.index_lock.acquire(timeout=1)))
+        t.start()
+        t.join()
+        if acquired[0]:
+            vector_index.index_lock.release()
+        loading.append(acquired[0])
+        return object()
+
+    monkeypatch.setattr(vector_index.VectorStoreIndex, "from_vector_store", from_vector_store)
+    index, version = core.current_index()
+    assert loading == [True]
+    assert vector_index.current_index() == (index, version)  # kept for the next question
+
+
+def test_both_cores_share_one_store():
+    video_core = pytest.importorskip("video_extracter.core")
+    assert video_core.current_index is core.current_index is vector_index.current_index
+    assert video_core.vector_index is core.vector_index
@@ -0,0 +1,72 @@
+# Tests for the shared caption parser/cleaner (ai_engine/cues.py) and the paths that use it.
+from ai_engine.cues import clean_line, clean_lines, iter_cues, parse_timestamp
+from ai_engine.ingest import iter_subtitle_cues
+from preprocess import preprocess_transcript
+from video_extracter.transcript_store import vtt_to_segments
+
+ROLLING_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.000 align:start position:0%
+[Music]
+hello<00:00:00.500><c> world</c>
+
+00:00:02.000 --> 00:00:02.010 align:start position:0%
+hello world
+
+00:00:02.010 --> 00:00:04.000 align:start position:0%
+hello world
+this<00:00:02.500><c> is</c><00:00:03.000><c> it</c>
+
+00:00:04.000 --> 00:00:05.000
+this is it
+"""
+
+SRT = """1
+00:00:01,000 --> 00:00:02,000
+<i>Hi</i>   there
+
+2
+00:00:03,000 --> 00:00:04,500
+[Applause]
+
+3
+01:00:03,000 --> 01:00:04,500
+Bye
+"""
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("00:00:02.500") == 2.5
+    assert parse_timestamp("01:02:03,250") == 3723.25
+    assert parse_timestamp("02:03.000") == 123.0
+
+
+def test_clean_line():
+    assert clean_line("so<00:00:09.000><c> tight</c> [&nbsp;__&nbsp;]  now") == "so tight now"
+    assert clean_line("[Music]") == ""
+
+
+def test_cues_skip_headers_numbers_and_rolling_duplicates():
+    assert list(iter_cues(ROLLING_VTT.split("\n"))) == [
+        (0.0, 2.0, ["hello world"]),
+        (2.01, 4.0, ["this is it"]),
+    ]
+    assert list(iter_cues(SRT.split("\n"))) == [(1.0, 2.0, ["Hi there"]), (3603.0, 3604.5, ["Bye"])]
+
+
+def test_every_caption_path_cleans_the_same_way(tmp_path):
+    path = tmp_path / "talk.vtt"
+    path.write_text(ROLLING_VTT, encoding="utf-8")
+    assert list(iter_subtitle_cues(str(path))) == [("00:00:00", "hello world"), ("00:00:02", "this is it")]
+    assert vtt_to_segments(ROLLING_VTT) == [
+        {"start": 0.0, "end": 2.0, "text": "hello world"},
+        {"start": 2.01, "end": 4.0, "text": "this is it"},
+    ]
+    assert preprocess_transcript(ROLLING_VTT).splitlines()[-2:] == ["hello world", "this is it"]
+
+
+def test_clean_lines_keeps_repeats_that_are_not_adjacent():
+    text = "the chorus\n<c>the chorus</c>\na verse\nthe chorus\n\n"
+    assert list(clean_lines(text.splitlines())) == ["the chorus", "a verse", "the chorus"]
@@ -0,0 +1,86 @@
+# Tests for near-duplicate detection (ai_engine/dedup.py) and its use in process_url.
+import random
+
+import pytest
+
+from ai_engine.dedup import DedupIndex, estimate_similarity, minhash_signature, normalize_url
+
+
+def _article(seed: int, words: int = 400) -> str:
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+@pytest.mark.parametrize("variant", [
+    "https://example.com/news/story?utm_source=twitter&utm_medium=social",
+    "https://www.example.com/news/story",
+    "https://example.com/news/story/amp",
+    "https://amp.example.com/news/story.amp",
+    "https://m.example.com/news/story/?fbclid=abc123#comments",
+    "HTTPS://Example.COM/news/story?gclid=x&ref=homepage",
+])
+def test_normalize_url_collapses_variants(variant):
+    assert normalize_url(variant) == normalize_url("https://example.com/news/story")
+
+
+def test_normalize_url_keeps_meaningful_parameters():
+    assert normalize_url("https://example.com/search?q=llm&page=2&utm_campaign=x") == \
+        normalize_url("https://www.example.com/search?page=2&q=llm")
+    assert normalize_url("https://example.com/search?q=llm") != normalize_url("https://example.com/search?q=rag")
+    assert normalize_url("https://example.com/a") != normalize_url("https://example.com/b")
+
+
+def test_near_duplicate_texts_are_found(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite3"))
+    original = _article(1)
+    index.add("https://example.com/story", minhash_signature(original))
+
+    # The same article with a different footer (a mirror / syndicated copy)
+    mirror = original + " Read more stories like this on our site and subscribe to the newsletter"
+    found = index.find_duplicate(minhash_signature(mirror))
+    assert found is not None
+    doc_id, similarity = found
+    assert doc_id == "https://example.com/story"
+    assert similarity >= 0.85
+
+
+def test_distinct_texts_are_not_duplicates(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite3"))
+    index.add("https://example.com/one", minhash_signature(_article(1)))
+    assert index.find_duplicate(minhash_signature(_article(2))) is None
+    assert estimate_similarity(minhash_signature(_article(1)), minhash_signature(_article(2))) < 0.1
+
+
+def test_remove_forgets_document_and_links(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite3"))
+    index.add("doc", minhash_signature(_article(3)))
+    index.link("https://www.example.com/three?utm_source=x", "doc")
+    assert index.resolve("https://example.com/three") == "doc"
+    index.remove("doc")
+    assert index.resolve("https://example.com/three") is None
+    assert index.find_duplicate(minhash_signature(_article(3))) is None
+
+
+def test_process_url_links_duplicate_instead_of_reindexing(tmp_path, monkeypatch):
+    core = pytest.importorskip("ai_engine.core")
+    monkeypatch.setattr(core, "dedup_index", DedupIndex(str(tmp_path / "dedup.sqlite3")))
+    monkeypatch.setattr(core, "DATA_PATH", str(tmp_path / "data"))
+    article = "## A story\n\n" + _article(4)
+    pages = {
+        "https://example.com/story": article,
+        "https://amp.example.com/story/amp?utm_source=feed": article + " Share this article.",
+    }
+    summaries = []
+    monkeypatch.setattr(core, "fetch_text_from_url", pages.get)
+    monkeypatch.setattr(core, "generate_and_store_summary", lambda text, url: summaries.append(url))
+
+    assert core.process_url("https://example.com/story")
+    core.open_vector_store()
+    chunks = core.vector_index.collection.count()
+    assert chunks > 0
+
+    assert core.process_url("https://amp.example.com/story/amp?utm_source=feed")
+    assert summaries == ["https://example.com/story"]  # no second summary ...
+    assert core.vector_index.collection.count() == chunks  # ... and no second copy of the chunks
+    assert core.dedup_index.resolve("https://amp.example.com/story/amp?utm_source=feed") == "https://example.com/story"
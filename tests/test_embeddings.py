@@ -0,0 +1,59 @@
+# Tests for the ONNX embedding backend (ai_engine/embeddings.py). The parity tests need the
+# exported model (python ai_engine/embeddings.py export) and are skipped without it.
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+from ai_engine import embeddings
+from ai_engine.embeddings import OnnxEmbedding
+
+TEXTS = [
+    "so that's the whole trick",
+    "Chroma keeps every float32 vector and its graph in memory, so memory grows with every capture.",
+    " ".join(["a longer paragraph about quantized vectors and memory-mapped files"] * 12),
+    "ok",
+]
+
+needs_model = pytest.mark.skipif(
+    not all(os.path.exists(os.path.join(embeddings.EMBED_ONNX_PATH, f)) for f in ("model.onnx", "tokenizer.json")),
+    reason=f"no exported ONNX model in {embeddings.EMBED_ONNX_PATH}",
+)
+
+
+def _unit(vecs):
+    vecs = np.asarray(vecs, dtype=np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def test_missing_model_hint_matches_the_export_defaults(tmp_path):
+    with pytest.raises(FileNotFoundError) as excinfo:
+        OnnxEmbedding(model_dir=str(tmp_path), quantized=True)
+    message = str(excinfo.value)
+    assert "model_quantized.onnx not found" in message
+    assert f"export --output {tmp_path}" in message and "EMBED_ONNX_QUANTIZED=0" in message
+
+
+@needs_model
+@pytest.mark.parametrize("quantized, min_cosine", [(False, 0.99), (True, 0.98)])
+def test_onnx_agrees_with_pytorch(quantized, min_cosine):
+    if quantized and not os.path.exists(os.path.join(embeddings.EMBED_ONNX_PATH, "model_quantized.onnx")):
+        pytest.skip("no int8 model exported")
+    huggingface = pytest.importorskip("llama_index.embeddings.huggingface")
+    reference = _unit(huggingface.HuggingFaceEmbedding(model_name=embeddings.EMBED_MODEL_NAME).get_text_embedding_batch(TEXTS))
+    onnx = _unit(OnnxEmbedding(quantized=quantized).get_text_embedding_batch(TEXTS))
+    assert np.sum(reference * onnx, axis=1).min() >= min_cosine
+
+
+@needs_model
+def test_bucketed_batches_match_unbucketed(monkeypatch):
+    model = OnnxEmbedding(quantized=False)
+    bucketed = np.asarray(model.get_text_embedding_batch(TEXTS))
+    # No buckets: every text is padded to max_length, in one call
+    monkeypatch.setattr(embeddings, "SEQUENCE_BUCKETS", ())
+    unbucketed = np.asarray(model.get_text_embedding_batch(TEXTS))
+    one_by_one = np.asarray([model.get_text_embedding(t) for t in TEXTS])
+    np.testing.assert_allclose(bucketed, unbucketed, atol=1e-4)
+    np.testing.assert_allclose(bucketed, one_by_one, atol=1e-4)
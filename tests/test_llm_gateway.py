@@ -0,0 +1,161 @@
+# Tests for the LLM gateway against the fake Ollama server (ai_engine/fake_ollama.py).
+import time
+import threading
+
+import pytest
+
+from ai_engine.fake_ollama import start_fake_ollama
+from ai_engine.llm_gateway import (
+    LLMGateway,
+    LLMGatewayError,
+    LLMDeadlineExceeded,
+    PrioritySemaphore,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+)
+
+
+@pytest.fixture
+def fake_ollama():
+    servers = []
+
+    def start(**kwargs):
+        server, url = start_fake_ollama(**kwargs)
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out waiting for condition"
+        time.sleep(0.005)
+
+
+def test_priority_semaphore_serves_interactive_before_queued_background():
+    sem = PrioritySemaphore(1)
+    assert sem.acquire(PRIORITY_BACKGROUND)
+    order = []
+
+    def worker(name, priority):
+        sem.acquire(priority)
+        order.append(name)
+        sem.release()
+
+    background = threading.Thread(target=worker, args=("background", PRIORITY_BACKGROUND))
+    background.start()
+    _wait_for(lambda: sem.waiting() == 1)
+    interactive = threading.Thread(target=worker, args=("interactive", PRIORITY_INTERACTIVE))
+    interactive.start()
+    _wait_for(lambda: sem.waiting() == 2)
+
+    sem.release()
+    background.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "background"]
+
+
+def test_priority_semaphore_is_fifo_within_a_lane():
+    sem = PrioritySemaphore(1)
+    assert sem.acquire()
+    order = []
+
+    def worker(name):
+        sem.acquire(PRIORITY_BACKGROUND)
+        order.append(name)
+        sem.release()
+
+    threads = []
+    for i in range(3):
+        threads.append(threading.Thread(target=worker, args=(i,)))
+        threads[-1].start()
+        _wait_for(lambda: sem.waiting() == i + 1)
+    sem.release()
+    for t in threads:
+        t.join(5)
+    assert order == [0, 1, 2]
+
+
+def test_gateway_sends_interactive_prompt_ahead_of_queued_summary(fake_ollama):
+    server, url = fake_ollama(latency=0.2)
+    gw = LLMGateway(base_url=url, max_concurrency=1, max_retries=0)
+
+    def call(prompt, priority):
+        gw.complete(prompt, priority=priority)
+
+    busy = threading.Thread(target=call, args=("first summary", PRIORITY_BACKGROUND))
+    busy.start()
+    _wait_for(lambda: len(server.requests) == 1)
+    queued = threading.Thread(target=call, args=("second summary", PRIORITY_BACKGROUND))
+    queued.start()
+    _wait_for(lambda: gw.queue_depth() == 1)
+    question = threading.Thread(target=call, args=("a question", PRIORITY_INTERACTIVE))
+    question.start()
+    _wait_for(lambda: gw.queue_depth() == 2)
+
+    for t in (busy, queued, question):
+        t.join(5)
+    assert [r["prompt"] for r in server.requests] == ["first summary", "a question", "second summary"]
+
+
+def test_gateway_retries_server_errors_with_backoff(fake_ollama):
+    server, url = fake_ollama(fail_first=2)
+    gw = LLMGateway(base_url=url, max_retries=2, retry_backoff=0.05)
+
+    start = time.monotonic()
+    answer = gw.complete("hello there")
+    elapsed = time.monotonic() - start
+
+    assert answer.startswith("Fake answer")
+    assert len(server.requests) == 3
+    assert elapsed >= 0.05 + 0.1  # backoff doubles: 0.05s, then 0.1s
+
+
+def test_gateway_gives_up_after_max_retries(fake_ollama):
+    server, url = fake_ollama(fail_first=5)
+    gw = LLMGateway(base_url=url, max_retries=1, retry_backoff=0.01)
+
+    with pytest.raises(LLMGatewayError):
+        gw.complete("hello there")
+    assert len(server.requests) == 2
+
+
+def test_gateway_does_not_retry_client_errors(fake_ollama):
+    server, url = fake_ollama(fail_first=1, fail_status=400)
+    gw = LLMGateway(base_url=url, max_retries=3, retry_backoff=0.01)
+
+    with pytest.raises(LLMGatewayError) as excinfo:
+        gw.complete("hello there")
+    assert not isinstance(excinfo.value, LLMDeadlineExceeded)
+    assert "400" in str(excinfo.value)
+    assert len(server.requests) == 1
+
+
+def test_deadline_exceeded_while_waiting_for_a_slot(fake_ollama):
+    server, url = fake_ollama(latency=0.5)
+    gw = LLMGateway(base_url=url, max_concurrency=1, max_retries=0)
+    busy = threading.Thread(target=gw.complete, args=("slow summary",))
+    busy.start()
+    _wait_for(lambda: len(server.requests) == 1)
+
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        gw.complete("a question", priority=PRIORITY_INTERACTIVE, deadline=0.1)
+    assert time.monotonic() - start < 0.4
+    assert len(server.requests) == 1  # never reached the server
+    busy.join(5)
+
+
+def test_deadline_exceeded_on_a_slow_server(fake_ollama):
+    server, url = fake_ollama(latency=1.0)
+    gw = LLMGateway(base_url=url, max_retries=3, retry_backoff=0.05)
+
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        gw.complete("a question", deadline=0.3)
+    assert time.monotonic() - start < 0.9
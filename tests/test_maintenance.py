@@ -0,0 +1,159 @@
+# Tests for vector store maintenance (ai_engine/maintenance.py): gc, compaction,
+# snapshot/restore and the read-only window, each on its own store in a temp directory.
+import time
+import uuid
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.vector_stores.chroma import ChromaVectorStore
+
+import admission
+from ai_engine import maintenance
+from ai_engine.dedup import DedupIndex
+from ai_engine.ingest import UploadLog
+from shared_state import COLLECTION_NAME, VECTOR_STORE, chroma_client, get_version
+
+DIM = 32
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Points maintenance at a fresh store; returns a helper to write and read it."""
+    path = str(tmp_path / "vector_db")
+    monkeypatch.setattr(maintenance, "CHROMA_PATH", path)
+    monkeypatch.setattr(maintenance, "DEDUP_DB_PATH", str(tmp_path / "vector_db" / "dedup.sqlite3"))
+    monkeypatch.setattr(maintenance, "UPLOAD_LOG_PATH", str(tmp_path / "vector_db" / "uploads.sqlite3"))
+    monkeypatch.setattr(maintenance, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(maintenance, "VECTOR_STORE_MODE", "chroma")
+    return Store(path)
+
+
+class Store:
+    def __init__(self, path):
+        self.path = path
+        self.rng = np.random.default_rng(0)
+
+    @property
+    def collection(self):
+        # Reopened per store generation, like the cores do after compaction/restore
+        return chroma_client(self.path, get_version(VECTOR_STORE)).get_or_create_collection(COLLECTION_NAME)
+
+    def capture(self, source, n, stamp, doc=None, key="source_url", text="chunk"):
+        """Writes one capture (n chunks of one LlamaIndex document) the way the cores do."""
+        doc = doc or str(uuid.uuid4())
+        nodes = []
+        for i in range(n):
+            node = TextNode(
+                text=f"{source} {text} {i}",
+                metadata={key: source, "indexed_at": stamp},
+                embedding=self.rng.standard_normal(DIM).tolist(),
+            )
+            node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=doc)
+            nodes.append(node)
+        return ChromaVectorStore(chroma_collection=self.collection).add(nodes)
+
+    def summary(self, source, stamp, key="source_url"):
+        self.collection.upsert(
+            ids=[f"summary_{source}"], embeddings=[self.rng.standard_normal(DIM).tolist()],
+            documents=["a summary"], metadatas=[{"type": "summary", key: source, "indexed_at": stamp}],
+        )
+
+    def ids(self):
+        return set(self.collection.get(include=[])["ids"])
+
+    def gc(self, dry_run=False, now=None):
+        dedup, uploads = DedupIndex(maintenance.DEDUP_DB_PATH), UploadLog(maintenance.UPLOAD_LOG_PATH)
+        if now is None:
+            return maintenance.collect_garbage(self.collection, None, dedup, uploads, dry_run=dry_run)
+        return maintenance.find_garbage(self.collection, None, dedup, uploads, now=now)
+
+
+def test_reindexed_document_supersedes_only_the_older_capture(store):
+    now = int(time.time())
+    old = store.capture("video_abc", 20, stamp=now - 100, text="first transcript")
+    new = store.capture("video_abc", 15, stamp=now - 10, text="edited transcript")
+    other = store.capture("https://example.com/other", 10, stamp=now - 200)
+    store.summary("video_abc", stamp=now, key="source_doc")
+
+    dry = store.gc(dry_run=True)
+    assert dry["would_delete"] == {"superseded": 20, "orphaned": 0, "orphaned_summaries": 0}
+    assert dry["scanned"]["chunks"] == 45
+    assert store.ids() >= set(old) | set(new) | set(other)  # nothing deleted
+
+    done = store.gc()
+    assert done["deleted"] == dry["would_delete"]
+    assert store.ids() == set(new) | set(other) | {"summary_video_abc"}
+    assert store.gc(dry_run=True)["would_delete"]["superseded"] == 0
+
+
+def test_unfinished_upload_is_orphaned_after_the_grace_period(store):
+    uploads = UploadLog(maintenance.UPLOAD_LOG_PATH)
+    stamp = int(uploads.created_at()) + 1
+    dead = store.capture("upload_dead", 5, stamp=stamp, doc="upload_dead#0", key="source_doc")
+    store.capture("upload_done", 5, stamp=stamp, doc="upload_done#0", key="source_doc")
+    uploads.complete("upload_done", 1)
+
+    during_grace = store.gc(now=stamp + maintenance.GC_GRACE_SECONDS - 1)
+    assert during_grace["garbage"]["orphaned"] == []
+
+    after_grace = store.gc(now=stamp + maintenance.GC_GRACE_SECONDS + 1)
+    assert sorted(row_id for _, row_id in after_grace["garbage"]["orphaned"]) == sorted(dead)
+
+
+def test_upload_from_before_the_log_existed_is_kept(store):
+    uploads = UploadLog(maintenance.UPLOAD_LOG_PATH)
+    stamp = int(uploads.created_at()) - 10 * maintenance.GC_GRACE_SECONDS
+    store.capture("upload_legacy", 5, stamp=stamp, doc="upload_legacy#0", key="source_doc")
+    assert store.gc(now=time.time())["garbage"]["orphaned"] == []
+
+
+def test_compact_keeps_rows_and_query_results(store):
+    now = int(time.time())
+    for i in range(4):
+        store.capture(f"https://example.com/{i}", 25, stamp=now)
+    probes = store.collection.get(limit=5, include=["embeddings"])["embeddings"]
+    before = store.collection.query(query_embeddings=list(probes), n_results=5)["ids"]
+    rows = store.collection.count()
+
+    report = maintenance.run("compact")
+    assert report["compact"]["rows"] == rows
+    assert report["after"]["collection_rows"] == rows
+    assert store.collection.count() == rows
+    assert store.collection.query(query_embeddings=list(probes), n_results=5)["ids"] == before
+
+
+def test_restore_returns_exactly_the_snapshot_rows(store):
+    now = int(time.time())
+    kept = store.capture("https://example.com/kept", 10, stamp=now)
+    maintenance.run("snapshot", snapshot="before")
+    assert [s["name"] for s in maintenance.list_snapshots()] == ["before"]
+
+    added = store.capture("https://example.com/added", 10, stamp=now)
+    assert store.ids() == set(kept) | set(added)
+
+    report = maintenance.run("restore", snapshot="before")
+    assert report["after"]["collection_rows"] == len(kept)
+    assert store.ids() == set(kept)
+
+    with pytest.raises(maintenance.MaintenanceError):
+        maintenance.run("restore", snapshot="missing")
+
+
+def test_writes_get_503_inside_maintenance_window(store, monkeypatch):
+    monkeypatch.setattr(admission, "rate_limiter", admission.RateLimiter({}))
+
+    async def try_write(endpoint):
+        async with admission.admit("alice@example.com", endpoint):
+            return "admitted"
+
+    with maintenance.maintenance_window("compaction"):
+        for endpoint in ("capture", "upload"):
+            with pytest.raises(HTTPException) as excinfo:
+                asyncio.run(try_write(endpoint))
+            assert excinfo.value.status_code == 503
+            assert "compaction" in excinfo.value.detail
+        assert asyncio.run(try_write("query")) == "admitted"
+    assert asyncio.run(try_write("capture")) == "admitted"
@@ -0,0 +1,42 @@
+# Tests for the tracing/metrics layer (metrics.py).
+import io
+import logging
+
+import metrics
+
+
+def test_span_records_histogram_and_errors():
+    with metrics.span("test_stage"):
+        pass
+    try:
+        with metrics.span("test_stage_error"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    rendered = metrics.render_metrics()
+    assert 'stage_duration_seconds_count{stage="test_stage"} 1' in rendered
+    assert metrics.STAGE_ERRORS.value(stage="test_stage_error") == 1
+
+
+def test_log_lines_carry_the_request_id():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(metrics.RequestIdFilter())
+    handler.setFormatter(logging.Formatter(metrics.LOG_FORMAT))
+    metrics.log.addHandler(handler)
+    metrics.log.setLevel(logging.DEBUG)
+    try:
+        token = metrics.request_id_var.set("abc123")
+        try:
+            with metrics.span("fetch_text_from_url"):
+                pass
+        finally:
+            metrics.request_id_var.reset(token)
+        logging.getLogger("metrics").info("outside any request")
+    finally:
+        metrics.log.removeHandler(handler)
+        metrics.log.setLevel(logging.NOTSET)
+
+    first, second = stream.getvalue().splitlines()
+    assert "[request abc123]" in first and "fetch_text_from_url took" in first
+    assert "[request -]" in second
@@ -0,0 +1,157 @@
+# Tests for the quantized vector tier (ai_engine/quantized_store.py) against brute-force search.
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from ai_engine.quantized_store import QuantizedVectorStore
+
+DIM = 64
+ROWS = 200
+TOP_K = 5
+
+
+def _node(i: int, vec: np.ndarray, text: str = None) -> TextNode:
+    return TextNode(
+        id_=f"node-{i}",
+        text=text or f"chunk {i}",
+        embedding=vec.tolist(),
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc-{i % 10}")},
+    )
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(7)
+    return rng.standard_normal((ROWS, DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def queries():
+    rng = np.random.default_rng(11)
+    return rng.standard_normal((20, DIM)).astype(np.float32)
+
+
+def _store(tmp_path, vectors, quantization, **kwargs):
+    store = QuantizedVectorStore(str(tmp_path / quantization), quantization=quantization, **kwargs)
+    store.add([_node(i, v) for i, v in enumerate(vectors)])
+    return store
+
+
+def _brute_force(vectors, q, k=TOP_K, exclude=()):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (q / np.linalg.norm(q))
+    for i in exclude:
+        scores[i] = -np.inf
+    order = np.argsort(-scores)[:k]
+    return [f"node-{i}" for i in order], scores[order]
+
+
+def _query(store, q, **kwargs):
+    return store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=TOP_K, **kwargs))
+
+
+def test_int8_matches_brute_force(tmp_path, vectors, queries):
+    store = _store(tmp_path, vectors, "int8")
+    for q in queries:
+        expected_ids, expected_scores = _brute_force(vectors, q)
+        result = _query(store, q)
+        assert result.ids == expected_ids
+        assert result.similarities == pytest.approx(expected_scores.tolist(), abs=1e-5)
+
+
+def test_binary_recall_against_brute_force(tmp_path, vectors, queries):
+    store = _store(tmp_path, vectors, "binary", rescore_factor=20)
+    hits = 0
+    for q in queries:
+        expected_ids, _ = _brute_force(vectors, q)
+        result = _query(store, q)
+        # Whatever is returned is re-scored exactly, so it comes back in exact order
+        assert result.similarities == sorted(result.similarities, reverse=True)
+        hits += len(set(result.ids) & set(expected_ids))
+    assert hits / (len(queries) * TOP_K) >= 0.9
+
+
+def test_reopened_store_sees_the_same_rows(tmp_path, vectors, queries):
+    _store(tmp_path, vectors, "int8")
+    reopened = QuantizedVectorStore(str(tmp_path / "int8"), quantization="int8")
+    assert _query(reopened, queries[0]).ids == _brute_force(vectors, queries[0])[0]
+    with pytest.raises(ValueError):
+        QuantizedVectorStore(str(tmp_path / "int8"), quantization="binary")
+
+
+def test_delete_and_delete_nodes_hide_rows(tmp_path, vectors, queries):
+    store = _store(tmp_path, vectors, "int8")
+    q = queries[0]
+    top_ids, _ = _brute_force(vectors, q)
+
+    store.delete_nodes([top_ids[0]])
+    assert top_ids[0] not in _query(store, q).ids
+
+    doc = store._conn.execute("SELECT ref_doc_id FROM nodes WHERE node_id = ?", (top_ids[1],)).fetchone()[0]
+    store.delete(doc)
+    deleted = {i for i in range(ROWS) if f"doc-{i % 10}" == doc} | {int(top_ids[0].split("-")[1])}
+    result = _query(store, q)
+    assert result.ids == _brute_force(vectors, q, exclude=deleted)[0]
+    assert all(node.ref_doc_id != doc for node in result.nodes)
+
+
+def test_compact_renumbers_rows_and_keeps_results(tmp_path, vectors, queries):
+    store = _store(tmp_path, vectors, "int8")
+    deleted = set(range(0, ROWS, 3))
+    store.delete_nodes([f"node-{i}" for i in deleted])
+    before = [_query(store, q).ids for q in queries]
+
+    stats = store.compact()
+    assert stats == {"rows_before": ROWS, "rows_after": ROWS - len(deleted)}
+    rows = [r[0] for r in store._conn.execute("SELECT row FROM nodes ORDER BY row")]
+    assert rows == list(range(ROWS - len(deleted)))
+    assert store._file_rows() == ROWS - len(deleted)
+    assert [_query(store, q).ids for q in queries] == before
+
+    # A second compaction has nothing to do
+    assert store.compact() == {"rows_before": ROWS - len(deleted), "rows_after": ROWS - len(deleted)}
+
+
+def test_readding_a_node_replaces_the_old_version(tmp_path, vectors):
+    store = _store(tmp_path, vectors, "int8")
+    target = vectors[42] + 0.01  # closest to node-42 ...
+    store.add([_node(3, vectors[42], text="new text for chunk 3")])  # ... until node-3 takes its vector
+
+    result = _query(store, target)
+    assert set(result.ids[:2]) == {"node-3", "node-42"}
+    assert result.ids.count("node-3") == 1
+    node = next(n for n in result.nodes if n.node_id == "node-3")
+    assert node.get_content() == "new text for chunk 3"
+
+    # The old node-3 vector no longer answers for it, and only one live row is left
+    assert "node-3" not in _query(store, vectors[3]).ids
+    live = store._conn.execute("SELECT COUNT(*) FROM nodes WHERE deleted = 0 AND node_id = 'node-3'").fetchone()[0]
+    assert live == 1
+
+
+def test_reader_racing_a_compaction_in_another_process(tmp_path, vectors, queries, monkeypatch):
+    writer = _store(tmp_path, vectors, "int8")
+    reader = QuantizedVectorStore(str(tmp_path / "int8"), quantization="int8")
+    deleted = set(range(0, ROWS, 2))
+    q = queries[0]
+    expected = _brute_force(vectors, q, exclude=deleted)[0]
+    assert _query(reader, q).ids  # the reader has mapped the generation-0 files
+
+    # The other instance compacts after the reader mapped the files but before it looks up rows
+    first_pass = QuantizedVectorStore._first_pass
+    compacted = []
+
+    def compact_meanwhile(self, *args):
+        if self is reader and not compacted:
+            writer.delete_nodes([f"node-{i}" for i in deleted])
+            compacted.append(writer.compact())
+        return first_pass(self, *args)
+
+    monkeypatch.setattr(QuantizedVectorStore, "_first_pass", compact_meanwhile)
+    result = _query(reader, q)
+    assert compacted == [{"rows_before": ROWS, "rows_after": ROWS - len(deleted)}]
+    assert result.ids == expected
+    assert [n.node_id for n in result.nodes] == expected
+    # Only the new generation's files are left
+    assert sorted(p.name for p in (tmp_path / "int8").glob("*.*f32")) == ["full.1.f32", "scales.1.f32"]
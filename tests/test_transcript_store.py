@@ -0,0 +1,133 @@
+# Tests for paginated transcript reads (video_extracter/transcript_store.py).
+import os
+import json
+
+import pytest
+
+from video_extracter import transcript_store
+from video_extracter.transcript_store import TranscriptNotFound, read_lines, save_transcript
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcript_store, "TRANSCRIPT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _segments(n, length=2.0):
+    # Each line stays on screen until the next one starts, except every 5th which overlaps it
+    return [
+        {"start": i * length, "end": (i + 1) * length + (1.0 if i % 5 == 0 else 0.0), "text": f"line {i} ünïcode"}
+        for i in range(n)
+    ]
+
+
+def test_offset_limit_and_next_offset(store_dir):
+    assert save_transcript("talk.txt", _segments(25), source="captions", url="https://example.com/v") == 25
+
+    page = read_lines("talk", offset=0, limit=10)
+    assert [line["line"] for line in page["lines"]] == list(range(10))
+    assert page["lines"][3]["text"] == "line 3 ünïcode"
+    assert page["total_lines"] == 25 and page["has_timings"]
+    assert page["source"] == "captions" and page["url"] == "https://example.com/v"
+    assert page["next_offset"] == 10
+
+    page = read_lines("talk", offset=page["next_offset"], limit=10)
+    assert page["lines"][0]["line"] == 10 and page["next_offset"] == 20
+    page = read_lines("talk", offset=20, limit=10)
+    assert [line["line"] for line in page["lines"]] == list(range(20, 25))
+    assert page["next_offset"] is None
+    assert read_lines("talk", offset=100)["lines"] == []
+
+
+def test_time_range(store_dir):
+    save_transcript("talk.txt", _segments(25), source="captions")
+
+    page = read_lines("talk", start=10.5, end=20.0)
+    # line 5 (10-13s, still on screen at 10.5) through line 9 (18-20s); line 10 starts at 20s
+    assert [line["line"] for line in page["lines"]] == [5, 6, 7, 8, 9]
+    assert page["lines"][0]["start"] == 10.0
+    assert page["next_offset"] is None
+
+    # Paging inside a time range counts from its first line
+    page = read_lines("talk", start=10.5, end=30.0, limit=4)
+    assert [line["line"] for line in page["lines"]] == [5, 6, 7, 8]
+    assert page["next_offset"] == 4
+    page = read_lines("talk", start=10.5, end=30.0, offset=page["next_offset"], limit=4)
+    assert [line["line"] for line in page["lines"]] == [9, 10, 11, 12]
+    assert page["next_offset"] == 8
+    page = read_lines("talk", start=10.5, end=30.0, offset=8, limit=4)
+    assert [line["line"] for line in page["lines"]] == [13, 14]
+    assert page["next_offset"] is None
+
+    assert [line["line"] for line in read_lines("talk", end=4.0)["lines"]] == [0, 1]
+    assert [line["line"] for line in read_lines("talk", start=47.0)["lines"]] == [23, 24]
+
+
+def test_transcript_without_sidecar_gets_one(store_dir):
+    with open(store_dir / "old.txt", "w", encoding="utf-8") as f:
+        f.write(f"Source: whisper\nOriginal URL: https://example.com/old\n{transcript_store.HEADER_RULE}\n\nfirst\n\nsecond\n")
+
+    page = read_lines("old")
+    assert [line["text"] for line in page["lines"]] == ["first", "second"]
+    assert page["source"] == "whisper" and not page["has_timings"]
+    assert read_lines("old", start=0.0, end=10.0)["lines"] == []  # nothing addressable by time
+    assert os.path.exists(store_dir / "old.txt.idx")
+    assert not [name for name in os.listdir(store_dir) if name.endswith(".tmp")]
+
+
+def test_unknown_or_unsafe_ids_are_not_found(store_dir):
+    with pytest.raises(TranscriptNotFound):
+        read_lines("missing")
+    with pytest.raises(TranscriptNotFound):
+        read_lines("../etc/passwd")
+
+
+def test_etag_changes_when_transcript_is_rewritten(store_dir):
+    save_transcript("talk.txt", _segments(3), source="captions")
+    etag = read_lines("talk")["etag"]
+    assert read_lines("talk", offset=1)["etag"] == etag
+    save_transcript("talk.txt", _segments(4), source="captions")
+    assert read_lines("talk")["etag"] != etag
+
+
+def test_new_index_with_old_text_is_not_used(store_dir):
+    # A reader that opened the old .txt while save_transcript swaps in a new index
+    save_transcript("talk.txt", [{"start": 0.0, "end": 1.0, "text": "old words"}], source="captions")
+    with open(store_dir / "talk.txt", "rb") as old_file:
+        save_transcript("talk.txt", _segments(5), source="whisper")
+        os.utime(store_dir / "talk.txt.idx")  # the new index is newer than the old text
+        index = transcript_store.load_index("talk", old_file)
+        assert len(index["lines"]) == 1
+        old_file.seek(index["lines"][0][0])
+        assert old_file.read(index["lines"][0][1]) == b"old words"
+
+    # The sidecar on disk still belongs to the new transcript
+    with open(store_dir / "talk.txt.idx", encoding="utf-8") as f:
+        assert len(json.load(f)["lines"]) == 5
+    page = read_lines("talk")
+    assert page["source"] == "whisper" and page["has_timings"]
+    assert [line["text"] for line in page["lines"]][:2] == ["line 0 ünïcode", "line 1 ünïcode"]
+
+
+def test_read_transcript_etag_and_304(store_dir):
+    pytest.importorskip("yt_dlp")
+    from fastapi import Response
+    from starlette.requests import Request
+    from video_extracter.pipeline import read_transcript
+
+    def request(headers=()):
+        return Request({"type": "http", "method": "GET", "path": "/", "headers": list(headers)})
+
+    save_transcript("talk.txt", _segments(3), source="captions")
+    response = Response()
+    page = read_transcript("talk", request(), response, offset=0, limit=2, start=None, end=None, current_user=None)
+    etag = response.headers["etag"]
+    assert "etag" not in page and page["next_offset"] == 2
+
+    not_modified = read_transcript(
+        "talk", request([(b"if-none-match", etag.encode())]), Response(),
+        offset=0, limit=2, start=None, end=None, current_user=None,
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
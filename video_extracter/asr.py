@@ -0,0 +1,167 @@
+# asr.py
+# Speech-to-text backends for the ASR fallback in pipeline.py.
+#   faster_whisper  CTranslate2 Whisper with int8 weights (much faster on CPU), used when installed
+#   whisper         openai-whisper in PyTorch float32 (the original path, always the fallback)
+# The model size is picked per job from the audio duration and how many other jobs are in ASR:
+# long backlogs get "tiny", short clips can afford "small".
+# Both backends return the same structure as openai-whisper's transcribe():
+#   {"text": str, "segments": [{"start": float, "end": float, "text": str}, ...], "language": str}
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Optional
+
+# Make the project root importable when this file is run directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import registry, span
+
+log = logging.getLogger(__name__)
+
+ASR_BACKEND = os.getenv("ASR_BACKEND", "auto")  # "auto", "faster_whisper", or "whisper"
+ASR_MODEL_SIZE = os.getenv("ASR_MODEL_SIZE", "")  # set to force one size, e.g. "base"
+ASR_THREADS = int(os.getenv("ASR_THREADS", 0))  # 0 lets the backend decide
+ASR_COMPUTE_TYPE = os.getenv("ASR_COMPUTE_TYPE", "int8")  # faster-whisper weights ("int8", "float32", ...)
+ASR_BACKLOG_THRESHOLD = int(os.getenv("ASR_BACKLOG_THRESHOLD", 2))  # queued jobs that force "tiny"
+
+ASR_RTF = registry.histogram(
+    "asr_real_time_factor", "Transcription time divided by audio duration.",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 4),
+)
+ASR_JOBS = registry.counter("asr_jobs_total", "ASR jobs by backend and model size.")
+
+_models = {}  # (backend, size, compute type) -> loaded model
+_load_locks = {}  # one lock per model key, so loading one model doesn't block using another
+_models_lock = threading.Lock()  # guards _load_locks
+_active_jobs = 0  # jobs inside transcribe() (loading a model or transcribing), in this process
+_active_lock = threading.Lock()
+
+
+def faster_whisper_available() -> bool:
+    try:
+        import faster_whisper  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_backend(backend: str = ASR_BACKEND) -> str:
+    if backend == "auto":
+        return "faster_whisper" if faster_whisper_available() else "whisper"
+    if backend not in ("faster_whisper", "whisper"):
+        raise ValueError(f"Unknown ASR_BACKEND: {backend}")
+    return backend
+
+
+def queue_depth() -> int:
+    """
+    ASR jobs running alongside a new one in this process. Only jobs that reached transcribe()
+    count: a /video/transcribe request served from captions never gets here.
+    """
+    return _active_jobs
+
+
+def choose_model_size(duration: Optional[float], queued: int) -> str:
+    """
+    Smaller models for long audio or a busy queue, larger ones for short clips.
+    `duration` is in seconds (None when unknown).
+    """
+    if ASR_MODEL_SIZE:
+        return ASR_MODEL_SIZE
+    if queued >= ASR_BACKLOG_THRESHOLD:
+        return "tiny"
+    if duration is None:
+        return "base"
+    if duration > 45 * 60:
+        return "tiny"
+    if duration <= 5 * 60:
+        return "small"
+    return "base"
+
+
+def model_key(backend: str, size: str) -> tuple:
+    """Cache key of a loaded model (openai-whisper on CPU always runs float32)."""
+    return (backend, size, ASR_COMPUTE_TYPE if backend == "faster_whisper" else "float32")
+
+
+def _load_model(backend: str, size: str):
+    # Models are cached: loading Whisper takes seconds and used to happen on every request.
+    # The lock is per model, so jobs on an already loaded size don't wait for another size to load.
+    key = model_key(backend, size)
+    with _models_lock:
+        lock = _load_locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _models:
+            with span("whisper_load_model"):
+                if backend == "faster_whisper":
+                    from faster_whisper import WhisperModel
+                    _models[key] = WhisperModel(size, device="cpu", compute_type=key[2], cpu_threads=ASR_THREADS)
+                else:
+                    import whisper
+                    _models[key] = whisper.load_model(size)
+            log.info(f"Loaded ASR model {backend}/{size} ({key[2]}).")
+        return _models[key]
+
+
+def _transcribe_faster_whisper(model, audio_path: str) -> dict:
+    segments, info = model.transcribe(audio_path, beam_size=1)
+    segments = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+    return {
+        "text": "".join(s["text"] for s in segments),
+        "segments": segments,
+        "language": info.language,
+        "duration": info.duration,
+    }
+
+
+def _transcribe_whisper(model, audio_path: str) -> dict:
+    import torch
+    if ASR_THREADS > 0:
+        torch.set_num_threads(ASR_THREADS)
+    result = model.transcribe(audio_path, fp16=False)
+    segments = [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in result.get("segments", [])]
+    return {
+        "text": result["text"],
+        "segments": segments,
+        "language": result.get("language"),
+        "duration": segments[-1]["end"] if segments else None,
+    }
+
+
+def transcribe(audio_path: str, duration: Optional[float] = None, backend: str = ASR_BACKEND) -> dict:
+    """
+    Transcribes an audio file with the selected backend and an adaptively chosen model size.
+    Adds "backend", "model_size", and "real_time_factor" to the result.
+    """
+    global _active_jobs
+    with _active_lock:
+        queued = queue_depth()
+        _active_jobs += 1
+    try:
+        backend = resolve_backend(backend)
+        size = choose_model_size(duration, queued)
+        log.info(f"ASR with {backend}/{size} (audio {duration}s, {queued} other jobs).")
+        model = _load_model(backend, size)
+
+        start = time.perf_counter()
+        with span("whisper_transcribe"):
+            if backend == "faster_whisper":
+                result = _transcribe_faster_whisper(model, audio_path)
+            else:
+                result = _transcribe_whisper(model, audio_path)
+        elapsed = time.perf_counter() - start
+
+        audio_seconds = duration or result.get("duration")
+        rtf = elapsed / audio_seconds if audio_seconds else None
+        if rtf is not None:
+            ASR_RTF.observe(rtf, backend=backend, model=size)
+        ASR_JOBS.inc(backend=backend, model=size)
+        log.info(f"ASR finished in {elapsed:.1f}s (real-time factor {rtf}).")
+
+        result.update({"backend": backend, "model_size": size, "real_time_factor": rtf})
+        return result
+    finally:
+        with _active_lock:
+            _active_jobs -= 1
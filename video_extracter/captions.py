@@ -0,0 +1,121 @@
+# captions.py
+# Picks the best existing caption track for a video, so Whisper only runs when there is none.
+# yt-dlp's info dict lists every track it knows about:
+#   info["subtitles"]           manual (uploaded) subtitles, by language code ("en", "en-GB", ...)
+#   info["automatic_captions"]  YouTube's ASR track ("en-orig" or plain "en" for the spoken
+#                               language) plus machine translations of it into other languages
+# Preference order, for each language in CAPTION_LANGS:
+#   1. manual subtitles, exact language, then regional variants (en-US, en-GB, ...)
+#   2. the automatic track in the spoken language ("en-orig" / "en" when the video is in English)
+#   3. a translated track: a manual subtitle in another language fetched with `tlang=`
+#      (translated server-side), or YouTube's auto-translation of the ASR track
+# Any of these is far cheaper than downloading the audio and running Whisper.
+import os
+import logging
+from typing import Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+
+from metrics import registry
+
+log = logging.getLogger(__name__)
+
+# Preferred caption languages, best first
+CAPTION_LANGS = [l.strip() for l in os.getenv("CAPTION_LANGS", "en").split(",") if l.strip()]
+CAPTION_ALLOW_TRANSLATED = os.getenv("CAPTION_ALLOW_TRANSLATED", "1") == "1"
+CAPTION_TIMEOUT = float(os.getenv("CAPTION_TIMEOUT", 15))
+
+CAPTION_TRACKS = registry.counter(
+    "caption_tracks_total", "Caption lookups by the kind of track used (manual/automatic/translated/none)."
+)
+TRANSCRIPT_SOURCES = registry.counter(
+    "transcript_sources_total", "Transcripts by source; existing_transcript / total is the ASR-avoidance rate."
+)
+
+_IGNORED_TRACKS = {"live_chat", "rechat"}
+
+
+def _variants(tracks: dict, lang: str):
+    """Track keys for `lang`: the exact code first, then regional variants (en-US, en-GB, ...)."""
+    if lang in tracks:
+        yield lang
+    for key in sorted(tracks):
+        if key != lang and key.split("-")[0] == lang and not key.endswith("-orig"):
+            yield key
+
+
+def _vtt_url(formats: list) -> Optional[str]:
+    """URL of the WebVTT version of a track (YouTube serves any format via the fmt= parameter)."""
+    for fmt in formats or []:
+        if fmt.get("ext") == "vtt" and fmt.get("url"):
+            return fmt["url"]
+    for fmt in formats or []:
+        if fmt.get("url"):
+            return _with_params(fmt["url"], fmt="vtt")
+    return None
+
+
+def _with_params(url: str, **params) -> str:
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update(params)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _spoken_language(automatic: dict) -> Optional[str]:
+    """The language of YouTube's own ASR track ("de" for a "de-orig" key)."""
+    for key in automatic:
+        if key.endswith("-orig"):
+            return key[:-len("-orig")]
+    return None
+
+
+def select_caption_track(info: dict, langs=None, allow_translated: bool = CAPTION_ALLOW_TRANSLATED
+                         ) -> Optional[Tuple[str, str, str]]:
+    """Returns (kind, language, vtt_url) of the best track, or None when ASR is needed."""
+    langs = langs or CAPTION_LANGS
+    manual = {k: v for k, v in (info.get("subtitles") or {}).items() if k not in _IGNORED_TRACKS}
+    automatic = info.get("automatic_captions") or {}
+    spoken = _spoken_language(automatic)
+
+    for lang in langs:
+        # 1. Manual subtitles in this language (or a regional variant)
+        for key in _variants(manual, lang):
+            url = _vtt_url(manual[key])
+            if url:
+                return "manual", key, url
+
+        # 2. YouTube's ASR track, when the video is spoken in this language
+        if spoken is None or spoken.split("-")[0] == lang:
+            for key in [f"{lang}-orig", *_variants(automatic, lang)]:
+                url = _vtt_url(automatic.get(key))
+                if url:
+                    return "automatic", key, url
+
+    if not allow_translated:
+        return None
+    for lang in langs:
+        # 3a. A manual subtitle in another language, translated server-side
+        #     (translating human-written text beats translating ASR output)
+        for key, formats in manual.items():
+            url = _vtt_url(formats)
+            if url and "youtube.com/api/timedtext" in url:
+                return "translated", f"{key}->{lang}", _with_params(url, tlang=lang)
+        # 3b. YouTube's machine translation of the ASR track
+        url = _vtt_url(automatic.get(lang))
+        if url:
+            return "translated", lang, url
+    return None
+
+
+def download_captions(url: str) -> Optional[str]:
+    """The track's WebVTT text, or None if it could not be fetched."""
+    try:
+        r = requests.get(url, timeout=CAPTION_TIMEOUT)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        log.warning(f"Caption download failed: {e}")
+        return None
+    r.encoding = "utf-8"  # WebVTT is always UTF-8
+    return r.text if "-->" in r.text else None
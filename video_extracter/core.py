@@ -2,31 +2,46 @@
 # here we are using chromaDB{which is a "vector database"} and ChromaDB (the cabinet) can hold many different "collections" (drawers).
 # We could have one for web pages, one for user notes, one for PDF documents, etc. and we retrive it using specific ID.
 import os
-import chromadb
+import sys
+import time
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.ollama import Ollama
+
+# This block adds the project's root directory to the Python path
+# so we can import the shared 'ai_engine' helpers from the parent folder.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_engine.chunking import StructureAwareChunker
+from ai_engine.dedup import DedupIndex, minhash_signature, DEDUP_ENABLED
+from ai_engine.embeddings import get_embed_model
+from ai_engine.llm_gateway import gateway, GatewayLLM, PRIORITY_BACKGROUND, LLM_SUMMARY_DEADLINE
+from ai_engine.query_engine import get_query_engine, run_query
+from ai_engine import vector_index
+from ai_engine.vector_index import current_index, open_vector_store, publish_index
+from metrics import span, traced, registry
+from shared_state import VECTOR_INDEX, writer_lock
 
 # --- Import our new cleaning function ---
 from preprocess import preprocess_transcript
 
 # --- Setup LlamaIndex Settings ---
-Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
-Settings.llm = Ollama(model="gemma:2b", request_timeout=300.0)
+# bge-small by default; EMBED_BACKEND=hash gives an offline, deterministic embedder
+Settings.embed_model = get_embed_model()
+# All LLM calls go through the shared gateway; the default LLM is the interactive (Q&A) lane
+Settings.llm = GatewayLLM()
 
 # --- Define Paths ---
 # Use relative paths that work on any OS
-DB_PATH = "./vector_db"
-DATA_PATH = "./data"
+DB_PATH = os.getenv("CHROMA_PATH", "./vector_db")
+DATA_PATH = os.getenv("DATA_PATH", "./data")
 
-# --- Initialize ChromaDB ---
-db = chromadb.PersistentClient(path=DB_PATH)
-collection = db.get_or_create_collection("user_collection_local")
-vector_store = ChromaVectorStore(chroma_collection=collection)
-index = None
+# --- Vector store ---
+# The collection, store and index are shared with ai_engine/core.py (see ai_engine/vector_index.py)
+# MinHash signatures of everything indexed so far, for near-duplicate detection
+dedup_index = DedupIndex(os.getenv("DEDUP_DB_PATH", os.path.join(DB_PATH, "dedup.sqlite3")))
+DEDUP_HITS = registry.counter("dedup_hits_total", "Captures skipped because the text was a near-duplicate.")
 
 
+@traced("generate_and_store_summary")
 def generate_and_store_summary(text_content: str, doc_id: str) -> str:
     """
     Generates a summary of the provided text using the LLM
@@ -37,24 +52,27 @@ def generate_and_store_summary(text_content: str, doc_id: str) -> str:
     prompt = f"Please provide a concise summary of the following text:\n\n{text_content}"
     
     try:
-        response = Settings.llm.complete(prompt)
-        summary_text = str(response)
+        # Summaries are background work: they wait behind interactive questions
+        summary_text = gateway.complete(prompt, priority=PRIORITY_BACKGROUND, deadline=LLM_SUMMARY_DEADLINE)
         
         # 1. Manually embed the summary text using the LlamaIndex Setting
         print("Embedding summary using Settings.embed_model...")
-        summary_embedding = Settings.embed_model.get_text_embedding(summary_text)
+        with span("embedding"):
+            summary_embedding = Settings.embed_model.get_text_embedding(summary_text)
        
         # Use the doc_id to create a unique summary ID
         summary_id = f"summary_{doc_id}"
         
         # 2. Store the summary text AND its pre-computed embedding
         print("Upserting summary and pre-computed embedding into Chroma...")
-        collection.upsert(
-            documents=[summary_text],
-            embeddings=[summary_embedding], 
-            metadatas=[{"type": "summary", "source_doc": doc_id}],
-            ids=[summary_id]
-        )
+        with writer_lock(VECTOR_INDEX), span("chroma_upsert"):
+            open_vector_store(fresh=True)
+            vector_index.collection.upsert(
+                documents=[summary_text],
+                embeddings=[summary_embedding], 
+                metadatas=[{"type": "summary", "source_doc": doc_id, "indexed_at": int(time.time())}],
+                ids=[summary_id]
+            )
         
         print(f"Summary generated and stored with ID: {summary_id}")
         return summary_text
@@ -72,11 +90,24 @@ def process_text(raw_text: str, doc_id: str):
     
     # 1. --- CLEAN THE TEXT ---
     print(f"Preprocessing text for document: {doc_id}...")
-    text = preprocess_transcript(raw_text)
+    with span("preprocess_transcript"):
+        text = preprocess_transcript(raw_text)
     
     if not text:
         print("No text content found after preprocessing.")
         return False     
+
+    # 1b. --- SKIP NEAR-DUPLICATES (e.g. the same video re-uploaded) ---
+    if DEDUP_ENABLED:
+        with span("dedup_check"):
+            signature = minhash_signature(text)
+            duplicate = dedup_index.find_duplicate(signature)
+        if duplicate:
+            existing_doc, similarity = duplicate
+            print(f"Near-duplicate of {existing_doc} (similarity {similarity:.2f}); linking instead of re-indexing.")
+            dedup_index.link(doc_id, existing_doc)
+            DEDUP_HITS.inc()
+            return True
     
     # 2. --- GENERATE AND STORE SUMMARY FROM CLEANED TEXT ---
     print("Generating and storing summary...")
@@ -94,10 +125,25 @@ def process_text(raw_text: str, doc_id: str):
         
     # Load the single cleaned text file
     docs = SimpleDirectoryReader(input_files=[file_path]).load_data()
+    for doc in docs:
+        # Caption lines are rebuilt into sentences before chunking
+        # indexed_at tells maintenance which version of a document is the latest
+        doc.metadata.update({"source_doc": doc_id, "content_type": "captions", "indexed_at": int(time.time())})
+        doc.excluded_embed_metadata_keys += ["source_doc", "content_type", "chunk_index", "indexed_at"]
+        doc.excluded_llm_metadata_keys += ["content_type", "chunk_index", "indexed_at"]
     
-    global index
-    # This indexes the *chunks* of the cleaned document
-    index = VectorStoreIndex.from_documents(docs, vector_store=vector_store)
+    # One writer at a time across all workers; then tell the others to reload
+    with writer_lock(VECTOR_INDEX):
+        open_vector_store(fresh=True)
+        # This indexes the *chunks* of the cleaned document
+        with span("index_from_documents"):
+            new_index = VectorStoreIndex.from_documents(
+                docs, storage_context=vector_index.storage_context, transformations=[StructureAwareChunker()]
+            )
+        publish_index(new_index)
+    if DEDUP_ENABLED:
+        dedup_index.add(doc_id, signature)
+        dedup_index.link(doc_id, doc_id)
     print("Full document indexing complete.")
     
     # Clean up the temporary file
@@ -108,29 +154,35 @@ def process_text(raw_text: str, doc_id: str):
         
     return True
 
-def ask_question(question: str):
+def ask_question_with_stats(question: str):
     """
     Asks a question to the RAG pipeline.
+    Returns (answer, stats) where stats has the prompt tokens and latency.
     """
-    global index
-    if not index:
-        print("Reloading index from vector store...")
-        # Reload from vector store if not in memory
-        index = VectorStoreIndex.from_vector_store(vector_store)
-        
-    query_engine = index.as_query_engine()
+    # One consistent (index, version) pair, even while writers and maintenance swap them
+    current, version = current_index()
+    # Re-use the query engine until the index changes
+    query_engine = get_query_engine(current, version)
     print(f"Querying index with question: {question}")
-    resp = query_engine.query(question)
-    return str(resp)
+    return run_query(query_engine, question)
+
+def ask_question(question: str):
+    """
+    Asks a question to the RAG pipeline.
+    """
+    answer, _ = ask_question_with_stats(question)
+    return answer
 
 def get_summary(doc_id: str) -> str:
     """
     Retrieves a stored summary from the vector store by its unique ID.
     (Changed 'url' to 'doc_id')
     """
-    summary_id = f"summary_{doc_id}"
+    # A document that was linked to an earlier near-duplicate shares its summary
+    summary_id = f"summary_{dedup_index.resolve(doc_id) or doc_id}"
+    open_vector_store()
     try:
-        result = collection.get(ids=[summary_id], include=["documents"])
+        result = vector_index.collection.get(ids=[summary_id], include=["documents"])
         
         if result and result['documents']:
             return result['documents'][0]
@@ -1,5 +1,11 @@
 # preprocessor.py
-import re
+import os
+import sys
+
+# Make the project root importable (this module is also imported as plain `preprocess`)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_engine.cues import clean_lines
 
 def preprocess_transcript(raw_text: str) -> str:
     """
@@ -10,30 +16,14 @@ def preprocess_transcript(raw_text: str) -> str:
     and raw ASR (Sample 2).
     """
     
-    # 1. Remove all timestamps and VTT-style tags (e.g., <00:00:00.000> or <c>)
-    text = re.sub(r"<.*?>", "", raw_text)
-    
-    # 2. Remove all bracketed artifacts (e.g., [Music] or [Laughter])
-    text = re.sub(r"\[.*?\]", "", text)
-    
-    # 3. Handle duplicate lines from caption formats and empty lines
-    cleaned_lines = []
-    seen = set()
-    
-    for line in text.splitlines():
-        # Get rid of leading/trailing whitespace
-        cleaned_line = line.strip()
-        
-        # If the line has content and we haven't seen it before, add it.
-        # This handles both empty lines and the duplicate lines
-        # found in your first sample.
-        if cleaned_line and cleaned_line not in seen:
-            cleaned_lines.append(cleaned_line)
-            seen.add(cleaned_line)
+    # Cue timing lines, VTT-style tags (e.g., <00:00:00.000> or <c>), bracketed artifacts
+    # (e.g., [Music] or [Laughter]), empty lines and the repeated lines of caption formats:
+    # the same cleaning as uploaded subtitles and saved transcripts (ai_engine/cues.py)
+    cleaned_lines = clean_lines(raw_text.splitlines())
     
-    # 4. Join back into a single block of text
+    # Join back into a single block of text
+    ans = "\n".join(cleaned_lines)
     print("--- Preprocessing Complete ---")
-    ans= "\n".join(cleaned_lines)
     return ans
 
 # --- ADDED TEST BLOCK ---
@@ -0,0 +1,234 @@
+# transcript_store.py
+# Transcripts on disk, readable a page (or a time range) at a time.
+# Each transcript is two files in TRANSCRIPT_DIR:
+#   <id>.txt       the same human-readable file as before (header + one caption/segment per line)
+#   <id>.txt.idx   a sidecar index: byte offset, length and start/end seconds of every line,
+#                  plus the mtime/size of the .txt it was built for
+# A read looks up the lines it needs in the index (by line number or by time, with a binary
+# search) and reads just that byte range, so a page of a 3-hour transcript costs the same as a
+# page of a 3-minute one. Old transcripts without a sidecar get one built on first read.
+import os
+import re
+import sys
+import json
+import uuid
+import bisect
+import threading
+from typing import List, Optional
+
+# Make the project root importable when this file is run directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_engine.cues import iter_cues
+
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "transcripts")
+HEADER_RULE = "-" * 30
+
+_TRANSCRIPT_ID = re.compile(r"^[\w-]+$")
+
+# (path, mtime_ns, size) -> index; small, since an index is a few numbers per line
+_index_cache = {}
+_index_cache_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 32
+
+
+class TranscriptNotFound(Exception):
+    pass
+
+
+def vtt_to_segments(vtt_text: str) -> List[dict]:
+    """
+    Caption file -> [{"start", "end", "text"}, ...], one entry per caption line, cleaned by
+    ai_engine/cues.py (tags, [Music] artifacts, the repeated lines of rolling auto-captions).
+    """
+    return [
+        {"start": start, "end": end, "text": line}
+        for start, end, lines in iter_cues(vtt_text.split("\n"))
+        for line in lines
+    ]
+
+
+def transcript_path(transcript_id: str) -> str:
+    if not _TRANSCRIPT_ID.match(transcript_id):
+        raise TranscriptNotFound(transcript_id)
+    return os.path.join(TRANSCRIPT_DIR, f"{transcript_id}.txt")
+
+
+def save_transcript(filename: str, segments: List[dict], source: str, url: str = "Unknown") -> int:
+    """
+    Writes the transcript (one segment per line) and its index; returns the number of lines.
+    Both files are written to temp files and renamed, so a reader (or another worker saving
+    the same video) never sees a half-written transcript.
+    """
+    os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
+    filepath = os.path.join(TRANSCRIPT_DIR, filename)
+    header = f"Source: {source}\nOriginal URL: {url}\n{HEADER_RULE}\n\n".encode("utf-8")
+
+    lines, offset = [], len(header)
+    tmp = f".{uuid.uuid4().hex}.tmp"
+    with open(filepath + tmp, "wb") as f:
+        f.write(header)
+        for seg in segments:
+            data = seg["text"].replace("\n", " ").strip().encode("utf-8")
+            if not data:
+                continue
+            f.write(data + b"\n")
+            lines.append([offset, len(data), seg.get("start"), seg.get("end")])
+            offset += len(data) + 1
+    # The index records which .txt it describes (os.replace keeps mtime and size), so a
+    # reader that lands between the two renames can tell the new index from the old text
+    index = {"source": source, "url": url, "txt": _stamp(os.stat(filepath + tmp)), "lines": lines}
+    _write_index(filepath, index, tmp)
+    # Index first: if a reader rebuilt an index from the old .txt in between, it won't write
+    # it over this one (see load_index)
+    os.replace(filepath + tmp, filepath)
+    return len(lines)
+
+
+def _stamp(st: os.stat_result) -> list:
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _write_index(filepath: str, index: dict, tmp: Optional[str] = None):
+    """Writes <filepath>.idx through a temp file, so readers never load a half-written index."""
+    tmp = tmp or f".{uuid.uuid4().hex}.tmp"
+    try:
+        with open(filepath + ".idx" + tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(filepath + ".idx" + tmp, filepath + ".idx")
+    except OSError:
+        if os.path.exists(filepath + ".idx" + tmp):
+            os.remove(filepath + ".idx" + tmp)
+        raise
+
+
+def _build_index(f, st: os.stat_result) -> dict:
+    """Index of an open transcript file, for transcripts saved before sidecars existed (no timings)."""
+    source, url, lines = "unknown", "Unknown", []
+    f.seek(0)
+    in_header, offset = True, 0
+    for raw in f:
+        text = raw.rstrip(b"\r\n")
+        if in_header:
+            decoded = text.decode("utf-8", "replace")
+            if decoded.startswith("Source: "):
+                source = decoded[len("Source: "):]
+            elif decoded.startswith("Original URL: "):
+                url = decoded[len("Original URL: "):]
+            elif decoded == HEADER_RULE:
+                in_header = False
+        elif text.strip():
+            lines.append([offset, len(text), None, None])
+        offset += len(raw)
+    return {"source": source, "url": url, "txt": _stamp(st), "lines": lines}
+
+
+def load_index(transcript_id: str, f) -> dict:
+    """
+    The index of the transcript open as `f` (a binary file object). Taking the open file
+    rather than the path pins one version of the .txt: the index is checked against it, and
+    the caller reads the lines from it, even if save_transcript replaces the file meanwhile.
+    """
+    st = os.fstat(f.fileno())
+    filepath = transcript_path(transcript_id)
+    key = (filepath, st.st_mtime_ns, st.st_size)
+    with _index_cache_lock:
+        if key in _index_cache:
+            return _index_cache[key]
+
+    index_path = filepath + ".idx"
+    index, persist = None, True
+    try:
+        idx_mtime = os.stat(index_path).st_mtime_ns
+        with open(index_path, "r", encoding="utf-8") as idx:
+            stored = json.load(idx)
+    except (OSError, ValueError):
+        stored = None
+    if stored is not None:
+        if stored.get("txt") == _stamp(st):
+            index = stored
+        elif "txt" not in stored and idx_mtime >= st.st_mtime_ns:
+            index = stored  # sidecar written before indexes were stamped
+        elif idx_mtime >= st.st_mtime_ns:
+            # A newer index for a .txt that is being replaced right now: use a temporary
+            # index for the file we hold, and leave the sidecar alone
+            persist = False
+    if index is None:
+        index = _build_index(f, st)
+        if persist:
+            try:
+                _write_index(filepath, index)
+            except OSError:
+                pass  # read-only deployment: the index just isn't cached on disk
+    index = dict(index)
+    index["etag"] = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    # Start times for bisect (lines without timings sort first and never match a time range)
+    index["starts"] = [line[2] if line[2] is not None else -1.0 for line in index["lines"]]
+
+    with _index_cache_lock:
+        if len(_index_cache) >= _INDEX_CACHE_SIZE:
+            _index_cache.pop(next(iter(_index_cache)))
+        _index_cache[key] = index
+    return index
+
+
+def read_lines(transcript_id: str, offset: int = 0, limit: int = 200,
+               start: Optional[float] = None, end: Optional[float] = None) -> dict:
+    """
+    A page of a transcript: lines [offset, offset + limit), or, when `start`/`end` (seconds)
+    are given, the lines overlapping that time range (then `offset` counts from its first line).
+    """
+    try:
+        f = open(transcript_path(transcript_id), "rb")
+    except FileNotFoundError:
+        raise TranscriptNotFound(transcript_id)
+    with f:
+        return _read_page(transcript_id, f, offset, limit, start, end)
+
+
+def _read_page(transcript_id: str, f, offset: int, limit: int, start: Optional[float], end: Optional[float]) -> dict:
+    index = load_index(transcript_id, f)
+    lines = index["lines"]
+    first, last = 0, len(lines)
+    has_timings = bool(lines) and lines[0][2] is not None
+    if start is not None or end is not None:
+        starts = index["starts"]
+        if not has_timings:
+            first = last = 0  # nothing can be addressed by time
+        if start is not None and has_timings:
+            first = bisect.bisect_right(starts, start)
+            # Lines that started earlier but are still on screen at `start` count as inside the range
+            while first > 0 and (lines[first - 1][3] or 0) > start:
+                first -= 1
+        if end is not None and has_timings:
+            last = bisect.bisect_left(starts, end)
+    first = min(first + offset, last)
+    stop = min(first + limit, last)
+
+    page = []
+    if stop > first:
+        begin = lines[first][0]
+        finish = lines[stop - 1][0] + lines[stop - 1][1]
+        # One contiguous read for the whole page
+        f.seek(begin)
+        data = f.read(finish - begin)
+        for i in range(first, stop):
+            line_offset, length, line_start, line_end = lines[i]
+            rel = line_offset - begin
+            page.append({
+                "line": i,
+                "text": data[rel:rel + length].decode("utf-8", "replace"),
+                "start": line_start,
+                "end": line_end,
+            })
+
+    return {
+        "transcript_id": transcript_id,
+        "source": index["source"],
+        "url": index["url"],
+        "total_lines": len(lines),
+        "has_timings": has_timings,
+        "lines": page,
+        "next_offset": (stop - (first - offset)) if stop < last else None,
+        "etag": index["etag"],
+    }